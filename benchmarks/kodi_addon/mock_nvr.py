@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR - Mock NVR server for addon benchmarks
+
+Serves the /api endpoints used by the Kodi addon from a synthetic fleet.
+Recordings and events are computed from their index instead of being held in
+memory, so fleets of up to 1,000 cameras and 1M recordings start instantly.
+
+Usage:
+    python3 benchmarks/kodi_addon/mock_nvr.py --cameras 40 --recordings 100000
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import secrets
+import ssl
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+STREAM_CHUNK = 64 * 1024
+RECORDING_DURATION = 300
+RECORDING_BITRATE = 2 * 1024 * 1024 // 8
+KEYFRAME_INTERVAL = 2
+TOKEN_LIFETIME = 3600
+
+TS_PACKET = 188
+VIDEO_PID = 0x100
+AUDIO_PID = 0x101
+PMT_PID = 0x1000
+
+
+def _ts_packet(pid, payload, start=False, random_access=False):
+    """One MPEG-TS packet, padded with 0xFF"""
+    header = bytes([0x47, (0x40 if start else 0) | pid >> 8, pid & 0xFF])
+    if random_access:
+        header += b'\x30\x01\x40'
+    else:
+        header += b'\x10'
+    return (header + payload).ljust(TS_PACKET, b'\xff')
+
+
+# Program tables and the first packet of a keyframe, sent at every GOP start,
+# and the packet standing in for everything else
+TS_GOP_START = (
+    _ts_packet(0, b'\x00\x00\xb0\x0d\x00\x01\xc1\x00\x00\x00\x01' + bytes([0xe0 | PMT_PID >> 8, PMT_PID & 0xFF])
+               + b'\x00\x00\x00\x00', start=True)
+    + _ts_packet(PMT_PID, b'\x00\x02\xb0\x17\x00\x01\xc1\x00\x00\xe1\x00\xf0\x00\x1b\xe1\x00\xf0\x00'
+                 b'\x0f\xe1\x01\xf0\x00\x00\x00\x00\x00', start=True)
+    + _ts_packet(VIDEO_PID, b'\x00\x00\x01\xe0\x00\x00\x80\x80\x05\x21\x00\x01\x00\x01'
+                 b'\x00\x00\x00\x01\x65', start=True, random_access=True))
+TS_VIDEO = _ts_packet(VIDEO_PID, b'\x00' * 184)
+# Audio frames start with the random access indicator set, as ffmpeg muxes them
+TS_AUDIO = _ts_packet(AUDIO_PID, b'\x00\x00\x01\xc0\x00\x00\x80\x80\x05\x21\x00\x01\x00\x01',
+                      start=True, random_access=True)
+TS_FILLER = TS_VIDEO * 7 + TS_AUDIO
+
+
+class Fleet:
+    """Deterministic synthetic cameras, recordings and motion events
+
+    Item 0 is the newest; items are evenly spaced over `days` and assigned to
+    cameras round-robin.
+    """
+
+    def __init__(self, cameras=8, recordings=1000, events=500, days=30, now=None):
+        self.cameras = max(1, cameras)
+        self.recordings = max(0, recordings)
+        self.events = max(0, events)
+        self.days = days
+        self.now = (now or datetime.now()).replace(microsecond=0)
+        span = days * 86400
+        self.recording_interval = span / self.recordings if self.recordings else span
+        self.event_interval = span / self.events if self.events else span
+        self.signature = f"{self.cameras}:{self.recordings}:{self.events}:{days}:{self.now.isoformat()}"
+
+    def camera(self, camera_id, base_url):
+        return {
+            'id': camera_id,
+            'name': f"Camera {camera_id}",
+            'status': 'offline' if camera_id % 17 == 0 else 'online',
+            'ptz_capable': camera_id % 3 == 0,
+            'thumbnail_url': f"{base_url}/api/cameras/{camera_id}/thumbnail",
+        }
+
+    def camera_list(self, base_url):
+        return [self.camera(camera_id, base_url) for camera_id in range(1, self.cameras + 1)]
+
+    def recording(self, index, base_url):
+        camera_id = index % self.cameras + 1
+        start = self.now - timedelta(seconds=(index + 1) * self.recording_interval)
+        return {
+            'id': index,
+            'camera_id': camera_id,
+            'camera_name': f"Camera {camera_id}",
+            'start_time': start.isoformat(),
+            'duration': RECORDING_DURATION,
+            'file_size': RECORDING_DURATION * RECORDING_BITRATE,
+            'thumbnail_url': f"{base_url}/api/recordings/{index}/thumbnail",
+            'playback_url': f"{base_url}/api/recordings/{index}/playback",
+        }
+
+    @staticmethod
+    def recording_index():
+        """Keyframe-aligned segments of a recording (MPEG-TS, one GOP each)"""
+        file_size = RECORDING_DURATION * RECORDING_BITRATE
+        segments = []
+        for start in range(0, RECORDING_DURATION, KEYFRAME_INTERVAL):
+            offset = start * RECORDING_BITRATE // 188 * 188
+            end = min(start + KEYFRAME_INTERVAL, RECORDING_DURATION)
+            end_offset = end * RECORDING_BITRATE // 188 * 188 if end < RECORDING_DURATION else file_size
+            segments.append({'start': start, 'duration': end - start, 'offset': offset,
+                             'length': end_offset - offset})
+        return {'format': 'mpegts', 'file_size': file_size, 'segments': segments}
+
+    def event(self, index, base_url):
+        camera_id = index % self.cameras + 1
+        timestamp = self.now - timedelta(seconds=(index + 1) * self.event_interval)
+        return {
+            'id': index,
+            'camera_id': camera_id,
+            'camera_name': f"Camera {camera_id}",
+            'timestamp': timestamp.isoformat(),
+            'confidence': 40 + (index * 37) % 60,
+            'duration': 5 + index % 55,
+            'recording_url': f"{base_url}/api/recordings/{index}/playback" if index % 4 == 0 else '',
+        }
+
+    def index_range(self, count, interval, start=None, end=None, since=None):
+        """Indexes (newest first) whose timestamps fall inside [start, end]"""
+        first, last = 0, count - 1
+        if end is not None:
+            first = max(first, math.ceil((self.now - end).total_seconds() / interval - 1))
+        if start is not None:
+            last = min(last, math.floor((self.now - start).total_seconds() / interval - 1))
+        if since is not None:
+            last = min(last, math.ceil((self.now - since).total_seconds() / interval - 1) - 1)
+        return first, last
+
+    def matching(self, count, interval, camera_id=None, start=None, end=None, since=None):
+        """Iterate matching indexes newest first"""
+        first, last = self.index_range(count, interval, start, end, since)
+        if camera_id is None:
+            yield from range(first, last + 1)
+            return
+        offset = (camera_id - 1 - first) % self.cameras
+        yield from range(first + offset, last + 1, self.cameras)
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', ''))
+    except ValueError:
+        return None
+
+
+class MockNVRHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'MockNVR/1.0'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    # Request plumbing
+
+    def _count(self, path):
+        with self.server.lock:
+            self.server.request_count += 1
+            self.server.requests_by_path[path] = self.server.requests_by_path.get(path, 0) + 1
+
+    def _sent(self, size):
+        with self.server.lock:
+            self.server.bytes_sent += size
+
+    def _delay(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+    def _authorized(self):
+        """Check the request's credentials; answers 401 itself when they are refused
+        
+        Basic credentials are accepted as they are, after `basic_auth_cost`
+        seconds standing in for the password hash of a real NVR.
+        """
+        header = self.headers.get('Authorization', '')
+        with self.server.lock:
+            if header.startswith('Bearer '):
+                self.server.auth_checks['bearer'] += 1
+                valid = header[len('Bearer '):] in self.server.tokens
+            else:
+                self.server.auth_checks['basic'] += 1
+                valid = True
+        if not header.startswith('Bearer ') and self.server.basic_auth_cost:
+            time.sleep(self.server.basic_auth_cost)
+        if not valid:
+            self._send_empty(401)
+        return valid
+
+    def _issue_token(self):
+        token = secrets.token_hex(16)
+        with self.server.lock:
+            self.server.tokens.add(token)
+        self._send_json({'token': token, 'expires_in': TOKEN_LIFETIME})
+
+    def _send_empty(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _etag(self, path, query):
+        raw = f"{self.server.fleet.signature}|{path}|{sorted(query.items())}"
+        return '"' + hashlib.sha1(raw.encode('utf-8')).hexdigest() + '"'
+
+    def _not_modified(self, etag):
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return True
+        return False
+
+    def _send_json(self, data, etag=None):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+        self._sent(len(body))
+
+    def _send_json_array(self, items, etag=None):
+        """Stream a JSON array with chunked encoding"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+
+        buffer = []
+        size = 0
+
+        def flush():
+            nonlocal buffer, size
+            if buffer:
+                chunk = ''.join(buffer).encode('utf-8')
+                self.wfile.write(f"{len(chunk):x}\r\n".encode('ascii') + chunk + b"\r\n")
+                self._sent(len(chunk))
+                buffer, size = [], 0
+
+        try:
+            buffer.append('[')
+            for position, item in enumerate(items):
+                text = json.dumps(item)
+                buffer.append(text if position == 0 else ', ' + text)
+                size += len(text)
+                if size >= STREAM_CHUNK:
+                    flush()
+            buffer.append(']')
+            flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The addon stops reading once it has a page; that is expected
+            self.close_connection = True
+
+    # Endpoints
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        path = url.path
+        self._count(path)
+        self._delay()
+        fleet = self.server.fleet
+        base_url = f"{self.server.scheme}://{self.headers.get('Host', 'localhost')}"
+        if not self._authorized():
+            return
+
+        if path == '/api/status':
+            self._send_json({'status': 'ok', 'cameras': fleet.cameras})
+        elif path == '/api/cameras':
+            etag = self._etag(path, query)
+            if not self._not_modified(etag):
+                self._send_json(fleet.camera_list(base_url), etag)
+        elif path == '/api/recordings':
+            self._listing(path, query, fleet.recordings, fleet.recording_interval,
+                          lambda i: fleet.recording(i, base_url))
+        elif path == '/api/motion-events':
+            self._listing(path, query, fleet.events, fleet.event_interval,
+                          lambda i: fleet.event(i, base_url), default_limit=50, legacy_limit=True)
+        elif re.match(r'^/api/recordings/\d+/index$', path):
+            self._send_json(fleet.recording_index())
+        elif re.match(r'^/api/(cameras|recordings)/\d+/thumbnail$', path):
+            etag = self._etag(path, {})
+            if not self._not_modified(etag):
+                body = hashlib.sha256(path.encode('utf-8')).digest() * 256
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/jpeg')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+                self._sent(len(body))
+        elif re.match(r'^/api/cameras/\d+/stream$', path) or path == '/api/grid/stream':
+            self._stream(query)
+        else:
+            self._send_empty(404)
+
+    def do_HEAD(self):
+        url = urlparse(self.path)
+        self._count(url.path)
+        self._delay()
+        if not self._authorized():
+            return
+        # Mosaic probe from the grid view
+        self._send_empty(200 if url.path == '/api/grid/stream' else 404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        self._count(url.path)
+        self._delay()
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        if url.path == '/api/auth/login' and self.server.tokens_enabled:
+            try:
+                credentials = json.loads(body or b'{}')
+            except ValueError:
+                credentials = {}
+            if credentials.get('username') and 'password' in credentials:
+                self._issue_token()
+            else:
+                self._send_empty(401)
+            return
+        if not self._authorized():
+            return
+        if url.path == '/api/auth/refresh' and self.server.tokens_enabled:
+            self._issue_token()
+        elif re.match(r'^/api/cameras/\d+/(ptz|snapshot)$', url.path):
+            self._send_json({'success': True})
+        else:
+            self._send_empty(404)
+
+    def _listing(self, path, query, count, interval, build, default_limit=None, legacy_limit=False):
+        """Serve a listing; unpaged servers ignore limit unless legacy_limit is set"""
+        etag = self._etag(path, query)
+        if self._not_modified(etag):
+            return
+
+        camera_id = int(query['camera_id']) if query.get('camera_id', '').isdigit() else None
+        indexes = self.server.fleet.matching(
+            count, interval, camera_id,
+            _parse_time(query.get('start_date')),
+            _parse_time(query.get('end_date')),
+            _parse_time(query.get('since')))
+
+        paged = self.server.paged
+        limit = int(query['limit']) if query.get('limit', '').isdigit() else default_limit
+        if not paged and not legacy_limit:
+            limit = None
+        position = 0
+        if paged:
+            position = int(query.get('cursor') or query.get('offset') or 0)
+
+        state = {'more': False}
+
+        def items():
+            for n, index in enumerate(indexes):
+                if n < position:
+                    continue
+                if limit is not None and n >= position + limit:
+                    state['more'] = True
+                    return
+                yield build(index)
+
+        if paged and limit is not None:
+            # The cursor is only known after the page is written, so it trails the items
+            page = list(items())
+            envelope = {'next_cursor': str(position + limit) if state['more'] else None}
+            self._send_json({'items': page, **envelope}, etag)
+        else:
+            self._send_json_array(items(), etag)
+
+    @staticmethod
+    def _filler(packet, count):
+        """count packets of video with audio interleaved, from stream position packet"""
+        period = len(TS_FILLER) // TS_PACKET
+        first = packet % period
+        repeats = (first + count) // period + 1
+        return (TS_FILLER * repeats)[first * TS_PACKET:(first + count) * TS_PACKET]
+
+    def _stream(self, query):
+        """MPEG-TS with a keyframe every KEYFRAME_INTERVAL seconds, at the requested quality
+
+        A live stream is joined at a random point of its GOP, as with a real
+        camera, so a player waits for the next keyframe.
+        """
+        rates = {'480p': 1, '720p': 2, '1080p': 4, '4k': 12}
+        seconds = float(query.get('seconds', '2'))
+        byte_rate = rates.get(query.get('quality'), 2) * 1024 * 1024 / 8
+        total = int(byte_rate * seconds) // TS_PACKET * TS_PACKET
+        gop_packets = max(len(TS_GOP_START) // TS_PACKET + 1, int(byte_rate * KEYFRAME_INTERVAL) // TS_PACKET)
+        packet = random.randrange(gop_packets) if self.server.live_streams else 0
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp2t')
+        self.send_header('Content-Length', str(total))
+        self.end_headers()
+        sent = 0
+        started = time.monotonic()
+        try:
+            while sent < total:
+                count = min(348, (total - sent) // TS_PACKET)
+                until_gop = -packet % gop_packets
+                if until_gop < count:
+                    # Packets up to the next GOP start, then the GOP start itself
+                    chunk = (self._filler(packet, until_gop) + TS_GOP_START)[:(total - sent) // TS_PACKET * TS_PACKET]
+                else:
+                    chunk = self._filler(packet, count)
+                packet += len(chunk) // TS_PACKET
+                self.wfile.write(chunk)
+                sent += len(chunk)
+                if self.server.live_streams:
+                    # Send at the camera's bitrate instead of as fast as possible
+                    ahead = sent / byte_rate - (time.monotonic() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self._sent(sent)
+
+
+class MockNVRServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, fleet, latency=0.0, paged=False, verbose=False,
+                 tokens_enabled=True, basic_auth_cost=0.0, certfile=None, live_streams=False):
+        super().__init__(address, MockNVRHandler)
+        self.fleet = fleet
+        self.latency = latency
+        self.paged = paged
+        self.verbose = verbose
+        self.tokens_enabled = tokens_enabled
+        self.basic_auth_cost = basic_auth_cost
+        self.live_streams = live_streams
+        self.tokens = set()
+        self.scheme = 'http'
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile)
+            self.socket = context.wrap_socket(self.socket, server_side=True)
+            self.scheme = 'https'
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.bytes_sent = 0
+        self.requests_by_path = {}
+        self.auth_checks = {}
+        self.reset_counters()
+
+    def reset_counters(self):
+        with self.lock:
+            self.request_count = 0
+            self.bytes_sent = 0
+            self.requests_by_path = {}
+            self.auth_checks = {'basic': 0, 'bearer': 0}
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+def start_server(fleet, host='127.0.0.1', port=0, latency=0.0, paged=False, **options):
+    """Start a mock server on a background thread and return it"""
+    server = MockNVRServer((host, port), fleet, latency=latency, paged=paged, **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock AI-IT Inc NVR API server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--cameras', type=int, default=8)
+    parser.add_argument('--recordings', type=int, default=1000)
+    parser.add_argument('--events', type=int, default=500)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--latency', type=float, default=0.0, help='Added delay per request (seconds)')
+    parser.add_argument('--paged', action='store_true', help='Honour limit/cursor with {items, next_cursor} pages')
+    parser.add_argument('--no-tokens', action='store_true', help='No session token endpoint (Basic auth only)')
+    parser.add_argument('--basic-auth-cost', type=float, default=0.0,
+                        help='Delay per Basic auth check, standing in for the password hash (seconds)')
+    parser.add_argument('--certfile', help='Serve HTTPS with this PEM file (certificate and key)')
+    parser.add_argument('--live-streams', action='store_true', help='Send camera streams in real time')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    fleet = Fleet(args.cameras, args.recordings, args.events, args.days)
+    server = MockNVRServer((args.host, args.port), fleet, args.latency, args.paged, args.verbose,
+                           tokens_enabled=not args.no_tokens, basic_auth_cost=args.basic_auth_cost,
+                           certfile=args.certfile, live_streams=args.live_streams)
+    print(f"Mock NVR on {server.scheme}://{args.host}:{server.port}/api "
+          f"({fleet.cameras} cameras, {fleet.recordings} recordings, {fleet.events} events)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
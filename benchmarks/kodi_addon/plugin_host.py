@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR - Plugin host for addon benchmarks
+
+Runs kodi-addon/main.py once, the way Kodi launches a plugin invocation,
+with the stub xbmc* modules on the path. Directory counters are written to
+BENCH_STATS_FILE after all plugin threads have finished.
+
+Usage:
+    python3 plugin_host.py "mode=live_cameras"
+"""
+
+import atexit
+import os
+import runpy
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ADDON_DIR = os.environ.get('BENCH_ADDON_DIR', os.path.join(BENCH_DIR, '..', '..', 'kodi-addon'))
+
+
+def main():
+    query = sys.argv[1] if len(sys.argv) > 1 else ''
+    sys.path.insert(0, os.path.join(BENCH_DIR, 'stubs'))
+    sys.path.insert(0, os.path.abspath(ADDON_DIR))
+
+    import xbmcplugin
+    # atexit handlers run after non-daemon threads have been joined
+    atexit.register(xbmcplugin.write_stats)
+
+    sys.argv = ['plugin://plugin.video.aiit-nvr/', '1', f"?{query}"]
+    runpy.run_path(os.path.join(ADDON_DIR, 'main.py'), run_name='__main__')
+
+
+if __name__ == '__main__':
+    main()
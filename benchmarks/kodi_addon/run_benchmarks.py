@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR - Kodi addon benchmark suite
+
+Starts a mock NVR with a synthetic fleet and runs every router mode of the
+addon in a fresh process, as Kodi does on each click. Each mode is run with an
+empty profile (cold) and again with the profile left by the first run (warm).
+Wall time, time until the listing reached Kodi, peak RSS, NVR request count
+and startup time are reported, and can be saved as JSON and compared against
+an earlier run. Wall time includes background work (prefetching) done after
+the listing was shown.
+
+Usage:
+    python3 benchmarks/kodi_addon/run_benchmarks.py --cameras 40 --recordings 100000
+    python3 benchmarks/kodi_addon/run_benchmarks.py --json after.json --compare before.json
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_nvr import Fleet, start_server
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_HOST = os.path.join(BENCH_DIR, 'plugin_host.py')
+
+# (name, plugin query string) for every router mode
+SCENARIOS = [
+    ('main_menu', ''),
+    ('live_cameras', 'mode=live_cameras'),
+    ('recordings', 'mode=recordings'),
+    ('recordings_today', 'mode=recordings_date&date=today'),
+    ('recordings_week', 'mode=recordings_date&date=week'),
+    ('recordings_month', 'mode=recordings_date&date=month'),
+    ('recordings_custom', 'mode=recordings_custom_date'),
+    ('recordings_by_camera', 'mode=recordings_by_camera'),
+    ('play_recording', 'mode=play_recording&recording_id=7&duration=300&size=78643200'
+                       '&url=http%3A%2F%2Flocalhost%2Fapi%2Frecordings%2F7%2Fplayback'),
+    ('motion_events', 'mode=motion_events'),
+    ('motion_activity', 'mode=motion_activity'),
+    ('grid_view', 'mode=grid_view'),
+    ('ptz_control', 'mode=ptz_control&camera_id=3'),
+    ('take_snapshot', 'mode=take_snapshot&camera_id=1'),
+    ('settings', 'mode=settings'),
+    ('diagnostics', 'mode=diagnostics'),
+]
+
+STARTUP_PATTERN = re.compile(r'Startup mode=\S+ total=([\d.]+)ms')
+
+METRICS = ('wall_ms', 'listed_ms', 'peak_rss_mb', 'requests', 'startup_ms')
+
+
+def run_plugin(query, server, profile_dir, settings):
+    """Run one plugin invocation; returns its measurements"""
+    env = dict(os.environ)
+    env.update({
+        'BENCH_PROFILE_DIR': profile_dir,
+        'BENCH_SETTINGS': json.dumps(settings),
+        'BENCH_KODI_LOG': '1',
+    })
+
+    with tempfile.NamedTemporaryFile('r', suffix='.json') as stats_file, \
+            tempfile.TemporaryFile('w+') as log_file:
+        env['BENCH_STATS_FILE'] = stats_file.name
+        server.reset_counters()
+
+        started = time.perf_counter()
+        started_at = time.time()
+        process = subprocess.Popen([sys.executable, PLUGIN_HOST, query], env=env,
+                                   stdout=subprocess.DEVNULL, stderr=log_file)
+        _, status, usage = os.wait4(process.pid, 0)
+        wall_ms = (time.perf_counter() - started) * 1000
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+        log_file.seek(0)
+        log = log_file.read()
+        try:
+            stats = json.load(stats_file)
+        except ValueError:
+            stats = {}
+
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    rss_divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    startup = STARTUP_PATTERN.search(log)
+    listed_at = stats.get('listed_at')
+    return {
+        'wall_ms': wall_ms,
+        'listed_ms': (listed_at - started_at) * 1000 if listed_at else None,
+        'peak_rss_mb': usage.ru_maxrss / rss_divisor,
+        'requests': server.request_count,
+        'bytes': server.bytes_sent,
+        'startup_ms': float(startup.group(1)) if startup else None,
+        'items': stats.get('items', 0),
+        'add_calls': stats.get('add_calls', 0),
+        'exit_code': process.returncode,
+        'errors': [line for line in log.splitlines() if 'Traceback' in line or '[kodi:3]' in line],
+    }
+
+
+def median_run(query, server, profile_dir, settings, repeat, reset_profile):
+    """Median of `repeat` runs; the profile is wiped before each when reset_profile"""
+    runs = []
+    for _ in range(repeat):
+        if reset_profile:
+            shutil.rmtree(profile_dir, ignore_errors=True)
+            os.makedirs(profile_dir)
+        runs.append(run_plugin(query, server, profile_dir, settings))
+    result = dict(runs[-1])
+    for metric in METRICS:
+        values = [run[metric] for run in runs if run[metric] is not None]
+        result[metric] = statistics.median(values) if values else None
+    return result
+
+
+def run_suite(args):
+    fleet = Fleet(args.cameras, args.recordings, args.events, args.days)
+    server = start_server(fleet, latency=args.latency, paged=args.paged)
+    settings = {'nvr_host': '127.0.0.1', 'nvr_port': str(server.port)}
+    for override in args.setting:
+        key, _, value = override.partition('=')
+        settings[key] = value
+
+    scenarios = [s for s in SCENARIOS if not args.modes or s[0] in args.modes]
+    results = {}
+    workdir = tempfile.mkdtemp(prefix='nvr-bench-')
+    try:
+        for name, query in scenarios:
+            profile_dir = os.path.join(workdir, name)
+            results[name] = {
+                'cold': median_run(query, server, profile_dir, settings, args.repeat, True),
+                'warm': median_run(query, server, profile_dir, settings, args.repeat, False),
+            }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        server.shutdown()
+
+    return {
+        'fleet': {'cameras': fleet.cameras, 'recordings': fleet.recordings, 'events': fleet.events,
+                  'days': fleet.days, 'latency': args.latency, 'paged': args.paged},
+        'python': sys.version.split()[0],
+        'results': results,
+    }
+
+
+def _format(value, digits=1):
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return f"{value:.{digits}f}"
+    return str(value)
+
+
+def print_report(report, baseline=None):
+    fleet = report['fleet']
+    print(f"Fleet: {fleet['cameras']} cameras, {fleet['recordings']} recordings, {fleet['events']} events, "
+          f"latency {fleet['latency'] * 1000:.0f} ms, {'paged' if fleet['paged'] else 'unpaged'} server")
+    header = f"{'mode':<22}{'pass':<6}{'wall ms':>10}{'list ms':>10}{'rss MB':>9}{'reqs':>6}{'start ms':>10}{'items':>7}{'calls':>6}"
+    if baseline:
+        header += f"{'Δ wall':>10}{'Δ rss':>9}{'Δ reqs':>8}"
+    print(header)
+    print('-' * len(header))
+
+    for name, passes in report['results'].items():
+        for pass_name, result in passes.items():
+            line = (f"{name:<22}{pass_name:<6}{_format(result['wall_ms']):>10}"
+                    f"{_format(result.get('listed_ms')):>10}"
+                    f"{_format(result['peak_rss_mb']):>9}{_format(result['requests']):>6}"
+                    f"{_format(result['startup_ms']):>10}{_format(result['items']):>7}"
+                    f"{_format(result['add_calls']):>6}")
+            before = (baseline or {}).get('results', {}).get(name, {}).get(pass_name)
+            if before:
+                line += (f"{_delta(result['wall_ms'], before['wall_ms']):>10}"
+                         f"{_delta(result['peak_rss_mb'], before['peak_rss_mb']):>9}"
+                         f"{_delta(result['requests'], before['requests']):>8}")
+            if result['exit_code'] or result['errors']:
+                line += f"  !! exit={result['exit_code']} {result['errors'][:1]}"
+            print(line)
+
+
+def _delta(after, before):
+    if after is None or before is None:
+        return '-'
+    if before == 0:
+        return f"{after - before:+.0f}"
+    return f"{(after - before) * 100.0 / before:+.0f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the AI-IT Inc NVR Kodi addon')
+    parser.add_argument('--cameras', type=int, default=8, help='Fleet size (1-1000)')
+    parser.add_argument('--recordings', type=int, default=1000, help='Recordings in the fleet (100-1000000)')
+    parser.add_argument('--events', type=int, default=500)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--latency', type=float, default=0.0, help='Mock NVR delay per request (seconds)')
+    parser.add_argument('--paged', action='store_true', help='Mock NVR honours limit/cursor')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per mode and pass (median reported)')
+    parser.add_argument('--modes', nargs='*', help='Only run these scenarios')
+    parser.add_argument('--setting', action='append', default=[], metavar='ID=VALUE',
+                        help='Override an addon setting')
+    parser.add_argument('--json', help='Write results to this file')
+    parser.add_argument('--compare', help='Show deltas against an earlier --json file')
+    args = parser.parse_args()
+
+    report = run_suite(args)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
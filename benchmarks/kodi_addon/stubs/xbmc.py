@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark stub of Kodi's xbmc module
+
+Only the calls the addon makes are provided. Log lines go to stderr when
+BENCH_KODI_LOG is set, so the harness can collect startup budget reports.
+"""
+
+import os
+import sys
+import time
+
+LOGDEBUG = 0
+LOGINFO = 1
+LOGWARNING = 2
+LOGERROR = 3
+LOGFATAL = 4
+
+PLAYLIST_MUSIC = 0
+PLAYLIST_VIDEO = 1
+
+_LOG_ENABLED = bool(os.environ.get('BENCH_KODI_LOG'))
+
+
+def log(msg, level=LOGDEBUG):
+    if _LOG_ENABLED:
+        sys.stderr.write(f"[kodi:{level}] {msg}\n")
+
+
+def sleep(milliseconds):
+    time.sleep(milliseconds / 1000.0)
+
+
+def executebuiltin(function, wait=False):
+    log(f"executebuiltin: {function}")
+
+
+def getCondVisibility(condition):
+    return False
+
+
+class Monitor:
+    def abortRequested(self):
+        return False
+
+    def waitForAbort(self, timeout=0):
+        time.sleep(timeout or 0)
+        return False
+
+
+class PlayList:
+    def __init__(self, playlist):
+        self.items = []
+
+    def clear(self):
+        self.items = []
+
+    def add(self, url, listitem=None, index=-1):
+        self.items.append(url)
+
+    def size(self):
+        return len(self.items)
+
+
+class Player:
+    def play(self, item=None, listitem=None, windowed=False, startpos=-1):
+        log(f"Player.play: {item}")
+
+    def stop(self):
+        pass
+
+    def isPlaying(self):
+        return False
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark stub of Kodi's xbmcaddon module
+
+Setting defaults are read from the addon's settings.xml and can be
+overridden with a JSON object in BENCH_SETTINGS.
+"""
+
+import json
+import os
+import xml.etree.ElementTree as ET
+
+ADDON_DIR = os.environ.get(
+    'BENCH_ADDON_DIR',
+    os.path.join(os.path.dirname(__file__), '..', '..', '..', 'kodi-addon'))
+
+
+def _load_settings():
+    settings = {}
+    try:
+        root = ET.parse(os.path.join(ADDON_DIR, 'resources', 'settings.xml')).getroot()
+        for setting in root.iter('setting'):
+            default = setting.find('default')
+            if default is not None:
+                settings[setting.get('id')] = default.text or ''
+            else:
+                settings[setting.get('id')] = setting.get('default', '')
+    except (OSError, ET.ParseError):
+        pass
+    settings.update(json.loads(os.environ.get('BENCH_SETTINGS', '{}')))
+    return {key: str(value).lower() if isinstance(value, bool) else str(value) for key, value in settings.items()}
+
+
+class Addon:
+    _settings = None
+
+    def __init__(self, id=None):
+        if Addon._settings is None:
+            Addon._settings = _load_settings()
+
+    def getAddonInfo(self, key):
+        return {
+            'id': 'plugin.video.aiit-nvr',
+            'name': 'AI-IT Inc NVR',
+            'version': '1.0.0',
+            'path': os.path.abspath(ADDON_DIR),
+            'profile': 'special://profile/addon_data/plugin.video.aiit-nvr/',
+        }.get(key, '')
+
+    def getSetting(self, key):
+        return self._settings.get(key, '')
+
+    def getSettingBool(self, key):
+        return self._settings.get(key, 'false') == 'true'
+
+    def getSettingInt(self, key):
+        try:
+            return int(float(self._settings.get(key) or 0))
+        except ValueError:
+            return 0
+
+    def getSettingNumber(self, key):
+        try:
+            return float(self._settings.get(key) or 0)
+        except ValueError:
+            return 0.0
+
+    def getSettingString(self, key):
+        return self._settings.get(key, '')
+
+    def setSetting(self, key, value):
+        self._settings[key] = value
+
+    def getLocalizedString(self, string_id):
+        return str(string_id)
+
+    def openSettings(self):
+        pass
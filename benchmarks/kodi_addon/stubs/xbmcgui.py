@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmark stub of Kodi's xbmcgui module"""
+
+import datetime
+import os
+import time
+
+NOTIFICATION_INFO = 'info'
+NOTIFICATION_WARNING = 'warning'
+NOTIFICATION_ERROR = 'error'
+
+ACTION_MOVE_LEFT = 1
+ACTION_MOVE_RIGHT = 2
+ACTION_MOVE_UP = 3
+ACTION_MOVE_DOWN = 4
+ACTION_PAGE_UP = 5
+ACTION_PAGE_DOWN = 6
+ACTION_SELECT_ITEM = 7
+ACTION_PREVIOUS_MENU = 10
+ACTION_NAV_BACK = 92
+
+
+class ListItem:
+    def __init__(self, label='', label2='', path='', offscreen=False):
+        self.label = label
+        self.label2 = label2
+        self.path = path
+        self.info = {}
+        self.art = {}
+        self.properties = {}
+        self.context_menu = []
+
+    def getLabel(self):
+        return self.label
+
+    def setLabel(self, label):
+        self.label = label
+
+    def setPath(self, path):
+        self.path = path
+
+    def getPath(self):
+        return self.path
+
+    def setInfo(self, type, infoLabels):
+        self.info.update(infoLabels)
+
+    def setArt(self, values):
+        self.art.update(values)
+
+    def getArt(self, key):
+        return self.art.get(key, '')
+
+    def setProperty(self, key, value):
+        self.properties[key] = value
+
+    def getProperty(self, key):
+        return self.properties.get(key, '')
+
+    def addContextMenuItems(self, items, replaceItems=False):
+        self.context_menu.extend(items)
+
+    def setMimeType(self, mimetype):
+        self.properties['mimetype'] = mimetype
+
+    def setContentLookup(self, enable):
+        pass
+
+
+class Dialog:
+    """Non-interactive dialog; selections come from BENCH_DIALOG_SELECT"""
+
+    def notification(self, heading, message, icon=NOTIFICATION_INFO, time=5000, sound=True):
+        pass
+
+    def select(self, heading, options, autoclose=0, preselect=-1, useDetails=False):
+        return int(os.environ.get('BENCH_DIALOG_SELECT', '-1'))
+
+    def ok(self, heading, message):
+        return True
+
+    def yesno(self, heading, message, nolabel='', yeslabel='', autoclose=0):
+        return False
+
+    def input(self, heading, defaultt='', type=0, option=0, autoclose=0):
+        return defaultt
+
+    def numeric(self, type, heading, defaultt='', bHiddenInput=False):
+        # Kodi pre-fills date input (type 1) with today, as DD/MM/YYYY
+        value = os.environ.get('BENCH_DIALOG_NUMERIC')
+        if value is None and type == 1:
+            value = datetime.date.today().strftime('%d/%m/%Y')
+        return value if value is not None else defaultt
+
+    def textviewer(self, heading, text, usemono=False):
+        pass
+
+
+class Action:
+    def __init__(self, action_id):
+        self.action_id = action_id
+
+    def getId(self):
+        return self.action_id
+
+
+class Window:
+    """Modal windows replay BENCH_WINDOW_ACTIONS (comma-separated action ids)
+
+    Actions are sent every BENCH_WINDOW_ACTION_INTERVAL seconds, as Kodi
+    repeats a held key; an empty id pauses for one interval.
+    """
+
+    def __init__(self, existingWindowId=-1):
+        self.controls = []
+        self.closed = False
+
+    def show(self):
+        pass
+
+    def doModal(self):
+        interval = float(os.environ.get('BENCH_WINDOW_ACTION_INTERVAL', '0.05'))
+        for action_id in os.environ.get('BENCH_WINDOW_ACTIONS', '').split(','):
+            if self.closed:
+                break
+            if action_id:
+                self.onAction(Action(int(action_id)))
+            time.sleep(interval)
+
+    def onAction(self, action):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def addControl(self, control):
+        self.controls.append(control)
+
+    def addControls(self, controls):
+        self.controls.extend(controls)
+
+    def removeControl(self, control):
+        self.controls.remove(control)
+
+    def setFocus(self, control):
+        pass
+
+    def getWidth(self):
+        return 1280
+
+    def getHeight(self):
+        return 720
+
+
+class WindowDialog(Window):
+    pass
+
+
+class Control:
+    def __init__(self, x=0, y=0, width=0, height=0, *args, **kwargs):
+        self.position = (x, y, width, height)
+
+    def setVisible(self, visible):
+        pass
+
+
+class ControlLabel(Control):
+    def __init__(self, x, y, width, height, label='', *args, **kwargs):
+        super().__init__(x, y, width, height)
+        self.label = label
+
+    def setLabel(self, label='', *args, **kwargs):
+        self.label = label
+
+
+class ControlImage(Control):
+    def __init__(self, x, y, width, height, filename='', *args, **kwargs):
+        super().__init__(x, y, width, height)
+        self.filename = filename
+
+    def setImage(self, filename, useCache=True):
+        self.filename = filename
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmark stub of Kodi's xbmcplugin module"""
+
+import json
+import os
+import time
+
+SORT_METHOD_NONE = 0
+SORT_METHOD_LABEL = 1
+SORT_METHOD_DATE = 3
+
+# Counters reported back to the harness when the plugin process exits
+STATS = {
+    'items': 0,
+    'add_calls': 0,
+    'succeeded': None,
+    'resolved': None,
+    # Wall clock time Kodi got the listing or the playable URL
+    'listed_at': None,
+}
+
+
+def addDirectoryItem(handle, url, listitem, isFolder=False, totalItems=0):
+    STATS['items'] += 1
+    STATS['add_calls'] += 1
+    return True
+
+
+def addDirectoryItems(handle, items, totalItems=0):
+    STATS['items'] += len(items)
+    STATS['add_calls'] += 1
+    return True
+
+
+def endOfDirectory(handle, succeeded=True, updateListing=False, cacheToDisc=True):
+    STATS['succeeded'] = succeeded
+    STATS['listed_at'] = time.time()
+
+
+def setResolvedUrl(handle, succeeded, listitem):
+    STATS['resolved'] = listitem.getPath() if succeeded else ''
+    STATS['listed_at'] = time.time()
+
+
+def setContent(handle, content):
+    pass
+
+
+def addSortMethod(handle, sortMethod, labelMask='', label2Mask=''):
+    pass
+
+
+def setPluginCategory(handle, category):
+    pass
+
+
+def write_stats(path=None):
+    """Dump the counters for the harness (path from BENCH_STATS_FILE)"""
+    path = path or os.environ.get('BENCH_STATS_FILE')
+    if path:
+        with open(path, 'w') as f:
+            json.dump(STATS, f)
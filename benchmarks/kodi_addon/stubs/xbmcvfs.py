@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmark stub of Kodi's xbmcvfs module"""
+
+import os
+
+_PROFILE_DIR = os.environ.get('BENCH_PROFILE_DIR', os.path.join(os.getcwd(), 'bench-profile'))
+
+
+def translatePath(path):
+    if path.startswith('special://profile/addon_data/'):
+        return os.path.join(_PROFILE_DIR, path[len('special://profile/addon_data/'):])
+    if path.startswith('special://'):
+        return os.path.join(_PROFILE_DIR, path[len('special://'):])
+    return path
+
+
+def exists(path):
+    return os.path.exists(path)
+
+
+def mkdir(path):
+    try:
+        os.mkdir(path)
+        return True
+    except OSError:
+        return False
+
+
+def mkdirs(path):
+    os.makedirs(path, exist_ok=True)
+    return True
+
+
+def delete(path):
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
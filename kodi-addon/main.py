@@ -9,6 +9,12 @@ Copyright (C) 2025 AI-IT Inc
 Licensed under GPL-3.0
 """
 
+import time
+
+# Cold-start clock; taken before any other import
+PROCESS_START = time.perf_counter()
+
+import os
 import sys
 import urllib.parse as urlparse
 import xbmc
@@ -16,9 +22,6 @@ import xbmcgui
 import xbmcplugin
 import xbmcaddon
 import xbmcvfs
-import json
-import requests
-from datetime import datetime, timedelta
 
 # Addon information
 ADDON = xbmcaddon.Addon()
@@ -31,119 +34,120 @@ ADDON_PROFILE = xbmcvfs.translatePath(ADDON.getAddonInfo('profile'))
 # Plugin handle
 HANDLE = int(sys.argv[1])
 
-# NVR API endpoints
-class NVRApi:
-    def __init__(self):
-        self.host = ADDON.getSetting('nvr_host') or 'localhost'
-        self.port = ADDON.getSetting('nvr_port') or '8080'
-        self.username = ADDON.getSetting('nvr_username') or 'admin'
-        self.password = ADDON.getSetting('nvr_password') or 'admin123'
-        self.use_https = ADDON.getSettingBool('use_https')
-        
-        protocol = 'https' if self.use_https else 'http'
-        self.base_url = f"{protocol}://{self.host}:{self.port}/api"
-        
-        self.session = requests.Session()
-        self.session.auth = (self.username, self.password)
-        self.session.timeout = 10
-        
-    def test_connection(self):
-        """Test connection to NVR system"""
-        try:
-            response = self.session.get(f"{self.base_url}/status")
-            return response.status_code == 200
-        except Exception as e:
-            xbmc.log(f"[{ADDON_ID}] Connection test failed: {str(e)}", xbmc.LOGERROR)
-            return False
-    
-    def get_cameras(self):
-        """Get list of available cameras"""
-        try:
-            response = self.session.get(f"{self.base_url}/cameras")
-            if response.status_code == 200:
-                return response.json()
-            return []
-        except Exception as e:
-            xbmc.log(f"[{ADDON_ID}] Failed to get cameras: {str(e)}", xbmc.LOGERROR)
-            return []
-    
-    def get_camera_stream_url(self, camera_id, quality='medium'):
-        """Get streaming URL for camera"""
-        quality_map = {
-            'low': '480p',
-            'medium': '720p', 
-            'high': '1080p',
-            'ultra': '4k'
-        }
-        resolution = quality_map.get(quality, '720p')
-        return f"{self.base_url}/cameras/{camera_id}/stream?quality={resolution}"
+# Cold-start budget per router mode (ms): process start until the handler
+# begins, plus building the API client for modes that use it
+STARTUP_BUDGETS_MS = {
+    None: 400,
+    'live_cameras': 400,
+    'recordings': 150,
+    'recordings_date': 400,
+    'recordings_custom_date': 400,
+    'recordings_by_camera': 400,
+    'play_recording': 400,
+    'motion_events': 400,
+    'motion_activity': 400,
+    'grid_view': 400,
+    'ptz_control': 400,
+    'take_snapshot': 400,
+    'settings': 150,
+    'diagnostics': 150,
+    'diagnostics_reset': 150,
+}
+DEFAULT_STARTUP_BUDGET_MS = 400
+
+# Bar heights of the activity sparklines, lowest first
+SPARKLINE_LEVELS = '▁▂▃▄▅▆▇█'
+
+# NVR API client, created on first use
+_nvr_api = None
+_client_init_ms = 0.0
+
+# Likely next views, fetched into the caches once the listing is shown
+_prefetch_tasks = []
+
+# Present while an invocation prefetches (resources.lib.prefetch.MARKER_FILE)
+PREFETCH_MARKER = 'prefetch.active'
+
+def get_nvr_api():
+    """Return the NVR API client, importing and building it on first use"""
+    global _nvr_api, _client_init_ms
+    if _nvr_api is None:
+        started = time.perf_counter()
+        if is_federated():
+            from resources.lib.federation import FederatedNVR
+            _nvr_api = FederatedNVR.from_settings(ADDON)
+        else:
+            from resources.lib.nvrapi import NVRApi
+            _nvr_api = NVRApi(ADDON)
+        _client_init_ms = (time.perf_counter() - started) * 1000
+    return _nvr_api
+
+def is_federated():
+    """Whether other NVR sites are listed next to the main one"""
+    return bool(ADDON.getSetting('nvr_sites').strip())
+
+def warn_unavailable_sites():
+    """Tell the user which NVR sites were left out of a federated view"""
+    unavailable = getattr(get_nvr_api(), 'unavailable', None)
+    if unavailable:
+        show_notification(f"Not responding: {', '.join(unavailable)}", icon=xbmcgui.NOTIFICATION_WARNING)
+
+def prefetch(name, func, *args):
+    """Queue a likely next view to be fetched after this listing is shown"""
+    _prefetch_tasks.append((name, func, args))
+
+def run_prefetch():
+    """Fetch the queued views into the caches within the prefetch budget"""
+    if not _prefetch_tasks or not ADDON.getSettingBool('prefetch_views'):
+        return
+    # Without the response cache nothing fetched now would be reused
+    if not ADDON.getSettingBool('enable_response_cache'):
+        return
+    from resources.lib.prefetch import Prefetcher
     
-    def get_recordings(self, camera_id=None, start_date=None, end_date=None):
-        """Get list of recordings"""
-        try:
-            params = {}
-            if camera_id:
-                params['camera_id'] = camera_id
-            if start_date:
-                params['start_date'] = start_date
-            if end_date:
-                params['end_date'] = end_date
-                
-            response = self.session.get(f"{self.base_url}/recordings", params=params)
-            if response.status_code == 200:
-                return response.json()
-            return []
-        except Exception as e:
-            xbmc.log(f"[{ADDON_ID}] Failed to get recordings: {str(e)}", xbmc.LOGERROR)
-            return []
-    
-    def get_motion_events(self, camera_id=None, limit=50):
-        """Get motion detection events"""
-        try:
-            params = {'limit': limit}
-            if camera_id:
-                params['camera_id'] = camera_id
-                
-            response = self.session.get(f"{self.base_url}/motion-events", params=params)
-            if response.status_code == 200:
-                return response.json()
-            return []
-        except Exception as e:
-            xbmc.log(f"[{ADDON_ID}] Failed to get motion events: {str(e)}", xbmc.LOGERROR)
-            return []
-    
-    def ptz_control(self, camera_id, command, value=None):
-        """Control PTZ camera"""
-        try:
-            data = {'command': command}
-            if value:
-                data['value'] = value
-                
-            response = self.session.post(f"{self.base_url}/cameras/{camera_id}/ptz", json=data)
-            return response.status_code == 200
-        except Exception as e:
-            xbmc.log(f"[{ADDON_ID}] PTZ control failed: {str(e)}", xbmc.LOGERROR)
-            return False
-    
-    def take_snapshot(self, camera_id):
-        """Take snapshot from camera"""
-        try:
-            response = self.session.post(f"{self.base_url}/cameras/{camera_id}/snapshot")
-            return response.status_code == 200
-        except Exception as e:
-            xbmc.log(f"[{ADDON_ID}] Snapshot failed: {str(e)}", xbmc.LOGERROR)
-            return False
+    prefetcher = Prefetcher(ADDON_PROFILE, should_stop=xbmc.Monitor().abortRequested)
+    for name, func, args in _prefetch_tasks:
+        prefetcher.add(name, func, *args)
+    done = prefetcher.run(log=lambda message: xbmc.log(f"[{ADDON_ID}] {message}", xbmc.LOGDEBUG))
+    xbmc.log(f"[{ADDON_ID}] Prefetched: {', '.join(done) or 'nothing'}", xbmc.LOGDEBUG)
 
-# Initialize NVR API
-nvr_api = NVRApi()
+def flush_caches():
+    """Write the cache indexes now so the next invocation sees what was fetched"""
+    nvr_api = get_nvr_api()
+    for api in getattr(nvr_api, 'apis', [nvr_api]):
+        if api.cache is not None:
+            api.cache.flush()
+        if api.thumbnails is not None:
+            api.thumbnails.cache.flush()
+
+def prefetch_cameras(thumbnails=False):
+    """Warm the live camera list, or its thumbnails once the list is cached"""
+    nvr_api = get_nvr_api()
+    cameras = nvr_api.get_cameras()
+    if thumbnails:
+        nvr_api.get_camera_thumbnails([camera.get('thumbnail_url', '') for camera in cameras or ()])
+    flush_caches()
+
+def prefetch_recordings(date_filter, cursor=None, start=None, end=None, thumbnails=False):
+    """Warm a page of recordings, or its thumbnails once the page is cached"""
+    start_param, end_param = recordings_page_range(date_filter, cursor, start, end)
+    recordings, _ = load_recordings_page(start_param, end_param, cursor)
+    if thumbnails:
+        get_nvr_api().get_recording_thumbnails([r.get('thumbnail_url', '') for r in recordings])
+    flush_caches()
 
 def build_url(query):
     """Build plugin URL with query parameters"""
     return f"{sys.argv[0]}?{urlparse.urlencode(query)}"
 
-def add_directory_item(title, url, is_folder=True, info_labels=None, art=None, context_menu=None):
-    """Add directory item to Kodi"""
-    list_item = xbmcgui.ListItem(label=title)
+def directory_item(title, url, is_folder=True, info_labels=None, art=None, context_menu=None, playable=False):
+    """Build a (url, ListItem, is_folder) tuple for add_directory_items"""
+    # Offscreen items skip the GUI lock while they are being filled in
+    list_item = xbmcgui.ListItem(label=title, offscreen=True)
+    
+    if playable:
+        # Resolved through setResolvedUrl when it is played
+        list_item.setProperty('IsPlayable', 'true')
     
     if info_labels:
         list_item.setInfo('video', info_labels)
@@ -154,7 +158,11 @@ def add_directory_item(title, url, is_folder=True, info_labels=None, art=None, c
     if context_menu:
         list_item.addContextMenuItems(context_menu)
     
-    xbmcplugin.addDirectoryItem(HANDLE, url, list_item, is_folder)
+    return url, list_item, is_folder
+
+def add_directory_items(items):
+    """Hand a whole listing to Kodi in a single call"""
+    xbmcplugin.addDirectoryItems(HANDLE, items, len(items))
 
 def show_notification(message, title=ADDON_NAME, icon=xbmcgui.NOTIFICATION_INFO, time=5000):
     """Show notification to user"""
@@ -163,58 +171,73 @@ def show_notification(message, title=ADDON_NAME, icon=xbmcgui.NOTIFICATION_INFO,
 def main_menu():
     """Display main menu"""
     # Test connection first
-    if not nvr_api.test_connection():
+    if not get_nvr_api().test_connection():
         show_notification("Cannot connect to NVR system. Check settings.", icon=xbmcgui.NOTIFICATION_ERROR)
         xbmcplugin.endOfDirectory(HANDLE, False)
         return
+    warn_unavailable_sites()
     
     # Main menu items
     menu_items = [
         ("📹 Live Cameras", build_url({'mode': 'live_cameras'}), True),
         ("📼 Recordings", build_url({'mode': 'recordings'}), True),
         ("🚨 Motion Events", build_url({'mode': 'motion_events'}), True),
+        ("📊 Motion Activity", build_url({'mode': 'motion_activity'}), True),
         ("📸 Snapshots", build_url({'mode': 'snapshots'}), True),
         ("🔲 Multi-Camera Grid", build_url({'mode': 'grid_view'}), False),
         ("⚙️ Settings", build_url({'mode': 'settings'}), True),
     ]
+    if ADDON.getSettingBool('debug_logging'):
+        menu_items.append(("🩺 Diagnostics", build_url({'mode': 'diagnostics'}), True))
     
-    for title, url, is_folder in menu_items:
-        add_directory_item(title, url, is_folder)
+    add_directory_items([directory_item(title, url, is_folder) for title, url, is_folder in menu_items])
     
     xbmcplugin.setContent(HANDLE, 'videos')
     xbmcplugin.endOfDirectory(HANDLE)
+    # Separate tasks, so that a cancelled prefetch stops between them
+    prefetch('cameras', prefetch_cameras)
+    prefetch('camera thumbnails', prefetch_cameras, True)
 
 def show_live_cameras():
     """Display live cameras"""
+    nvr_api = get_nvr_api()
     cameras = nvr_api.get_cameras()
+    warn_unavailable_sites()
     
     if not cameras:
         show_notification("No cameras found")
         xbmcplugin.endOfDirectory(HANDLE, False)
         return
     
+    # Thumbnail downloads go first so that they feed the bandwidth estimates
+    # used by "auto" quality
+    thumbnails = nvr_api.get_camera_thumbnails([camera.get('thumbnail_url', '') for camera in cameras])
+    
+    # Settings and URL templates are resolved once for the whole listing
+    quality = ADDON.getSetting('stream_quality') or 'medium'
+    stream_url_template = nvr_api.get_stream_url_template(quality)
+    ptz_action = f"RunPlugin({build_url({'mode': 'ptz_control'})}&camera_id={{}})"
+    snapshot_action = f"RunPlugin({build_url({'mode': 'take_snapshot'})}&camera_id={{}})"
+    
+    items = []
     for camera in cameras:
         camera_id = camera.get('id')
         camera_name = camera.get('name', f"Camera {camera_id}")
         camera_status = camera.get('status', 'unknown')
+        quoted_id = urlparse.quote_plus(str(camera_id))
         
         # Status indicator
         status_icon = "🟢" if camera_status == 'online' else "🔴"
         title = f"{status_icon} {camera_name}"
         
         # Stream URL
-        quality = ADDON.getSetting('stream_quality') or 'medium'
-        stream_url = nvr_api.get_camera_stream_url(camera_id, quality)
+        stream_url = stream_url_template.format(camera_id=camera_id)
         
         # Context menu for PTZ and snapshot
         context_menu = []
         if camera.get('ptz_capable'):
-            context_menu.extend([
-                ("PTZ Control", f"RunPlugin({build_url({'mode': 'ptz_control', 'camera_id': camera_id})})"),
-            ])
-        context_menu.append(
-            ("Take Snapshot", f"RunPlugin({build_url({'mode': 'take_snapshot', 'camera_id': camera_id})})")
-        )
+            context_menu.append(("PTZ Control", ptz_action.format(quoted_id)))
+        context_menu.append(("Take Snapshot", snapshot_action.format(quoted_id)))
         
         # Info labels
         info_labels = {
@@ -224,13 +247,15 @@ def show_live_cameras():
         }
         
         # Art
+        thumbnail = thumbnails.get(camera.get('thumbnail_url', ''), '')
         art = {
-            'thumb': camera.get('thumbnail_url', ''),
-            'fanart': camera.get('thumbnail_url', '')
+            'thumb': thumbnail,
+            'fanart': thumbnail
         }
         
-        add_directory_item(title, stream_url, False, info_labels, art, context_menu)
+        items.append(directory_item(title, stream_url, False, info_labels, art, context_menu))
     
+    add_directory_items(items)
     xbmcplugin.setContent(HANDLE, 'videos')
     xbmcplugin.endOfDirectory(HANDLE)
 
@@ -245,84 +270,311 @@ def show_recordings():
         ("📹 By Camera", build_url({'mode': 'recordings_by_camera'})),
     ]
     
-    for title, url in menu_items:
-        add_directory_item(title, url, True)
-    
+    add_directory_items([directory_item(title, url, True) for title, url in menu_items])
     xbmcplugin.endOfDirectory(HANDLE)
+    prefetch("today's recordings", prefetch_recordings, 'today')
+    prefetch("today's recording thumbnails", prefetch_recordings, 'today', None, None, None, True)
 
-def show_recordings_by_date(date_filter):
-    """Show recordings filtered by date"""
-    # Calculate date range
-    now = datetime.now()
+def recordings_date_range(date_filter):
+    """Return (start_date, end_date) datetimes for a date filter"""
+    from datetime import datetime, timedelta
+    
+    # Ranges ending "now" are left open and truncated to the minute so that
+    # revisiting a view produces the same request and hits the response cache
+    now = datetime.now().replace(second=0, microsecond=0)
     if date_filter == 'today':
-        start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        end_date = now
+        start_date = now.replace(hour=0, minute=0)
+        end_date = None
     elif date_filter == 'yesterday':
         yesterday = now - timedelta(days=1)
-        start_date = yesterday.replace(hour=0, minute=0, second=0, microsecond=0)
+        start_date = yesterday.replace(hour=0, minute=0)
         end_date = yesterday.replace(hour=23, minute=59, second=59, microsecond=999999)
     elif date_filter == 'week':
         start_date = now - timedelta(days=7)
-        end_date = now
+        end_date = None
     elif date_filter == 'month':
         start_date = now - timedelta(days=30)
-        end_date = now
-    else:
-        start_date = None
         end_date = None
+    else:
+        # A single day picked in the custom date dialog (YYYY-MM-DD)
+        try:
+            start_date = datetime.strptime(date_filter or '', '%Y-%m-%d')
+            end_date = start_date.replace(hour=23, minute=59, second=59, microsecond=999999)
+        except ValueError:
+            start_date = None
+            end_date = None
+    return start_date, end_date
+
+def recordings_page_range(date_filter, cursor=None, start=None, end=None):
+    """Return the (start, end) query values of a page of recordings"""
+    # Follow-up pages keep the range of the first page
+    if cursor:
+        return start, end
+    start_date, end_date = recordings_date_range(date_filter)
+    return (start_date.isoformat() if start_date else None), (end_date.isoformat() if end_date else None)
+
+def show_recordings_custom_date():
+    """Ask for a day and show its recordings"""
+    value = xbmcgui.Dialog().numeric(1, "Select date")
+    try:
+        day, month, year = (int(part) for part in value.split('/'))
+    except ValueError:
+        xbmcplugin.endOfDirectory(HANDLE, False)
+        return
     
-    # Get recordings
-    recordings = nvr_api.get_recordings(
-        start_date=start_date.isoformat() if start_date else None,
-        end_date=end_date.isoformat() if end_date else None
-    )
+    show_recordings_by_date(f"{year:04d}-{month:02d}-{day:02d}")
+
+def open_recording_index():
+    """Local recording metadata index, or None when disabled
+    
+    The index only holds the main site, so federated views query the sites.
+    """
+    if not ADDON.getSettingBool('enable_recording_index') or is_federated():
+        return None
+    from resources.lib.recording_index import RecordingIndex
+    return RecordingIndex(ADDON_PROFILE)
+
+def load_recordings_page(start_date=None, end_date=None, cursor=None):
+    """One page of recordings in a date range; returns (recordings, next_cursor)
+    
+    Ranges inside the local index's history are answered from the index after
+    an incremental sync, so only recordings newer than its watermark are
+    downloaded. Other ranges, server cursors, and everything until the
+    background service has made its first sync, are queried on the NVR.
+    """
+    from resources.lib.nvrapi import RECORDINGS_PAGE_SIZE, OFFSET_CURSOR_PREFIX
+    
+    nvr_api = get_nvr_api()
+    offset = 0
+    if cursor and cursor.startswith(OFFSET_CURSOR_PREFIX):
+        offset = int(cursor[len(OFFSET_CURSOR_PREFIX):])
+    
+    # Server cursors can only be continued on the server
+    index = None if cursor and not offset else open_recording_index()
+    if index is not None:
+        try:
+            # The history itself is downloaded by the service, never inside a click
+            if index.is_synced() and index.covers(start_date):
+                try:
+                    index.sync(nvr_api)
+                except Exception as e:
+                    xbmc.log(f"[{ADDON_ID}] Recording index sync failed: {str(e)}", xbmc.LOGWARNING)
+                recordings = index.page(start_date, end_date, offset=offset, limit=RECORDINGS_PAGE_SIZE + 1)
+                next_cursor = None
+                if len(recordings) > RECORDINGS_PAGE_SIZE:
+                    next_cursor = f"{OFFSET_CURSOR_PREFIX}{offset + RECORDINGS_PAGE_SIZE}"
+                return recordings[:RECORDINGS_PAGE_SIZE], next_cursor
+        finally:
+            index.close()
+    
+    from resources.lib.records import RECORDING_FIELDS
+    return nvr_api.get_recordings_page(start_date=start_date, end_date=end_date, cursor=cursor,
+                                       fields=RECORDING_FIELDS)
+
+def show_recordings_by_date(date_filter, cursor=None, start=None, end=None):
+    """Show recordings filtered by date, one page at a time"""
+    start_param, end_param = recordings_page_range(date_filter, cursor, start, end)
+    
+    # Get one page of recordings
+    recordings, next_cursor = load_recordings_page(start_param, end_param, cursor)
+    warn_unavailable_sites()
     
     if not recordings:
         show_notification("No recordings found for selected period")
         xbmcplugin.endOfDirectory(HANDLE, False)
         return
     
-    for recording in recordings:
-        camera_name = recording.get('camera_name', 'Unknown Camera')
-        start_time = recording.get('start_time', '')
-        duration = recording.get('duration', 0)
-        file_size = recording.get('file_size', 0)
-        
-        # Format duration
-        duration_str = f"{duration // 60}:{duration % 60:02d}"
-        
-        # Format file size
-        if file_size > 1024 * 1024 * 1024:
-            size_str = f"{file_size / (1024 * 1024 * 1024):.1f} GB"
-        elif file_size > 1024 * 1024:
-            size_str = f"{file_size / (1024 * 1024):.1f} MB"
-        else:
-            size_str = f"{file_size / 1024:.1f} KB"
-        
-        title = f"{camera_name} - {start_time} ({duration_str})"
-        
-        info_labels = {
-            'title': title,
-            'plot': f"Recording from {camera_name}\nDuration: {duration_str}\nSize: {size_str}",
-            'duration': duration,
-            'mediatype': 'video'
-        }
-        
-        playback_url = recording.get('playback_url', '')
-        add_directory_item(title, playback_url, False, info_labels)
+    thumbnails = get_nvr_api().get_recording_thumbnails([r.get('thumbnail_url', '') for r in recordings])
+    seekable = ADDON.getSettingBool('seekable_playback')
+    items = [recording_item(recording, thumbnails, seekable) for recording in recordings]
+    
+    if next_cursor:
+        next_query = {'mode': 'recordings_date', 'date': date_filter, 'cursor': next_cursor}
+        if start_param:
+            next_query['start'] = start_param
+        if end_param:
+            next_query['end'] = end_param
+        items.append(directory_item("➡️ Next page", build_url(next_query), True))
+    
+    add_directory_items(items)
+    xbmcplugin.setContent(HANDLE, 'videos')
+    xbmcplugin.endOfDirectory(HANDLE)
+    
+    if next_cursor:
+        prefetch('next recordings page', prefetch_recordings, date_filter, next_cursor, start_param, end_param)
+        prefetch('next recordings page thumbnails', prefetch_recordings,
+                 date_filter, next_cursor, start_param, end_param, True)
+
+def recording_item(recording, thumbnails=None, seekable=False):
+    """Build a playable recording entry"""
+    camera_name = recording.get('camera_name', 'Unknown Camera')
+    start_time = recording.get('start_time', '')
+    duration = recording.get('duration', 0)
+    file_size = recording.get('file_size', 0)
+    
+    # Format duration
+    duration_str = f"{duration // 60}:{duration % 60:02d}"
+    
+    # Format file size
+    if file_size > 1024 * 1024 * 1024:
+        size_str = f"{file_size / (1024 * 1024 * 1024):.1f} GB"
+    elif file_size > 1024 * 1024:
+        size_str = f"{file_size / (1024 * 1024):.1f} MB"
+    else:
+        size_str = f"{file_size / 1024:.1f} KB"
+    
+    title = f"{camera_name} - {start_time} ({duration_str})"
+    
+    info_labels = {
+        'title': title,
+        'plot': f"Recording from {camera_name}\nDuration: {duration_str}\nSize: {size_str}",
+        'duration': duration,
+        'mediatype': 'video'
+    }
+    
+    art = None
+    thumbnail_url = recording.get('thumbnail_url')
+    if thumbnail_url:
+        thumbnail = (thumbnails or {}).get(thumbnail_url, thumbnail_url)
+        art = {'thumb': thumbnail}
+    
+    playback_url = recording.get('playback_url', '')
+    if seekable and playback_url and recording.get('id') is not None:
+        # Played through a segment manifest built when the item is started
+        url = build_url({'mode': 'play_recording', 'recording_id': recording['id'], 'url': playback_url,
+                         'duration': duration, 'size': file_size})
+        return directory_item(title, url, False, info_labels, art, playable=True)
+    return directory_item(title, playback_url, False, info_labels, art)
+
+def play_recording(recording_id, playback_url, duration=0, file_size=0):
+    """Resolve a recording to a byte-range manifest, or its plain URL without an index"""
+    from resources.lib.segments import SegmentIndex, MANIFEST_MIME_TYPE
+    
+    manifest = SegmentIndex(ADDON_PROFILE).manifest(get_nvr_api(), recording_id, playback_url,
+                                                    int(duration or 0), int(file_size or 0))
+    list_item = xbmcgui.ListItem(path=manifest or playback_url, offscreen=True)
+    if manifest:
+        list_item.setMimeType(MANIFEST_MIME_TYPE)
+        list_item.setContentLookup(False)
+    else:
+        xbmc.log(f"[{ADDON_ID}] No segment index for recording {recording_id}, playing it directly", xbmc.LOGDEBUG)
+    xbmcplugin.setResolvedUrl(HANDLE, True, list_item)
+
+def show_recordings_by_camera(date_filter='today'):
+    """Show recordings of all cameras, queried in parallel and merged newest first"""
+    nvr_api = get_nvr_api()
+    from itertools import islice
+    from resources.lib.fanout import merge_sorted
+    from resources.lib.nvrapi import RECORDINGS_PAGE_SIZE
+    from resources.lib.records import RECORDING_FIELDS
+    
+    cameras = nvr_api.get_cameras()
+    
+    if not cameras:
+        show_notification("No cameras found")
+        xbmcplugin.endOfDirectory(HANDLE, False)
+        return
+    
+    start_date, end_date = recordings_date_range(date_filter)
+    names = {camera.get('id'): camera.get('name', f"Camera {camera.get('id')}") for camera in cameras}
+    outcome = nvr_api.get_recordings_per_camera(
+        list(names),
+        start_date=start_date.isoformat() if start_date else None,
+        end_date=end_date.isoformat() if end_date else None,
+        fields=RECORDING_FIELDS
+    )
+    warn_unavailable_sites()
+    
+    # Partial results are still shown when some cameras are slow or failing
+    missing = [names[camera_id] for camera_id in list(outcome.failed) + outcome.timed_out]
+    if missing:
+        xbmc.log(f"[{ADDON_ID}] Recordings unavailable for: {', '.join(map(str, missing))}", xbmc.LOGWARNING)
+        show_notification(f"{len(missing)} camera(s) did not respond", icon=xbmcgui.NOTIFICATION_WARNING)
+    
+    per_camera = []
+    for camera_id, recordings in outcome.results.items():
+        for recording in recordings:
+            recording.setdefault('camera_name', names[camera_id])
+        per_camera.append(recordings)
+    
+    merged = merge_sorted(per_camera, key=lambda r: r.get('start_time', ''), reverse=True)
+    page = list(islice(merged, RECORDINGS_PAGE_SIZE))
+    thumbnails = nvr_api.get_recording_thumbnails([r.get('thumbnail_url', '') for r in page])
+    seekable = ADDON.getSettingBool('seekable_playback')
+    items = [recording_item(recording, thumbnails, seekable) for recording in page]
+    
+    if not items:
+        show_notification("No recordings found for selected period")
+        xbmcplugin.endOfDirectory(HANDLE, False)
+        return
     
+    add_directory_items(items)
     xbmcplugin.setContent(HANDLE, 'videos')
     xbmcplugin.endOfDirectory(HANDLE)
 
-def show_motion_events():
+def open_motion_index():
+    """Local motion event index kept by the background service, or None"""
+    if not ADDON.getSettingBool('enable_event_index'):
+        return None
+    from resources.lib.motion_index import MotionIndex
+    return MotionIndex(ADDON_PROFILE)
+
+def load_motion_events(camera_id=None, min_confidence=None, offset=0):
+    """One page of events and whether more follow
+    
+    Served from the local index while the background service keeps it
+    current, otherwise from the NVR (latest events only, no paging).
+    """
+    from resources.lib.motion_index import PAGE_SIZE
+    
+    # The index only holds the main site's events
+    index = None if is_federated() else open_motion_index()
+    try:
+        if index is not None and index.is_live():
+            events = index.query(camera_id, min_confidence, limit=PAGE_SIZE + 1, offset=offset)
+            return events[:PAGE_SIZE], len(events) > PAGE_SIZE
+    finally:
+        if index is not None:
+            index.close()
+    
+    from resources.lib.records import MOTION_EVENT_FIELDS
+    events = get_nvr_api().get_motion_events(camera_id, limit=PAGE_SIZE, fields=MOTION_EVENT_FIELDS)
+    if min_confidence is not None:
+        events = [event for event in events if event.get('confidence', 0) >= min_confidence]
+    return events, False
+
+def show_motion_events(camera_id=None, min_confidence=None, offset=0):
     """Display motion detection events"""
-    events = nvr_api.get_motion_events()
+    min_confidence = float(min_confidence) if min_confidence else None
+    offset = int(offset or 0)
+    events, has_more = load_motion_events(camera_id, min_confidence, offset)
+    warn_unavailable_sites()
     
-    if not events:
+    if not events and not offset:
         show_notification("No motion events found")
         xbmcplugin.endOfDirectory(HANDLE, False)
         return
     
+    base_query = {'mode': 'motion_events'}
+    if camera_id:
+        base_query['camera_id'] = camera_id
+    if min_confidence is not None:
+        base_query['min_confidence'] = f"{min_confidence:g}"
+    
+    # Filters
+    items = []
+    if not offset:
+        if min_confidence is None:
+            items.append(directory_item("🔴 High confidence only", build_url({**base_query, 'min_confidence': 80}), True))
+        else:
+            items.append(directory_item("🚨 All confidence levels",
+                                        build_url({k: v for k, v in base_query.items() if k != 'min_confidence'}), True))
+        if camera_id:
+            items.append(directory_item("📹 All cameras",
+                                        build_url({k: v for k, v in base_query.items() if k != 'camera_id'}), True))
+    
+    camera_action = f"Container.Update({build_url({'mode': 'motion_events'})}&camera_id={{}})"
+    
     for event in events:
         camera_name = event.get('camera_name', 'Unknown Camera')
         timestamp = event.get('timestamp', '')
@@ -336,40 +588,144 @@ def show_motion_events():
         else:
             confidence_icon = "🟢"  # Low confidence
         
-        title = f"{confidence_icon} {camera_name} - {timestamp} ({confidence}%)"
+        title = f"{confidence_icon} {camera_name} - {timestamp} ({confidence:g}%)"
         
         info_labels = {
             'title': title,
-            'plot': f"Motion detected on {camera_name}\nConfidence: {confidence}%\nTime: {timestamp}",
+            'plot': f"Motion detected on {camera_name}\nConfidence: {confidence:g}%\nTime: {timestamp}",
             'mediatype': 'video'
         }
         
+        context_menu = [("Events from this camera",
+                         camera_action.format(urlparse.quote_plus(str(event.get('camera_id', '')))))]
+        
         # Link to recording if available
         recording_url = event.get('recording_url', '')
         if recording_url:
-            add_directory_item(title, recording_url, False, info_labels)
+            items.append(directory_item(title, recording_url, False, info_labels, context_menu=context_menu))
         else:
-            add_directory_item(title, "", True, info_labels)
+            items.append(directory_item(title, "", True, info_labels, context_menu=context_menu))
     
+    if has_more:
+        items.append(directory_item("➡️ Next page", build_url({**base_query, 'offset': offset + len(events)}), True))
+    
+    add_directory_items(items)
+    xbmcplugin.setContent(HANDLE, 'videos')
+    xbmcplugin.endOfDirectory(HANDLE)
+
+def sparkline(values):
+    """One bar per value, scaled to the largest"""
+    peak = max(values, default=0)
+    if not peak:
+        return SPARKLINE_LEVELS[0] * len(values)
+    top = len(SPARKLINE_LEVELS) - 1
+    return ''.join(SPARKLINE_LEVELS[round(value * top / peak)] for value in values)
+
+def dwell_summary(histogram):
+    """Dwell-time histogram as text, e.g. <10s: 4 · 10-30s: 2 · ≥300s: 1"""
+    from resources.lib.motion_index import DWELL_BINS
+    labels = [f"<{DWELL_BINS[0]}s"]
+    labels += [f"{low}-{high}s" for low, high in zip(DWELL_BINS, DWELL_BINS[1:])]
+    labels.append(f"≥{DWELL_BINS[-1]}s")
+    return ' · '.join(f"{label}: {count}" for label, count in zip(labels, histogram) if count)
+
+def show_motion_activity(camera_id=None, by_day=False):
+    """Motion activity per camera, then per day with an hourly sparkline"""
+    from datetime import datetime, timedelta
+    from resources.lib.motion_index import ACTIVITY_VIEW_DAYS
+    
+    index = open_motion_index()
+    if index is None:
+        show_notification("Enable the background event index in settings to see motion activity")
+        xbmcplugin.endOfDirectory(HANDLE, False)
+        return
+    
+    since = (datetime.now() - timedelta(days=ACTIVITY_VIEW_DAYS - 1)).strftime('%Y-%m-%dT00')
+    try:
+        if camera_id or by_day:
+            cameras = None
+            hours = index.activity_by_hour(since, camera_id)
+        else:
+            cameras = index.activity_by_camera(since)
+            hours = None
+    finally:
+        index.close()
+    
+    if not cameras and not hours:
+        show_notification("No motion activity recorded yet")
+        xbmcplugin.endOfDirectory(HANDLE, False)
+        return
+    
+    items = []
+    if cameras is not None:
+        total = sum(camera['events'] for camera in cameras)
+        items.append(directory_item(f"🗓️ All cameras - {total} events in {ACTIVITY_VIEW_DAYS} days",
+                                    build_url({'mode': 'motion_activity', 'by_day': 1}), True))
+        for camera in cameras:
+            name = camera['camera_name'] or f"Camera {camera['camera_id']}"
+            title = f"📹 {name} - {camera['events']} events, peak {camera['max_confidence'] or 0:g}%"
+            info_labels = {
+                'title': title,
+                'plot': f"{camera['events']} motion events in the last {ACTIVITY_VIEW_DAYS} days\n"
+                        f"Total dwell time: {camera['dwell'] / 60:.0f} min",
+            }
+            items.append(directory_item(title, build_url({'mode': 'motion_activity', 'camera_id': camera['camera_id']}),
+                                        True, info_labels))
+    else:
+        # Hourly rows grouped by day, newest day first
+        days = {}
+        for row in hours:
+            days.setdefault(row['hour'][:10], []).append(row)
+        events_url = build_url({'mode': 'motion_events', 'camera_id': camera_id} if camera_id else {'mode': 'motion_events'})
+        for day in sorted(days, reverse=True):
+            rows = days[day]
+            per_hour = [0] * 24
+            for row in rows:
+                per_hour[int(row['hour'][11:13] or 0)] += row['events']
+            events = sum(per_hour)
+            peak = max(row['max_confidence'] or 0 for row in rows)
+            busiest = per_hour.index(max(per_hour))
+            histogram = [sum(counts) for counts in zip(*(row['dwell_histogram'] for row in rows))]
+            title = f"{day}  {sparkline(per_hour)}  {events} events, peak {peak:g}%"
+            info_labels = {
+                'title': title,
+                'plot': f"Busiest hour: {busiest:02d}:00 ({per_hour[busiest]} events)\n"
+                        f"Dwell: {dwell_summary(histogram)}",
+            }
+            items.append(directory_item(title, events_url, True, info_labels))
+    
+    add_directory_items(items)
     xbmcplugin.setContent(HANDLE, 'videos')
     xbmcplugin.endOfDirectory(HANDLE)
 
 def show_grid_view():
     """Display multi-camera grid view"""
+    nvr_api = get_nvr_api()
     cameras = nvr_api.get_cameras()
+    warn_unavailable_sites()
     online_cameras = [cam for cam in cameras if cam.get('status') == 'online']
     
     if len(online_cameras) < 2:
         show_notification("Need at least 2 online cameras for grid view")
         return
     
-    # Create playlist for grid view
+    quality = ADDON.getSetting('grid_quality') or 'low'  # Lower quality for grid
+    grid_cameras = online_cameras[:9]  # Max 9 cameras in 3x3 grid
+    
+    # One composited stream, so Kodi decodes a single stream instead of nine
+    if ADDON.getSettingBool('grid_mosaic'):
+        mosaic_url = nvr_api.get_grid_stream_url([camera.get('id') for camera in grid_cameras], quality)
+        if mosaic_url:
+            list_item = xbmcgui.ListItem(label="Camera Grid")
+            list_item.setInfo('video', {'title': f"Camera Grid ({len(grid_cameras)} cameras)"})
+            xbmc.Player().play(mosaic_url, list_item)
+            return
+    
+    # Without a mosaic server, play the cameras as a playlist
     playlist = xbmc.PlayList(xbmc.PLAYLIST_VIDEO)
     playlist.clear()
     
-    quality = ADDON.getSetting('grid_quality') or 'low'  # Lower quality for grid
-    
-    for camera in online_cameras[:9]:  # Max 9 cameras in 3x3 grid
+    for camera in grid_cameras:
         camera_id = camera.get('id')
         camera_name = camera.get('name', f"Camera {camera_id}")
         stream_url = nvr_api.get_camera_stream_url(camera_id, quality)
@@ -382,33 +738,25 @@ def show_grid_view():
     xbmc.Player().play(playlist)
 
 def ptz_control_menu(camera_id):
-    """Show PTZ control menu"""
-    dialog = xbmcgui.Dialog()
-    
-    options = [
-        "Pan Left",
-        "Pan Right", 
-        "Tilt Up",
-        "Tilt Down",
-        "Zoom In",
-        "Zoom Out",
-        "Home Position"
-    ]
-    
-    selected = dialog.select("PTZ Control", options)
-    
-    if selected >= 0:
-        commands = ['pan_left', 'pan_right', 'tilt_up', 'tilt_down', 'zoom_in', 'zoom_out', 'home']
-        command = commands[selected]
-        
-        if nvr_api.ptz_control(camera_id, command):
-            show_notification(f"PTZ command sent: {options[selected]}")
-        else:
-            show_notification("PTZ command failed", icon=xbmcgui.NOTIFICATION_ERROR)
+    """Steer a PTZ camera from a window that keeps one NVR connection open"""
+    from resources.lib.ptz import PTZController, PTZWindow
+    
+    nvr_api = get_nvr_api()
+    camera_name = next((camera.get('name') for camera in nvr_api.get_cameras()
+                        if str(camera.get('id')) == str(camera_id)), None) or f"Camera {camera_id}"
+    
+    controller = PTZController(nvr_api, camera_id)
+    controller.start()
+    window = PTZWindow(controller, camera_name)
+    try:
+        window.doModal()
+    finally:
+        controller.close()
+        del window
 
 def take_snapshot(camera_id):
     """Take snapshot from camera"""
-    if nvr_api.take_snapshot(camera_id):
+    if get_nvr_api().take_snapshot(camera_id):
         show_notification("Snapshot captured successfully")
     else:
         show_notification("Snapshot failed", icon=xbmcgui.NOTIFICATION_ERROR)
@@ -417,11 +765,118 @@ def open_settings():
     """Open addon settings"""
     ADDON.openSettings()
 
+def show_diagnostics():
+    """Latency percentiles per router mode and NVR endpoint, relayed streams and saved profiles"""
+    from resources.lib.metrics import open_metrics, percentile
+    from resources.lib.profiling import list_profiles, summarize
+    from resources.lib.relay import relay_status
+    
+    items = []
+    histograms = open_metrics(ADDON_PROFILE).load()
+    
+    # Modes first, then endpoints; slowest first within each
+    for key in sorted(histograms, key=lambda k: (not k.startswith('mode:'), -percentile(histograms[k], 0.95))):
+        stats = histograms[key]
+        kind, _, name = key.partition(':')
+        calls = stats['count']
+        if not calls and not stats['cache_hits']:
+            continue
+        timing = f"p50 {percentile(stats, 0.5)} ms · p95 {percentile(stats, 0.95)} ms" if calls else "cached only"
+        if kind == 'mode':
+            title = f"🧭 {name}  {timing}  ({calls} calls)"
+        else:
+            requests_seen = calls + stats['cache_hits']
+            cached = f", {stats['cache_hits'] * 100 // requests_seen}% cached" if stats['cache_hits'] else ""
+            title = f"🌐 {name}  {timing}  ({calls} requests{cached})"
+        plot = [f"Samples: {calls}", f"Mean: {stats['total_ms'] / calls:.0f} ms" if calls else "Mean: -"]
+        if kind == 'endpoint':
+            plot.append(f"Errors: {stats['errors']}")
+            plot.append(f"Cache hits: {stats['cache_hits']}")
+            if calls:
+                plot.append(f"Average size: {stats['bytes'] / calls / 1024:.1f} KB")
+        items.append(directory_item(title, "", False, {'title': title, 'plot': '\n'.join(plot)}))
+    
+    # Streams shared by the service's relay since it started
+    for stream in (relay_status(ADDON_PROFILE) or {}).get('streams', ()):
+        saved_mb = stream['saved_bytes'] / (1024 * 1024)
+        title = f"🔁 Camera {stream['camera_id']}  {stream['subscribers']} watching · {saved_mb:.1f} MB saved"
+        plot = [f"Stream: {stream['query']}",
+                f"From NVR: {stream['upstream_bytes'] / (1024 * 1024):.1f} MB",
+                f"To players: {stream['delivered_bytes'] / (1024 * 1024):.1f} MB",
+                f"Pre-roll: {stream.get('buffered_bytes', 0) / 1024:.0f} KB{' (pinned)' if stream.get('pinned') else ''}"]
+        items.append(directory_item(title, "", False, {'title': title, 'plot': '\n'.join(plot)}))
+    
+    for path, label in list_profiles(ADDON_PROFILE):
+        title = f"🔬 Profile: {label}"
+        items.append(directory_item(title, "", False, {'title': title, 'plot': summarize(path)}))
+    
+    if not items:
+        show_notification("No diagnostics recorded yet")
+        xbmcplugin.endOfDirectory(HANDLE, False)
+        return
+    
+    items.append(directory_item("🗑️ Reset statistics", build_url({'mode': 'diagnostics_reset'}), False))
+    add_directory_items(items)
+    xbmcplugin.endOfDirectory(HANDLE, cacheToDisc=False)
+
+def reset_diagnostics():
+    """Forget the recorded latency histograms"""
+    from resources.lib.metrics import open_metrics
+    open_metrics(ADDON_PROFILE).reset()
+    show_notification("Diagnostics reset")
+    xbmc.executebuiltin('Container.Refresh')
+
+def check_startup_budget(mode, dispatch_ms):
+    """Log cold-start cost of this invocation against the mode's budget"""
+    startup_ms = dispatch_ms + _client_init_ms
+    budget_ms = STARTUP_BUDGETS_MS.get(mode, DEFAULT_STARTUP_BUDGET_MS)
+    message = (f"[{ADDON_ID}] Startup mode={mode} total={startup_ms:.1f}ms "
+               f"(dispatch={dispatch_ms:.1f}ms client={_client_init_ms:.1f}ms budget={budget_ms}ms)")
+    if startup_ms > budget_ms:
+        xbmc.log(message + " over budget", xbmc.LOGWARNING)
+    else:
+        xbmc.log(message, xbmc.LOGDEBUG)
+    return startup_ms
+
 def router(paramstring):
     """Route addon calls"""
     params = dict(urlparse.parse_qsl(paramstring))
     mode = params.get('mode')
+    dispatch_ms = (time.perf_counter() - PROCESS_START) * 1000
+    
+    # A prefetch still running for the previous view stops at its next task
+    if os.path.exists(os.path.join(ADDON_PROFILE, PREFETCH_MARKER)):
+        from resources.lib.prefetch import cancel_running
+        cancel_running(ADDON_PROFILE)
+    
+    # Profiling is opt-in on top of debug logging; it slows every call down
+    try:
+        if ADDON.getSettingBool('debug_logging') and ADDON.getSettingBool('profile_calls'):
+            from resources.lib.profiling import profile_call
+            profile_call(ADDON_PROFILE, mode or 'main_menu', dispatch, mode, params)
+        else:
+            dispatch(mode, params)
+    finally:
+        check_startup_budget(mode, dispatch_ms)
+        record_mode_time(mode)
+    
+    # Not part of the mode's time: the user is already looking at the listing
+    run_prefetch()
+
+def record_mode_time(mode):
+    """Add this invocation's total time to the per-mode histogram
     
+    Only modes that reached the NVR are recorded; menus and settings would
+    otherwise pay for loading and rewriting the metrics on every click.
+    """
+    if _nvr_api is None:
+        return
+    from resources.lib.metrics import open_metrics
+    elapsed_ms = (time.perf_counter() - PROCESS_START) * 1000
+    open_metrics(ADDON_PROFILE).record('mode', mode or 'main_menu', elapsed_ms)
+
+def dispatch(mode, params):
+    """Call the handler for a router mode"""
     if mode is None:
         main_menu()
     elif mode == 'live_cameras':
@@ -429,12 +884,17 @@ def router(paramstring):
     elif mode == 'recordings':
         show_recordings()
     elif mode == 'recordings_date':
-        show_recordings_by_date(params.get('date'))
+        show_recordings_by_date(params.get('date'), params.get('cursor'), params.get('start'), params.get('end'))
+    elif mode == 'recordings_custom_date':
+        show_recordings_custom_date()
     elif mode == 'recordings_by_camera':
-        # TODO: Implement recordings by camera
-        show_recordings()
+        show_recordings_by_camera(params.get('date', 'today'))
+    elif mode == 'play_recording':
+        play_recording(params.get('recording_id'), params.get('url'), params.get('duration'), params.get('size'))
     elif mode == 'motion_events':
-        show_motion_events()
+        show_motion_events(params.get('camera_id'), params.get('min_confidence'), params.get('offset'))
+    elif mode == 'motion_activity':
+        show_motion_activity(params.get('camera_id'), bool(params.get('by_day')))
     elif mode == 'grid_view':
         show_grid_view()
     elif mode == 'ptz_control':
@@ -443,6 +903,10 @@ def router(paramstring):
         take_snapshot(params.get('camera_id'))
     elif mode == 'settings':
         open_settings()
+    elif mode == 'diagnostics':
+        show_diagnostics()
+    elif mode == 'diagnostics_reset':
+        reset_diagnostics()
     else:
         main_menu()
 
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR Kodi Addon - support library
+
+Copyright (C) 2025 AI-IT Inc
+Licensed under GPL-3.0
+"""
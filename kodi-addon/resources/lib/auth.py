@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR Kodi Addon - Session Token Authentication
+Exchange the NVR credentials once for a bearer token shared by all invocations
+
+With HTTP Basic auth the NVR verifies the password, usually with a
+deliberately slow hash, on every single request. The token is obtained once,
+kept in the profile (readable by its owner only), refreshed shortly before it
+expires and reused by later plugin invocations and the service. NVRs without
+a token endpoint are remembered and keep getting Basic auth.
+
+Copyright (C) 2025 AI-IT Inc
+Licensed under GPL-3.0
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+from requests.auth import AuthBase, HTTPBasicAuth
+
+TOKEN_FILE = 'session.json'
+
+LOGIN_ENDPOINT = 'auth/login'
+REFRESH_ENDPOINT = 'auth/refresh'
+
+# Tokens are refreshed this long before they expire (seconds)
+REFRESH_MARGIN = 300
+
+# Lifetime assumed when the NVR does not state one (seconds)
+DEFAULT_TOKEN_LIFETIME = 3600
+
+# An NVR without a token endpoint is asked again after this long (seconds)
+BASIC_RECHECK_INTERVAL = 24 * 3600
+
+# After a failed login, Basic auth is used for this long before trying again
+# (seconds), so that an NVR refusing logins does not double every request
+LOGIN_RETRY_INTERVAL = 60
+
+# Answers of an NVR that has no token endpoint
+UNSUPPORTED_STATUSES = (404, 405, 501)
+
+AUTH_TIMEOUT = 5
+
+
+def _no_auth(request):
+    return request
+
+
+class TokenAuth(AuthBase):
+    """requests auth that sends a bearer token, or Basic credentials without one
+
+    A request answered with 401 is sent once more with a new token, in case
+    the NVR restarted and forgot the one it issued.
+    """
+
+    def __init__(self, session, base_url, username, password, directory):
+        self.session = session
+        self.base_url = base_url
+        self.path = os.path.join(directory, TOKEN_FILE)
+        self._basic = HTTPBasicAuth(username, password)
+        # Saved state only applies to the NVR and credentials it was issued for
+        self._owner = hashlib.sha256(f"{base_url}\0{username}\0{password}".encode('utf-8')).hexdigest()
+        self._credentials = {'username': username, 'password': password}
+        self._lock = threading.Lock()
+        self._state = self._load()
+        self._retry_login_at = 0
+
+    def __call__(self, request):
+        token = self.token()
+        if token is None:
+            return self._basic(request)
+        request.headers['Authorization'] = f"Bearer {token}"
+        request.register_hook('response', self._retry_unauthorized)
+        return request
+
+    def token(self):
+        """A usable token, logging in or refreshing first if needed; None means Basic auth"""
+        with self._lock:
+            state = self._state
+            now = time.time()
+            if state.get('basic') and now - state['basic'] < BASIC_RECHECK_INTERVAL:
+                return None
+            token = state.get('token')
+            expires = state.get('expires', 0)
+            if token and expires - now > REFRESH_MARGIN:
+                return token
+            if token and expires > now:
+                refreshed = self._request_token(REFRESH_ENDPOINT, headers={'Authorization': f"Bearer {token}"})
+                if refreshed:
+                    return refreshed
+            if now < self._retry_login_at:
+                return None
+            token = self._request_token(LOGIN_ENDPOINT, json=self._credentials)
+            if token is None:
+                self._retry_login_at = now + LOGIN_RETRY_INTERVAL
+            return token
+
+    def invalidate(self, token):
+        """Forget a token the NVR rejected, unless another thread already replaced it"""
+        with self._lock:
+            if self._state.get('token') == token:
+                self._state = {}
+                self._save()
+
+    def _request_token(self, endpoint, **kwargs):
+        """POST to a token endpoint and keep the token it returns; call with the lock held"""
+        try:
+            response = self.session.post(f"{self.base_url}/{endpoint}", auth=_no_auth,
+                                         timeout=AUTH_TIMEOUT, **kwargs)
+        except Exception:
+            # The request that needs the token will report the NVR being down
+            return None
+        try:
+            if response.status_code in UNSUPPORTED_STATUSES and endpoint == LOGIN_ENDPOINT:
+                self._state = {'basic': time.time()}
+                self._save()
+                return None
+            if response.status_code != 200:
+                return None
+            data = response.json()
+        except ValueError:
+            return None
+        finally:
+            response.close()
+
+        token = (data.get('token') or data.get('access_token')) if isinstance(data, dict) else None
+        if not token:
+            return None
+        try:
+            lifetime = float(data.get('expires_in') or DEFAULT_TOKEN_LIFETIME)
+        except (TypeError, ValueError):
+            lifetime = DEFAULT_TOKEN_LIFETIME
+        self._state = {'token': token, 'expires': time.time() + lifetime}
+        self._save()
+        return token
+
+    def _retry_unauthorized(self, response, **kwargs):
+        """Response hook: resend a rejected request once with a fresh token"""
+        if response.status_code != 401:
+            return response
+        rejected = response.request.headers.get('Authorization', '')[len('Bearer '):]
+        # Drain the body so that the connection goes back to the pool
+        response.content
+        response.close()
+        self.invalidate(rejected)
+
+        request = response.request.copy()
+        request.deregister_hook('response', self._retry_unauthorized)
+        token = self.token()
+        if token is None:
+            self._basic(request)
+        else:
+            request.headers['Authorization'] = f"Bearer {token}"
+        retried = response.connection.send(request, **kwargs)
+        retried.history.append(response)
+        retried.request = request
+        return retried
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.pop('owner', None) != self._owner:
+            return {}
+        return data
+
+    def _save(self):
+        """Write the state readable by its owner only (it grants access to the NVR)"""
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'owner': self._owner, **self._state}, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR Kodi Addon - Bandwidth Estimator
+Rolling throughput and round-trip estimates for adaptive stream quality
+
+Estimates are exponentially weighted averages measured on the listing and
+thumbnail downloads the addon makes anyway, with no probe traffic of its own,
+kept in the addon profile so every plugin invocation starts from what earlier
+ones measured.
+
+Copyright (C) 2025 AI-IT Inc
+Licensed under GPL-3.0
+"""
+
+import os
+import json
+import atexit
+import time
+import threading
+
+ESTIMATES_FILE = 'bandwidth.json'
+
+# Weight of a new sample in the rolling averages
+SMOOTHING = 0.3
+
+# Transfers smaller than this mostly measure latency, not throughput
+MIN_SAMPLE_BYTES = 32 * 1024
+
+# Bitrate each resolution needs (bits per second), lowest first
+RESOLUTION_BITRATES = (
+    ('480p', 1000000),
+    ('720p', 2000000),
+    ('1080p', 4000000),
+    ('4k', 12000000),
+)
+
+# Used until the first throughput sample arrives
+DEFAULT_RESOLUTION = '720p'
+
+# Throughput must exceed the stream bitrate by this factor; more on slow links
+HEADROOM = 1.5
+HIGH_RTT = 0.25
+HIGH_RTT_HEADROOM = 2.0
+
+
+class BandwidthEstimator:
+    """Rolling estimates of throughput and RTT to the NVR"""
+
+    def __init__(self, profile_dir):
+        self.path = os.path.join(profile_dir, ESTIMATES_FILE)
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.throughput = None
+        self.rtt = None
+        self.updated = 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.throughput = data.get('throughput')
+            self.rtt = data.get('rtt')
+            self.updated = data.get('updated', 0)
+        except (OSError, ValueError, AttributeError):
+            pass
+        atexit.register(self.save)
+
+    def record(self, size, seconds, rtt=None):
+        """Add a transfer of `size` bytes that took `seconds` after the response headers
+
+        Transfers below MIN_SAMPLE_BYTES only contribute their RTT.
+        """
+        with self._lock:
+            if size >= MIN_SAMPLE_BYTES and seconds > 0:
+                self.throughput = self._smooth(self.throughput, size * 8 / seconds)
+            if rtt is not None:
+                self.rtt = self._smooth(self.rtt, rtt)
+            self.updated = time.time()
+            self._dirty = True
+
+    def choose_resolution(self, max_resolution='4k', streams=1):
+        """Highest resolution whose bitrate fits the estimated throughput
+
+        `streams` is the number of streams played side by side. Without an
+        estimate DEFAULT_RESOLUTION is used.
+        """
+        if self.throughput is None:
+            resolutions = [resolution for resolution, _ in RESOLUTION_BITRATES]
+            return min(DEFAULT_RESOLUTION, max_resolution, key=resolutions.index)
+        headroom = HIGH_RTT_HEADROOM if (self.rtt or 0) > HIGH_RTT else HEADROOM
+        available = (self.throughput or 0) / max(streams, 1)
+        chosen = RESOLUTION_BITRATES[0][0]
+        for resolution, bitrate in RESOLUTION_BITRATES:
+            if bitrate * headroom <= available:
+                chosen = resolution
+            if resolution == max_resolution:
+                break
+        return chosen
+
+    def save(self):
+        """Write the estimates once, when the invocation ends"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {'throughput': self.throughput, 'rtt': self.rtt, 'updated': self.updated}
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.path)
+            except OSError:
+                pass
+            self._dirty = False
+
+    @staticmethod
+    def _smooth(current, sample):
+        if current is None:
+            return sample
+        return current + SMOOTHING * (sample - current)
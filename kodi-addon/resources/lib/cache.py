@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR Kodi Addon - Response Cache
+Persistent on-disk cache for NVR API responses
+
+Every navigation in Kodi starts a fresh plugin process, so responses are kept
+under the addon profile directory and shared between invocations.
+
+Copyright (C) 2025 AI-IT Inc
+Licensed under GPL-3.0
+"""
+
+import os
+import json
+import atexit
+import time
+import hashlib
+import threading
+
+# Default freshness per endpoint (seconds)
+DEFAULT_TTLS = {
+    'cameras': 60,
+    'recordings': 30,
+    'motion-events': 15,
+}
+
+# How long an expired entry may still be served while it is revalidated
+DEFAULT_STALE_WINDOW = 300
+
+# Total size of cached bodies before LRU eviction kicks in
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+
+
+class CacheEntry:
+    """Cached response body with its validators"""
+
+    __slots__ = ('key', 'filename', 'size', 'stored', 'expires', 'etag', 'last_modified', 'last_access')
+
+    def __init__(self, key, filename, size, stored, expires, etag=None, last_modified=None, last_access=None):
+        self.key = key
+        self.filename = filename
+        self.size = size
+        self.stored = stored
+        self.expires = expires
+        self.etag = etag
+        self.last_modified = last_modified
+        self.last_access = last_access or stored
+
+    def is_fresh(self, now=None):
+        return (now or time.time()) < self.expires
+
+    def is_usable_stale(self, stale_window, now=None):
+        return (now or time.time()) < self.expires + stale_window
+
+    def validators(self):
+        """Conditional request headers for revalidation"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def to_dict(self):
+        return {
+            'filename': self.filename,
+            'size': self.size,
+            'stored': self.stored,
+            'expires': self.expires,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'last_access': self.last_access,
+        }
+
+    @classmethod
+    def from_dict(cls, key, data):
+        return cls(key, data['filename'], data['size'], data['stored'], data['expires'],
+                   data.get('etag'), data.get('last_modified'), data.get('last_access'))
+
+
+class ResponseCache:
+    """Size-capped LRU cache of API response bodies stored on disk
+
+    The index is written once, when the plugin process exits (or on flush),
+    rather than on every access: on ext4 each rename over an existing file
+    forces a data flush, which costs tens of milliseconds on SD cards. Bodies
+    are written under fresh file names so storing them never renames over an
+    existing file either. Indexes written concurrently by other plugin
+    invocations are merged on flush.
+    """
+
+    INDEX_FILE = 'index.json'
+
+    # Unreferenced body files younger than this may belong to another process
+    ORPHAN_GRACE = 60
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES, stale_window=DEFAULT_STALE_WINDOW, suffix='.json'):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stale_window = stale_window
+        self.suffix = suffix
+        self._lock = threading.RLock()
+        self._entries = None
+        self._dropped = set()
+        self._dirty = False
+        os.makedirs(self.directory, exist_ok=True)
+        atexit.register(self.flush)
+
+    @staticmethod
+    def make_key(endpoint, params=None):
+        """Stable cache key for an endpoint and its query parameters"""
+        if not params:
+            return endpoint
+        query = '&'.join(f"{k}={params[k]}" for k in sorted(params) if params[k] is not None)
+        return f"{endpoint}?{query}"
+
+    def get(self, key):
+        """Return the entry for key (fresh or stale), or None"""
+        with self._lock:
+            entry = self._index().get(key)
+            if entry is None:
+                return None
+            if not os.path.exists(self._path(entry.filename)):
+                self._drop(key)
+                return None
+            entry.last_access = time.time()
+            self._dirty = True
+            return entry
+
+    def load(self, entry):
+        """Decode the cached body of an entry"""
+        try:
+            with open(self._path(entry.filename), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self._drop(entry.key)
+            return None
+
+    def body_path(self, entry):
+        """Filesystem path of the cached body"""
+        return self._path(entry.filename)
+
+    def put(self, key, body, ttl, etag=None, last_modified=None):
+        """Store a raw response body (bytes) under key"""
+        now = time.time()
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        filename = f"{digest}-{os.getpid()}-{time.monotonic_ns()}{self.suffix}"
+        with open(self._path(filename), 'wb') as f:
+            f.write(body)
+
+        with self._lock:
+            self._drop(key)
+            self._dropped.discard(key)
+            entry = CacheEntry(key, filename, len(body), now, now + ttl, etag, last_modified, now)
+            self._index()[key] = entry
+            self._evict()
+            self._dirty = True
+            return entry
+
+    def refresh(self, key, ttl, etag=None, last_modified=None):
+        """Extend the lifetime of an entry after a 304 Not Modified"""
+        with self._lock:
+            entry = self._index().get(key)
+            if entry is None:
+                return None
+            now = time.time()
+            entry.expires = now + ttl
+            entry.last_access = now
+            if etag:
+                entry.etag = etag
+            if last_modified:
+                entry.last_modified = last_modified
+            self._dirty = True
+            return entry
+
+    def invalidate(self, prefix=''):
+        """Remove all entries whose key starts with prefix"""
+        with self._lock:
+            for key in [k for k in self._index() if k.startswith(prefix)]:
+                self._drop(key)
+
+    def total_size(self):
+        with self._lock:
+            return sum(entry.size for entry in self._index().values())
+
+    def flush(self):
+        """Merge with the on-disk index and write it back"""
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = self._index()
+            for key, theirs in self._read_index().items():
+                if key in self._dropped:
+                    continue
+                mine = entries.get(key)
+                if mine is None:
+                    entries[key] = theirs
+                elif theirs.stored > mine.stored:
+                    # Another invocation stored a newer body meanwhile
+                    entries[key] = theirs
+                    theirs.last_access = max(theirs.last_access, mine.last_access)
+                else:
+                    mine.last_access = max(theirs.last_access, mine.last_access)
+            self._evict()
+            self._remove_orphans()
+
+            data = {key: entry.to_dict() for key, entry in entries.items()}
+            tmp_path = f"{self._path(self.INDEX_FILE)}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self._path(self.INDEX_FILE))
+            except OSError:
+                pass
+            self._dropped.clear()
+            self._dirty = False
+
+    def _index(self):
+        if self._entries is None:
+            self._entries = self._read_index()
+        return self._entries
+
+    def _read_index(self):
+        entries = {}
+        try:
+            with open(self._path(self.INDEX_FILE), 'r', encoding='utf-8') as f:
+                for key, data in json.load(f).items():
+                    entries[key] = CacheEntry.from_dict(key, data)
+        except (OSError, ValueError, KeyError):
+            return {}
+        return entries
+
+    def _evict(self):
+        """Drop least recently used entries until under the size cap"""
+        entries = self._index()
+        total = sum(entry.size for entry in entries.values())
+        if total <= self.max_bytes:
+            return
+        for entry in sorted(entries.values(), key=lambda e: e.last_access):
+            if total <= self.max_bytes:
+                break
+            total -= entry.size
+            self._drop(entry.key)
+
+    def _drop(self, key):
+        entry = self._index().pop(key, None)
+        if entry is None:
+            return
+        self._dropped.add(key)
+        self._dirty = True
+        try:
+            os.remove(self._path(entry.filename))
+        except OSError:
+            pass
+
+    def _remove_orphans(self):
+        """Delete body files no longer referenced by the index"""
+        referenced = {entry.filename for entry in self._index().values()}
+        cutoff = time.time() - self.ORPHAN_GRACE
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if name == self.INDEX_FILE or name in referenced:
+                continue
+            path = self._path(name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _path(self, filename):
+        return os.path.join(self.directory, filename)
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR Kodi Addon - Local SQLite databases
+
+The background service writes and plugin invocations read at the same time,
+so databases are opened in WAL mode with a busy timeout.
+
+Copyright (C) 2025 AI-IT Inc
+Licensed under GPL-3.0
+"""
+
+import os
+import sqlite3
+
+BUSY_TIMEOUT = 5
+
+
+def connect(path):
+    """Open (creating if needed) a database shared by the service and plugin"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+    connection.row_factory = sqlite3.Row
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
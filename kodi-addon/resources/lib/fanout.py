@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR Kodi Addon - Concurrent Fan-out
+Run one call per key on a bounded thread pool and merge sorted results
+
+Copyright (C) 2025 AI-IT Inc
+Licensed under GPL-3.0
+"""
+
+import time
+import heapq
+from concurrent.futures import ThreadPoolExecutor, wait
+
+DEFAULT_MAX_WORKERS = 8
+
+
+class FanOutResult:
+    """Per-key results of a fan-out, plus the keys that failed or timed out"""
+
+    def __init__(self):
+        self.results = {}
+        self.failed = {}
+        self.timed_out = []
+
+    @property
+    def complete(self):
+        return not self.failed and not self.timed_out
+
+
+def fan_out(func, keys, timeout=None, max_workers=DEFAULT_MAX_WORKERS):
+    """Call func(key) for every key concurrently
+
+    Waits at most `timeout` seconds overall, so the wall-clock cost is that of
+    the slowest call rather than the sum. Calls still running at the deadline
+    are reported in `timed_out` and their results are discarded. `timeout` may
+    also be a function giving each key its own deadline.
+    """
+    outcome = FanOutResult()
+    keys = list(keys)
+    if not keys:
+        return outcome
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(keys)))
+    try:
+        futures = {executor.submit(func, key): key for key in keys}
+        if callable(timeout):
+            done, pending = _wait_each(futures, timeout)
+        else:
+            done, pending = wait(futures, timeout=timeout)
+        for future in done:
+            key = futures[future]
+            try:
+                outcome.results[key] = future.result()
+            except Exception as e:
+                outcome.failed[key] = e
+        for future in pending:
+            future.cancel()
+            outcome.timed_out.append(futures[future])
+    finally:
+        # Do not block on stragglers; their results are no longer wanted
+        executor.shutdown(wait=False)
+    return outcome
+
+
+def _wait_each(futures, timeout):
+    """Wait for every future until its own key's deadline, earliest first"""
+    started = time.monotonic()
+    done, pending = set(), set()
+    for future, key in sorted(futures.items(), key=lambda item: timeout(item[1])):
+        remaining = timeout(key) - (time.monotonic() - started)
+        wait([future], timeout=max(0, remaining))
+        (done if future.done() else pending).add(future)
+    return done, pending
+
+
+def merge_sorted(lists, key, reverse=False):
+    """k-way merge of lists into one lazily generated, ordered sequence
+
+    Each list is sorted first, since the server does not guarantee an order.
+    """
+    return heapq.merge(*(sorted(items, key=key, reverse=reverse) for items in lists),
+                       key=key, reverse=reverse)
@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR Kodi Addon - Multi-NVR Federation
+One view over the cameras, recordings and motion events of several NVRs
+
+Every site is queried at the same time under its own deadline, so a view
+costs the latency of the slowest site rather than the sum of all of them. A
+site that fails or misses its deadline is left out of the view and reported;
+the other sites are still shown.
+
+Copyright (C) 2025 AI-IT Inc
+Licensed under GPL-3.0
+"""
+
+import re
+import json
+import heapq
+from itertools import islice
+from urllib.parse import urlsplit, unquote, parse_qs
+
+import xbmc
+
+from resources.lib.nvrapi import NVRApi, NVRSite, RECORDINGS_PAGE_SIZE, CAMERA_FANOUT_TIMEOUT
+from resources.lib.fanout import fan_out, merge_sorted, FanOutResult
+
+# Ids from other sites than the main one are "<site key>:<id on that site>"
+SITE_SEPARATOR = ':'
+
+# Cursors of merged recording pages hold every site's position as JSON
+SITES_CURSOR_PREFIX = 'sites:'
+
+# A site fanning out on its own gets this much longer than its own deadline
+# (seconds), so that its partial results arrive before the wait for it ends
+SITE_DEADLINE_MARGIN = 1
+
+# Fields of listed items that hold ids, and the one naming the camera
+CAMERA_ID_FIELDS = ('id',)
+ITEM_ID_FIELDS = ('id', 'camera_id')
+
+_ENTRY_NAME = re.compile(r'^\s*([^=/@?]+?)\s*=\s*(.+)$')
+
+
+def parse_sites(text, main):
+    """Sites listed in the additional NVR sites setting
+
+    Entries are separated by commas or new lines, each written as
+    [name=][http[s]://][user:password@]host[:port][?timeout=seconds]; what an
+    entry leaves out is taken from the main site. Entries without a host are
+    ignored.
+    """
+    sites = []
+    keys = {main.key}
+    for entry in re.split(r'[,;\n]', text or ''):
+        entry = entry.strip()
+        if not entry:
+            continue
+        match = _ENTRY_NAME.match(entry)
+        name, address = (match.group(1), match.group(2)) if match else (None, entry)
+        parsed = urlsplit(address if '://' in address else f"//{address}")
+        try:
+            port = str(parsed.port or main.port)
+            timeout = float(parse_qs(parsed.query).get('timeout', [main.timeout])[0])
+        except ValueError:
+            continue
+        if not parsed.hostname:
+            continue
+
+        name = name or parsed.hostname
+        key = re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-') or 'site'
+        unique_key, suffix = key, 1
+        while unique_key in keys:
+            suffix += 1
+            unique_key = f"{key}-{suffix}"
+        keys.add(unique_key)
+
+        use_https = parsed.scheme == 'https' if parsed.scheme else main.use_https
+        sites.append(NVRSite(unique_key, name, parsed.hostname, port,
+                             unquote(parsed.username) if parsed.username else main.username,
+                             unquote(parsed.password) if parsed.password else main.password,
+                             use_https, timeout))
+    return sites
+
+
+class FederatedNVR:
+    """NVRApi over several sites
+
+    Listings are queried on every site and merged; calls about one camera or
+    recording are routed to its site by the prefix of its id. Anything not
+    federated here (index sync, the event service) is answered by the main
+    site.
+    """
+
+    def __init__(self, apis):
+        self.apis = apis
+        self.main = apis[0]
+        self._by_key = {api.site.key: api for api in apis}
+        self._by_origin = {urlsplit(api.base_url)[:2]: api for api in reversed(apis)}
+
+        # Names of the sites left out of a view during this invocation
+        self.unavailable = []
+
+        for api in apis:
+            api.strict = True
+
+    @classmethod
+    def from_settings(cls, addon):
+        main = NVRApi(addon)
+        sites = parse_sites(addon.getSetting('nvr_sites'), main.site)
+        return cls([main] + [NVRApi(addon, site) for site in sites])
+
+    def __getattr__(self, name):
+        return getattr(self.main, name)
+
+    def route(self, item_id):
+        """(site API, id on that site) of an id from a federated listing"""
+        key, separator, local_id = str(item_id).partition(SITE_SEPARATOR)
+        api = self._by_key.get(key) if separator and key else None
+        if api is None:
+            return self.main, item_id
+        return api, local_id
+
+    def _each_site(self, call, apis=None, timeout=None):
+        """call(api) on every site at once, each under the site's own timeout; {api: result}
+
+        `timeout` gives a site another deadline than its own, as a function of the site.
+        """
+        apis = self.apis if apis is None else list(apis)
+        timeout = timeout or (lambda api: api.timeout)
+        outcome = fan_out(call, apis, timeout=timeout, max_workers=len(apis))
+        for api, error in outcome.failed.items():
+            self._site_down(api, f"failed: {str(error)}")
+        for api in outcome.timed_out:
+            self._site_down(api, f"did not answer within {timeout(api):g}s")
+        return outcome.results
+
+    def _site_down(self, api, reason):
+        self.main._log(f"NVR site {api.site.name} {reason}", xbmc.LOGWARNING)
+        if api.site.name not in self.unavailable:
+            self.unavailable.append(api.site.name)
+
+    def _tag(self, api, items, id_fields, name_field):
+        """Copies of a site's items with prefixed ids and the site in the camera name"""
+        tagged = []
+        for item in items:
+            item = dict(item) if isinstance(item, dict) else type(item)(*item.values())
+            if api.site.key:
+                for field in id_fields:
+                    if item.get(field) is not None:
+                        item[field] = f"{api.site.key}{SITE_SEPARATOR}{item[field]}"
+            name = item.get(name_field)
+            if name:
+                item[name_field] = f"{name} ({api.site.name})"
+            tagged.append(item)
+        return tagged
+
+    def test_connection(self):
+        """True while at least one site answers"""
+        results = self._each_site(lambda api: api.test_connection())
+        for api, connected in results.items():
+            if not connected:
+                self._site_down(api, "is not reachable")
+        return any(results.values())
+
+    def get_cameras(self):
+        results = self._each_site(lambda api: api.get_cameras())
+        return [camera for api in self.apis if api in results
+                for camera in self._tag(api, results[api], CAMERA_ID_FIELDS, 'name')]
+
+    def get_camera_thumbnails(self, urls):
+        return self._thumbnail_paths(urls, lambda api, site_urls: api.get_camera_thumbnails(site_urls))
+
+    def get_recording_thumbnails(self, urls):
+        return self._thumbnail_paths(urls, lambda api, site_urls: api.get_recording_thumbnails(site_urls))
+
+    def _thumbnail_paths(self, urls, fetch):
+        """Thumbnails fetched by the site serving them, every site at once"""
+        per_site = {}
+        for url in urls:
+            api = self._by_origin.get(urlsplit(url)[:2], self.main) if url else self.main
+            per_site.setdefault(api, []).append(url)
+        paths = {url: url for url in urls}
+        outcome = fan_out(lambda api: fetch(api, per_site[api]), list(per_site), max_workers=len(per_site) or 1)
+        for site_paths in outcome.results.values():
+            paths.update(site_paths)
+        return paths
+
+    def get_camera_stream_url(self, camera_id, quality='medium', streams=1):
+        api, local_id = self.route(camera_id)
+        return api.get_camera_stream_url(local_id, quality, streams)
+
+    def get_stream_url_template(self, quality='medium', streams=1):
+        return SiteStreamTemplates(self, quality, streams)
+
+    def get_grid_stream_url(self, camera_ids, quality='low'):
+        """Mosaic URL when all cameras are on one site; a mosaic server only sees its own NVR"""
+        routed = [self.route(camera_id) for camera_id in camera_ids]
+        if len({api for api, _ in routed}) != 1:
+            return None
+        return routed[0][0].get_grid_stream_url([local_id for _, local_id in routed], quality)
+
+    def get_recordings(self, camera_id=None, start_date=None, end_date=None, fields=None):
+        """Recordings of every site (or of one camera), newest first"""
+        apis, camera_ids = self._targets(camera_id)
+        results = self._each_site(
+            lambda api: api.get_recordings(camera_ids.get(api), start_date, end_date, fields), apis)
+        return list(merge_sorted([self._tag(api, recordings, ITEM_ID_FIELDS, 'camera_name')
+                                  for api, recordings in results.items()],
+                                 key=lambda r: r.get('start_time', ''), reverse=True))
+
+    def get_recordings_page(self, camera_id=None, start_date=None, end_date=None, cursor=None,
+                            limit=RECORDINGS_PAGE_SIZE, timeout=None, fields=None):
+        """One page of recordings of every site, merged newest first; returns (recordings, next_cursor)
+
+        The cursor holds, per site, the site's cursor of the page being shown
+        and how many of its items were shown already. Each site reads ahead
+        until it has a page worth of unshown items, so that no site can run
+        out in the middle of the merge. Going back to a partly shown page is
+        a cache hit. A failing site keeps its position and is asked again on
+        the next page.
+        """
+        if camera_id:
+            api, local_id = self.route(camera_id)
+            results = self._each_site(lambda site_api: site_api.get_recordings_page(
+                local_id, start_date, end_date, cursor, limit, timeout, fields), [api])
+            recordings, next_cursor = results.get(api, ([], None))
+            return self._tag(api, recordings, ITEM_ID_FIELDS, 'camera_name'), next_cursor
+
+        positions = self._positions(cursor)
+        apis = [api for api in self.apis if api.site.key in positions]
+
+        def fetch(api):
+            page_cursor, skip = positions[api.site.key]
+            pages = []
+            unread = -skip
+            while True:
+                items, next_cursor = api.get_recordings_page(start_date=start_date, end_date=end_date,
+                                                             cursor=page_cursor, limit=limit,
+                                                             timeout=timeout, fields=fields)
+                pages.append((page_cursor, items, next_cursor))
+                unread += len(items)
+                if unread >= limit or not next_cursor:
+                    return pages
+                page_cursor = next_cursor
+
+        results = self._each_site(fetch, apis)
+
+        streams = []
+        for api, pages in results.items():
+            items = [item for _, page_items, _ in pages for item in page_items][positions[api.site.key][1]:]
+            streams.append([(api, item) for item in self._tag(api, items, ITEM_ID_FIELDS, 'camera_name')])
+        # Each site's items are already in the server's newest-first order
+        page = list(islice(heapq.merge(*streams, key=lambda pair: pair[1].get('start_time', ''), reverse=True),
+                           limit))
+        shown = {}
+        for api, _ in page:
+            shown[api] = shown.get(api, 0) + 1
+
+        next_positions = {}
+        for api in apis:
+            key = api.site.key
+            if api not in results:
+                next_positions[key] = positions[key]
+                continue
+            skip = positions[key][1] + shown.get(api, 0)
+            for page_cursor, items, next_cursor in results[api]:
+                if skip < len(items):
+                    next_positions[key] = [page_cursor, skip]
+                    break
+                skip -= len(items)
+                if not next_cursor:
+                    break
+            else:
+                next_positions[key] = [next_cursor, skip]
+
+        if not next_positions or not results:
+            return [item for _, item in page], None
+        return [item for _, item in page], f"{SITES_CURSOR_PREFIX}{json.dumps(next_positions, separators=(',', ':'))}"
+
+    def _positions(self, cursor):
+        """{site key: [site cursor, items already shown]} of a merged cursor"""
+        if cursor and cursor.startswith(SITES_CURSOR_PREFIX):
+            try:
+                positions = json.loads(cursor[len(SITES_CURSOR_PREFIX):])
+                if isinstance(positions, dict):
+                    return {key: [position[0], int(position[1])] for key, position in positions.items()
+                            if key in self._by_key}
+            except (ValueError, TypeError, IndexError, KeyError):
+                pass
+        return {api.site.key: [None, 0] for api in self.apis}
+
+    def get_recordings_per_camera(self, camera_ids, start_date=None, end_date=None,
+                                  limit=RECORDINGS_PAGE_SIZE, timeout=CAMERA_FANOUT_TIMEOUT, fields=None):
+        """Recordings of cameras on any site, each site fanning out over its own cameras"""
+        per_site = {}
+        for camera_id in camera_ids:
+            api, local_id = self.route(camera_id)
+            per_site.setdefault(api, {})[local_id] = camera_id
+
+        # Each site returns what its cameras sent by its own deadline, so the
+        # wait for the site allows for that deadline starting a little later
+        results = self._each_site(lambda api: api.get_recordings_per_camera(
+            list(per_site[api]), start_date, end_date, limit, min(timeout, api.timeout), fields), list(per_site),
+            timeout=lambda api: min(timeout, api.timeout) + SITE_DEADLINE_MARGIN)
+
+        outcome = FanOutResult()
+        for api, ids in per_site.items():
+            site_outcome = results.get(api)
+            if site_outcome is None:
+                outcome.timed_out.extend(ids.values())
+                continue
+            for local_id, recordings in site_outcome.results.items():
+                outcome.results[ids[local_id]] = self._tag(api, recordings, ITEM_ID_FIELDS, 'camera_name')
+            outcome.failed.update({ids[local_id]: error for local_id, error in site_outcome.failed.items()})
+            outcome.timed_out.extend(ids[local_id] for local_id in site_outcome.timed_out)
+        return outcome
+
+    def get_recording_index(self, recording_id):
+        api, local_id = self.route(recording_id)
+        return api.get_recording_index(local_id)
+
+    def get_motion_events(self, camera_id=None, limit=50, fields=None):
+        """Latest motion events of every site (or of one camera), newest first"""
+        apis, camera_ids = self._targets(camera_id)
+        results = self._each_site(lambda api: api.get_motion_events(camera_ids.get(api), limit, fields), apis)
+        merged = merge_sorted([self._tag(api, events, ITEM_ID_FIELDS, 'camera_name')
+                               for api, events in results.items()],
+                              key=lambda e: e.get('timestamp', ''), reverse=True)
+        return list(islice(merged, limit))
+
+    def _targets(self, camera_id):
+        """Sites to ask, and the camera's id on its site when filtering by camera"""
+        if not camera_id:
+            return self.apis, {}
+        api, local_id = self.route(camera_id)
+        return [api], {api: local_id}
+
+    def ptz_control(self, camera_id, command, value=None):
+        api, local_id = self.route(camera_id)
+        return api.ptz_control(local_id, command, value)
+
+    def take_snapshot(self, camera_id):
+        api, local_id = self.route(camera_id)
+        return api.take_snapshot(local_id)
+
+
+class SiteStreamTemplates:
+    """Stream URL templates of every site; format() fills in the camera's site"""
+
+    def __init__(self, federation, quality, streams):
+        self._route = federation.route
+        self._templates = {api.site.key: api.get_stream_url_template(quality, streams)
+                           for api in federation.apis}
+
+    def format(self, camera_id):
+        api, local_id = self._route(camera_id)
+        return self._templates[api.site.key].format(camera_id=local_id)
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR Kodi Addon - Streaming JSON
+Incremental parsing of large JSON listings
+
+Elements of a top-level array (or of one array member of a top-level object)
+are decoded one at a time as chunks arrive, so a listing can be consumed and
+abandoned without ever holding the whole response in memory.
+
+Copyright (C) 2025 AI-IT Inc
+Licensed under GPL-3.0
+"""
+
+import json
+import codecs
+
+_WHITESPACE = ' \t\n\r'
+_DECODER = json.JSONDecoder()
+
+
+class _ChunkReader:
+    """Text buffer over an iterator of byte chunks"""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Append the next chunk to the buffer; False once exhausted"""
+        if self.eof:
+            return False
+        # Drop consumed text so the buffer stays the size of one item
+        if self.pos:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        for chunk in self.chunks:
+            if chunk:
+                self.buf += self.decoder.decode(chunk)
+                return True
+        self.buf += self.decoder.decode(b'', final=True)
+        self.eof = True
+        return False
+
+    def peek(self):
+        """Next non-whitespace character without consuming it, or '' at end"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at offset {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        """Decode one complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                obj, end = _DECODER.raw_decode(self.buf, self.pos)
+                # A number at the very end of the buffer may continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self.fill():
+                obj, self.pos = _DECODER.raw_decode(self.buf, self.pos)
+                return obj
+
+
+class JSONStream:
+    """Iterate the elements of a streamed JSON listing
+
+    The body may be a bare array, or an object whose `items_key` member is the
+    array; the object's other members are collected into `meta`, which is only
+    complete once iteration has finished.
+    """
+
+    def __init__(self, chunks, items_key='items'):
+        self.reader = _ChunkReader(chunks)
+        self.items_key = items_key
+        self.meta = {}
+        self.wrapped = False
+        self.finished = False
+
+    def __iter__(self):
+        reader = self.reader
+        first = reader.peek()
+        if first == '[':
+            yield from self._array()
+        elif first == '{':
+            self.wrapped = True
+            reader.expect('{')
+            while reader.peek() != '}':
+                key = reader.value()
+                reader.expect(':')
+                if key == self.items_key and reader.peek() == '[':
+                    yield from self._array()
+                else:
+                    self.meta[key] = reader.value()
+                if reader.peek() == ',':
+                    reader.expect(',')
+            reader.expect('}')
+        elif first:
+            raise ValueError(f"Unexpected JSON listing start: '{first}'")
+        self.finished = True
+
+    def _array(self):
+        reader = self.reader
+        reader.expect('[')
+        while reader.peek() != ']':
+            yield reader.value()
+            if reader.peek() == ',':
+                reader.expect(',')
+        reader.expect(']')
+
+
+def iter_items(chunks, items_key='items'):
+    """Convenience wrapper yielding listing elements from byte chunks"""
+    return iter(JSONStream(chunks, items_key))
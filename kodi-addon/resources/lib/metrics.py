@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR Kodi Addon - Request Metrics
+Rolling latency histograms per NVR endpoint and per router mode
+
+Every plugin invocation adds its samples to a small file in the addon
+profile when it exits, so the diagnostics view can tell a slow NVR (endpoint
+latency) from slow rendering (mode time not explained by requests).
+
+Copyright (C) 2025 AI-IT Inc
+Licensed under GPL-3.0
+"""
+
+import os
+import re
+import json
+import atexit
+import threading
+
+METRICS_FILE = 'metrics.json'
+
+# Upper edges of the latency buckets (ms); a last bucket catches the rest
+BUCKET_EDGES_MS = (5, 10, 20, 35, 50, 75, 100, 150, 200, 300, 500, 750,
+                   1000, 1500, 2000, 3000, 5000, 10000, 30000)
+
+# Older samples are halved away once a key holds this many, so the
+# histograms follow recent behaviour
+ROLLING_WINDOW = 1000
+
+# Numeric path segments (camera or recording ids) are folded together
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+_metrics = None
+
+
+def open_metrics(profile_dir):
+    """Process-wide metrics, shared by the router and the NVR client"""
+    global _metrics
+    if _metrics is None:
+        _metrics = RequestMetrics(profile_dir)
+    return _metrics
+
+
+def endpoint_name(method, path):
+    """Histogram key of a request, e.g. GET /cameras/{id}/stream"""
+    return f"{method} {_ID_SEGMENT.sub('/{id}', path) or '/'}"
+
+
+def _empty():
+    return {'buckets': [0] * (len(BUCKET_EDGES_MS) + 1), 'count': 0, 'total_ms': 0.0,
+            'bytes': 0, 'errors': 0, 'cache_hits': 0}
+
+
+def percentile(stats, fraction):
+    """Upper edge (ms) of the bucket holding the given fraction of samples"""
+    target = stats['count'] * fraction
+    seen = 0
+    for edge, count in zip(BUCKET_EDGES_MS + (None,), stats['buckets']):
+        seen += count
+        if count and seen >= target:
+            return edge if edge is not None else BUCKET_EDGES_MS[-1]
+    return 0
+
+
+class RequestMetrics:
+    """Samples of this invocation, merged into the rolling file on exit"""
+
+    def __init__(self, profile_dir):
+        self.path = os.path.join(profile_dir, METRICS_FILE)
+        self._lock = threading.Lock()
+        self._pending = {}
+        atexit.register(self.save)
+
+    def record(self, kind, key, elapsed_ms=None, status=None, size=0, cache_hit=False):
+        """Add one sample; `kind` is endpoint or mode"""
+        with self._lock:
+            stats = self._pending.setdefault(f"{kind}:{key}", _empty())
+            if cache_hit:
+                stats['cache_hits'] += 1
+                return
+            if elapsed_ms is not None:
+                bucket = next((i for i, edge in enumerate(BUCKET_EDGES_MS) if elapsed_ms <= edge),
+                              len(BUCKET_EDGES_MS))
+                stats['buckets'][bucket] += 1
+                stats['count'] += 1
+                stats['total_ms'] += elapsed_ms
+            if status is not None and status >= 400:
+                stats['errors'] += 1
+            stats['bytes'] += size or 0
+
+    def add_bytes(self, kind, key, size):
+        """Body size learned after the request was recorded (chunked responses)"""
+        with self._lock:
+            self._pending.setdefault(f"{kind}:{key}", _empty())['bytes'] += size
+
+    def load(self):
+        """Rolling histograms including this invocation: {"endpoint:GET /x": stats}"""
+        merged = self._read()
+        with self._lock:
+            self._merge(merged, self._pending)
+        return merged
+
+    def reset(self):
+        with self._lock:
+            self._pending = {}
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def save(self):
+        """Merge this invocation's samples into the file
+
+        Invocations running at the same moment can overwrite each other's
+        samples; for diagnostics that loss is acceptable.
+        """
+        with self._lock:
+            if not self._pending:
+                return
+            merged = self._read()
+            self._merge(merged, self._pending)
+            self._pending = {}
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(merged, f)
+                os.replace(tmp_path, self.path)
+            except OSError:
+                pass
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _merge(into, samples):
+        for key, new in samples.items():
+            stats = into.get(key)
+            if not isinstance(stats, dict) or len(stats.get('buckets', ())) != len(new['buckets']):
+                stats = into[key] = _empty()
+            stats['buckets'] = [old + added for old, added in zip(stats['buckets'], new['buckets'])]
+            for field in ('count', 'total_ms', 'bytes', 'errors', 'cache_hits'):
+                stats[field] = stats.get(field, 0) + new[field]
+            if stats['count'] > ROLLING_WINDOW:
+                # Halve everything so recent samples outweigh old ones
+                stats['buckets'] = [count // 2 for count in stats['buckets']]
+                stats['count'] = sum(stats['buckets'])
+                stats['total_ms'] /= 2
+                for field in ('bytes', 'errors', 'cache_hits'):
+                    stats[field] = int(stats[field]) // 2
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR Kodi Addon - Motion Event Index
+Local SQLite index of motion events, kept current by the background service
+
+Events are also rolled up per camera and hour (event count, peak confidence
+and a dwell-time histogram). Triggers keep the rollups current as events are
+stored, so activity summaries over weeks of history read a few hundred rows
+instead of scanning every event.
+
+Copyright (C) 2025 AI-IT Inc
+Licensed under GPL-3.0
+"""
+
+import os
+import time
+import threading
+from datetime import datetime, timedelta
+
+from resources.lib.database import connect
+
+DB_FILE = 'motion_events.db'
+
+# The plugin only trusts the index while the service has synced recently
+MAX_SYNC_AGE = 120
+
+# Events per page in the motion events view
+PAGE_SIZE = 50
+
+# Hourly activity rollups are small and outlive the events they count
+ACTIVITY_HISTORY_DAYS = 365
+
+# Period covered by the motion activity view
+ACTIVITY_VIEW_DAYS = 14
+
+# Upper edges of the dwell-time histogram bins (seconds); the last bin is open
+DWELL_BINS = (10, 30, 60, 300)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    camera_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    event_id TEXT,
+    camera_name TEXT,
+    confidence REAL,
+    duration REAL,
+    recording_url TEXT,
+    PRIMARY KEY (camera_id, timestamp)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS events_by_time ON events (timestamp);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS activity (
+    camera_id TEXT NOT NULL,
+    hour TEXT NOT NULL,
+    camera_name TEXT,
+    events INTEGER NOT NULL,
+    max_confidence REAL,
+    dwell REAL NOT NULL,
+    {dwell_columns},
+    PRIMARY KEY (camera_id, hour)
+) WITHOUT ROWID;
+""".format(dwell_columns=',\n    '.join(f"dwell_{i} INTEGER NOT NULL" for i in range(len(DWELL_BINS) + 1)))
+
+COLUMNS = ('camera_id', 'timestamp', 'event_id', 'camera_name', 'confidence', 'duration', 'recording_url')
+
+DWELL_COLUMNS = tuple(f"dwell_{i}" for i in range(len(DWELL_BINS) + 1))
+
+
+def _dwell_bin(duration):
+    """SQL expressions that are 1 for the dwell bin `duration` falls into, else 0"""
+    edges = (0,) + DWELL_BINS
+    value = f"COALESCE({duration}, 0)"
+    expressions = [f"({value} >= {low} AND {value} < {high})" for low, high in zip(edges, DWELL_BINS)]
+    expressions[0] = f"({value} < {DWELL_BINS[0]})"
+    expressions.append(f"({value} >= {DWELL_BINS[-1]})")
+    return expressions
+
+
+# Rollup of events grouped by camera and hour ('YYYY-MM-DDTHH' prefix of the timestamp)
+ACTIVITY_ROLLUP = f"""
+SELECT camera_id, substr(timestamp, 1, 13), MAX(camera_name), COUNT(*), MAX(confidence),
+       TOTAL(duration), {', '.join(f"SUM{expression}" for expression in _dwell_bin('duration'))}
+FROM events GROUP BY camera_id, substr(timestamp, 1, 13)
+"""
+
+ACTIVITY_TRIGGERS = (
+    f"""
+CREATE TRIGGER activity_on_insert AFTER INSERT ON events BEGIN
+    INSERT INTO activity (camera_id, hour, camera_name, events, max_confidence, dwell, {', '.join(DWELL_COLUMNS)})
+    VALUES (NEW.camera_id, substr(NEW.timestamp, 1, 13), NEW.camera_name, 1, NEW.confidence,
+            COALESCE(NEW.duration, 0), {', '.join(_dwell_bin('NEW.duration'))})
+    ON CONFLICT (camera_id, hour) DO UPDATE SET
+        camera_name = COALESCE(excluded.camera_name, camera_name),
+        events = events + 1,
+        max_confidence = MAX(COALESCE(max_confidence, excluded.max_confidence),
+                             COALESCE(excluded.max_confidence, max_confidence)),
+        dwell = dwell + excluded.dwell,
+        {', '.join(f"{column} = {column} + excluded.{column}" for column in DWELL_COLUMNS)};
+END
+""",
+    # Events sent again (overlapping syncs) replace their earlier copy; a
+    # lowered confidence may have been the peak, so the hour's is read again
+    f"""
+CREATE TRIGGER activity_on_update AFTER UPDATE ON events BEGIN
+    UPDATE activity SET
+        camera_name = COALESCE(NEW.camera_name, camera_name),
+        max_confidence = (SELECT MAX(confidence) FROM events WHERE camera_id = NEW.camera_id
+                          AND timestamp >= activity.hour AND timestamp < activity.hour || ';'),
+        dwell = dwell - COALESCE(OLD.duration, 0) + COALESCE(NEW.duration, 0),
+        {', '.join(f"{column} = {column} - {old} + {new}" for column, old, new
+                   in zip(DWELL_COLUMNS, _dwell_bin('OLD.duration'), _dwell_bin('NEW.duration')))}
+    WHERE camera_id = NEW.camera_id AND hour = substr(NEW.timestamp, 1, 13);
+END
+""",
+)
+
+
+class MotionIndex:
+    """Motion events keyed by camera and timestamp"""
+
+    def __init__(self, profile_dir):
+        self.path = os.path.join(profile_dir, DB_FILE)
+        self._lock = threading.Lock()
+        self.db = connect(self.path)
+        with self._lock:
+            self.db.executescript(SCHEMA)
+            self._build_activity()
+
+    def _build_activity(self):
+        """Install the rollup triggers, counting events stored before they existed"""
+        installed = "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'activity_on_insert'"
+        if self.db.execute(installed).fetchone():
+            return
+        # The service and the plugin may both get here on first start
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            if not self.db.execute(installed).fetchone():
+                self.db.execute('DELETE FROM activity')
+                self.db.execute(f"INSERT INTO activity {ACTIVITY_ROLLUP}")
+                for trigger in ACTIVITY_TRIGGERS:
+                    self.db.execute(trigger)
+            self.db.execute('COMMIT')
+        except Exception:
+            self.db.execute('ROLLBACK')
+            raise
+
+    def close(self):
+        self.db.close()
+
+    def add_events(self, events):
+        """Insert or update events as returned by the NVR; returns the count stored"""
+        rows = []
+        for event in events:
+            camera_id = event.get('camera_id')
+            timestamp = event.get('timestamp')
+            if camera_id is None or not timestamp:
+                continue
+            rows.append((str(camera_id), timestamp, str(event.get('id', '')),
+                         event.get('camera_name'), event.get('confidence', 0),
+                         event.get('duration'), event.get('recording_url', '')))
+        if rows:
+            # An upsert rather than REPLACE, so the rollup triggers see updates as updates
+            updates = ', '.join(f"{column} = excluded.{column}" for column in COLUMNS[2:])
+            with self._lock, self.db:
+                self.db.executemany(
+                    f"INSERT INTO events ({', '.join(COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    f"ON CONFLICT (camera_id, timestamp) DO UPDATE SET {updates}", rows)
+        return len(rows)
+
+    def query(self, camera_id=None, min_confidence=None, since=None, until=None, limit=50, offset=0):
+        """Events newest first, as dicts shaped like the NVR's motion-events"""
+        clauses = []
+        params = []
+        if camera_id is not None:
+            clauses.append('camera_id = ?')
+            params.append(str(camera_id))
+        if min_confidence is not None:
+            clauses.append('confidence >= ?')
+            params.append(min_confidence)
+        if since:
+            clauses.append('timestamp >= ?')
+            params.append(since)
+        if until:
+            clauses.append('timestamp <= ?')
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        params.extend([limit, offset])
+        with self._lock:
+            rows = self.db.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM events {where} "
+                f"ORDER BY timestamp DESC LIMIT ? OFFSET ?", params).fetchall()
+        return [{
+            'id': row['event_id'],
+            'camera_id': row['camera_id'],
+            'camera_name': row['camera_name'],
+            'timestamp': row['timestamp'],
+            'confidence': row['confidence'],
+            'duration': row['duration'],
+            'recording_url': row['recording_url'],
+        } for row in rows]
+
+    def activity_by_camera(self, since):
+        """Totals per camera since the ISO timestamp `since`, busiest first"""
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT camera_id, MAX(camera_name) AS camera_name, SUM(events) AS events, "
+                "MAX(max_confidence) AS max_confidence, TOTAL(dwell) AS dwell "
+                "FROM activity WHERE hour >= ? GROUP BY camera_id ORDER BY events DESC",
+                (since[:13],)).fetchall()
+        return [dict(row) for row in rows]
+
+    def activity_by_hour(self, since, camera_id=None):
+        """Hourly rollups since the ISO timestamp `since`, oldest first
+
+        Rows of all cameras are summed per hour unless `camera_id` is given.
+        Each row has hour, events, max_confidence, dwell and a dwell histogram
+        with one count per DWELL_BINS bin.
+        """
+        params = [since[:13]]
+        camera_clause = ''
+        if camera_id is not None:
+            camera_clause = 'AND camera_id = ? '
+            params.append(str(camera_id))
+        with self._lock:
+            rows = self.db.execute(
+                f"SELECT hour, SUM(events) AS events, MAX(max_confidence) AS max_confidence, "
+                f"TOTAL(dwell) AS dwell, {', '.join(f'SUM({column})' for column in DWELL_COLUMNS)} "
+                f"FROM activity WHERE hour >= ? {camera_clause}GROUP BY hour ORDER BY hour", params).fetchall()
+        return [{
+            'hour': row['hour'],
+            'events': row['events'],
+            'max_confidence': row['max_confidence'],
+            'dwell': row['dwell'],
+            'dwell_histogram': list(row)[4:],
+        } for row in rows]
+
+    def latest_timestamp(self):
+        """Watermark for incremental sync"""
+        with self._lock:
+            row = self.db.execute('SELECT MAX(timestamp) FROM events').fetchone()
+        return row[0]
+
+    def count(self):
+        with self._lock:
+            return self.db.execute('SELECT COUNT(*) FROM events').fetchone()[0]
+
+    def prune(self, before):
+        """Delete events older than the ISO timestamp `before`
+
+        Activity rollups are kept for ACTIVITY_HISTORY_DAYS regardless.
+        """
+        activity_before = (datetime.now() - timedelta(days=ACTIVITY_HISTORY_DAYS)).strftime('%Y-%m-%dT%H')
+        with self._lock, self.db:
+            self.db.execute('DELETE FROM activity WHERE hour < ?', (activity_before,))
+            return self.db.execute('DELETE FROM events WHERE timestamp < ?', (before,)).rowcount
+
+    def mark_synced(self):
+        """Record that the index is current as of now"""
+        with self._lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_sync', ?)",
+                            (str(time.time()),))
+
+    def is_live(self, max_age=MAX_SYNC_AGE):
+        """True while the background service keeps the index current"""
+        with self._lock:
+            row = self.db.execute("SELECT value FROM meta WHERE key = 'last_sync'").fetchone()
+        try:
+            return row is not None and time.time() - float(row[0]) < max_age
+        except ValueError:
+            return False
@@ -0,0 +1,649 @@
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR Kodi Addon - NVR API client
+
+Imported lazily by main.py so that modes which never talk to the NVR do not
+pay for loading requests and building a session.
+
+Copyright (C) 2025 AI-IT Inc
+Licensed under GPL-3.0
+"""
+
+import os
+import json
+import time
+import threading
+import xbmc
+import xbmcvfs
+import requests
+from urllib.parse import urlsplit, quote
+from resources.lib.metrics import open_metrics, endpoint_name
+from resources.lib.auth import TokenAuth
+from resources.lib.transport import NVRAdapter, hedged
+from resources.lib.bandwidth import BandwidthEstimator
+from resources.lib.cache import ResponseCache, DEFAULT_TTLS
+from resources.lib.jsonstream import JSONStream
+from resources.lib.records import record_type, to_table, from_table, as_records
+from resources.lib.fanout import fan_out
+from resources.lib.thumbnails import ThumbnailCache, CAMERA_THUMBNAIL_TTL, RECORDING_THUMBNAIL_TTL
+
+# Stream resolution per quality setting
+QUALITY_RESOLUTIONS = {
+    'low': '480p',
+    'medium': '720p',
+    'high': '1080p',
+    'ultra': '4k',
+}
+
+# How long the grid view waits to learn whether a mosaic server is running
+MOSAIC_PROBE_TIMEOUT = 2
+
+# Listing pagination
+RECORDINGS_PAGE_SIZE = 100
+STREAM_CHUNK_SIZE = 64 * 1024
+# Our cursors for servers answering with a bare array: `offset:` for those
+# that apply limit and offset, `skip:` for those that ignore both
+OFFSET_CURSOR_PREFIX = 'offset:'
+SKIP_CURSOR_PREFIX = 'skip:'
+
+# Segment indexes are small; a slow answer should not hold up playback
+RECORDING_INDEX_TIMEOUT = 5
+
+# Incremental recording index sync
+RECORDINGS_SYNC_BATCH = 1000
+RECORDINGS_SYNC_TIMEOUT = 30
+
+# Concurrent per-camera queries
+FANOUT_WORKERS = 8
+CAMERA_FANOUT_TIMEOUT = 8
+
+# Motion event sync used by the background service
+MOTION_SYNC_BATCH = 1000
+MOTION_STREAM_CONNECT_TIMEOUT = 10
+MOTION_STREAM_READ_TIMEOUT = 60
+
+
+class StreamNotSupported(Exception):
+    """The NVR does not offer a server-sent event stream"""
+
+
+class NVRSite:
+    """Where one NVR is reached, and how long it may take to answer
+    
+    The main site, configured in the connection settings, has an empty key;
+    other sites' keys prefix their ids in federated views.
+    """
+    
+    def __init__(self, key, name, host, port, username, password, use_https, timeout):
+        self.key = key
+        self.name = name
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_https = use_https
+        self.timeout = timeout
+    
+    @classmethod
+    def from_settings(cls, addon):
+        """The main site"""
+        return cls('', addon.getSetting('nvr_site_name') or 'Main',
+                   addon.getSetting('nvr_host') or 'localhost',
+                   addon.getSetting('nvr_port') or '8080',
+                   addon.getSetting('nvr_username') or 'admin',
+                   addon.getSetting('nvr_password') or 'admin123',
+                   addon.getSettingBool('use_https'),
+                   addon.getSettingInt('connection_timeout') or 10)
+
+
+# NVR API endpoints
+class NVRApi:
+    def __init__(self, addon, site=None):
+        self.addon_id = addon.getAddonInfo('id')
+        self.profile = xbmcvfs.translatePath(addon.getAddonInfo('profile'))
+        
+        self.site = site or NVRSite.from_settings(addon)
+        self.host = self.site.host
+        self.port = self.site.port
+        self.username = self.site.username
+        self.password = self.site.password
+        self.use_https = self.site.use_https
+        
+        protocol = 'https' if self.use_https else 'http'
+        self.base_url = f"{protocol}://{self.host}:{self.port}/api"
+        
+        # Other sites keep their caches and estimates apart from the main site's
+        self.data_dir = os.path.join(self.profile, 'sites', self.site.key) if self.site.key else self.profile
+        
+        # Grid mosaics come from scripts/mosaic_server.py, on the NVR unless configured
+        mosaic_server = '' if self.site.key else addon.getSetting('mosaic_server').rstrip('/')
+        self.mosaic_url = f"{mosaic_server}/api" if mosaic_server else self.base_url
+        self.mosaic_token = '' if self.site.key else addon.getSetting('mosaic_token')
+        
+        # Live streams of the main site go through the service's local relay
+        self.use_relay = not self.site.key and addon.getSettingBool('stream_relay')
+        
+        self.session = requests.Session()
+        # Credentials are exchanged once for a token that later invocations reuse
+        self.session.auth = TokenAuth(self.session, self.base_url, self.username, self.password, self.data_dir)
+        
+        # Requests without their own deadline get the configured one, and
+        # idempotent requests are retried with jittered backoff. One pooled
+        # connection per fan-out worker is shared by all requests.
+        self.timeout = self.site.timeout
+        max_retries = addon.getSettingInt('max_retries') or 3
+        adapter = NVRAdapter(self.timeout, max_retries, pool_connections=1, pool_maxsize=FANOUT_WORKERS)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        # Latency, size and status of every response, for the diagnostics view
+        self.metrics = open_metrics(self.profile)
+        self._api_path = urlsplit(self.base_url).path
+        self.session.hooks['response'].append(self._record_response)
+        
+        # Slow listing requests are raced against a duplicate
+        self.hedge_requests = addon.getSettingBool('hedge_requests')
+        
+        # Federated sites raise listing errors instead of answering with an
+        # empty list, so that a failing site is told apart from an empty one
+        self.strict = False
+        
+        self._event_stream = None
+        
+        # Transfers feed rolling throughput and RTT estimates for "auto" quality
+        self.bandwidth = BandwidthEstimator(self.data_dir)
+        
+        # Responses are cached in the profile so repeated views skip the network
+        self.cache = None
+        if addon.getSettingBool('enable_response_cache'):
+            cache_mb = addon.getSettingInt('response_cache_size') or 10
+            self.cache = ResponseCache(os.path.join(self.data_dir, 'cache'), max_bytes=cache_mb * 1024 * 1024)
+        
+        # Thumbnails are fetched with this session and handed to Kodi as local files
+        self.thumbnails = None
+        if addon.getSettingBool('enable_thumbnail_cache'):
+            thumbnail_mb = addon.getSettingInt('thumbnail_cache_size') or 50
+            self.thumbnails = ThumbnailCache(os.path.join(self.data_dir, 'thumbnails'), self.session,
+                                             self.base_url, max_bytes=thumbnail_mb * 1024 * 1024,
+                                             bandwidth=self.bandwidth)
+        
+    def _log(self, message, level=xbmc.LOGERROR):
+        xbmc.log(f"[{self.addon_id}] {message}", level)
+    
+    def _endpoint(self, response):
+        path = urlsplit(response.request.url).path
+        if path.startswith(self._api_path):
+            path = path[len(self._api_path):]
+        return self._endpoint_name(response.request.method, path)
+    
+    def _endpoint_name(self, method, path):
+        """Histogram key of a request; other sites' endpoints are kept apart from the main site's"""
+        name = endpoint_name(method, path)
+        return f"{self.site.key}: {name}" if self.site.key else name
+    
+    def _record_response(self, response, *args, **kwargs):
+        """Session response hook; chunked bodies are counted as they are read"""
+        self.metrics.record('endpoint', self._endpoint(response), response.elapsed.total_seconds() * 1000,
+                            response.status_code, int(response.headers.get('Content-Length') or 0))
+    
+    def _body_chunks(self, response):
+        """iter_content, adding what is read of a body without Content-Length to its metrics
+        
+        The bytes read off the wire, including those of a body abandoned
+        early, are a bandwidth sample. Only the time spent waiting for them
+        counts, not the time the caller spends parsing between chunks.
+        """
+        key = None if 'Content-Length' in response.headers else self._endpoint(response)
+        chunks = response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+        received = 0
+        waited = 0.0
+        try:
+            while True:
+                started = time.perf_counter()
+                chunk = next(chunks, None)
+                waited += time.perf_counter() - started
+                if chunk is None:
+                    break
+                received += len(chunk)
+                if key:
+                    self.metrics.add_bytes('endpoint', key, len(chunk))
+                yield chunk
+        finally:
+            tell = getattr(response.raw, 'tell', None)
+            self.bandwidth.record(tell() if tell else received, waited, response.elapsed.total_seconds())
+    
+    def _get_listing(self, url, **kwargs):
+        """GET a listing, hedged when enabled"""
+        if self.hedge_requests:
+            return hedged(lambda: self.session.get(url, **kwargs))
+        return self.session.get(url, **kwargs)
+    
+    def _decode_json(self, response):
+        """Decode a whole JSON response; returns (data, body to cache)"""
+        body = b''.join(self._body_chunks(response))
+        return json.loads(body), body
+    
+    def _cached_get(self, endpoint, params=None, decode=None, timeout=None, key_params=None):
+        """GET a JSON endpoint through the response cache
+        
+        `key_params` tell apart responses that the same request decodes differently.
+        """
+        decode = decode or self._decode_json
+        if self.cache is None:
+            response = self._get_listing(f"{self.base_url}/{endpoint}", params=params, stream=True, timeout=timeout)
+            try:
+                return decode(response)[0] if response.status_code == 200 else []
+            finally:
+                response.close()
+        
+        key = ResponseCache.make_key(endpoint, {**(params or {}), **(key_params or {})})
+        entry = self.cache.get(key)
+        if entry is not None:
+            if entry.is_fresh():
+                data = self.cache.load(entry)
+                if data is not None:
+                    self.metrics.record('endpoint', self._endpoint_name('GET', f"/{endpoint}"), cache_hit=True)
+                    return data
+            elif entry.is_usable_stale(self.cache.stale_window):
+                # Serve stale data now and refresh it for the next visit
+                data = self.cache.load(entry)
+                if data is not None:
+                    self.metrics.record('endpoint', self._endpoint_name('GET', f"/{endpoint}"), cache_hit=True)
+                    threading.Thread(target=self._revalidate, args=(endpoint, params, key, entry, decode, timeout)).start()
+                    return data
+        
+        try:
+            return self._fetch(endpoint, params, key, entry, decode, timeout)
+        except Exception:
+            if entry is not None:
+                data = self.cache.load(entry)
+                if data is not None:
+                    self._log(f"Serving cached {endpoint} after request failure", xbmc.LOGWARNING)
+                    return data
+            raise
+    
+    def _fetch(self, endpoint, params, key, entry, decode, timeout=None):
+        """Fetch an endpoint, revalidating a cached entry if there is one"""
+        headers = entry.validators() if entry is not None else {}
+        response = self._get_listing(f"{self.base_url}/{endpoint}", params=params, headers=headers,
+                                     stream=True, timeout=timeout)
+        try:
+            ttl = DEFAULT_TTLS.get(endpoint, 30)
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            
+            if response.status_code == 304 and entry is not None:
+                self.cache.refresh(key, ttl, etag, last_modified)
+                data = self.cache.load(entry)
+                if data is not None:
+                    return data
+                response.close()
+                response = self._get_listing(f"{self.base_url}/{endpoint}", params=params, stream=True, timeout=timeout)
+            
+            if response.status_code == 200:
+                data, body = decode(response)
+                self.cache.put(key, body, ttl, etag, last_modified)
+                return data
+            return []
+        finally:
+            response.close()
+    
+    def _revalidate(self, endpoint, params, key, entry, decode, timeout=None):
+        """Background refresh of a stale cache entry"""
+        try:
+            self._fetch(endpoint, params, key, entry, decode, timeout)
+        except Exception as e:
+            self._log(f"Cache revalidation of {endpoint} failed: {str(e)}", xbmc.LOGWARNING)
+        
+    def test_connection(self):
+        """Test connection to NVR system"""
+        try:
+            response = self.session.get(f"{self.base_url}/status")
+            return response.status_code == 200
+        except Exception as e:
+            self._log(f"Connection test failed: {str(e)}", xbmc.LOGERROR)
+            return False
+    
+    def get_cameras(self):
+        """Get list of available cameras"""
+        try:
+            return self._cached_get('cameras')
+        except Exception as e:
+            self._log(f"Failed to get cameras: {str(e)}", xbmc.LOGERROR)
+            if self.strict:
+                raise
+            return []
+    
+    def get_camera_thumbnails(self, urls):
+        """Map camera thumbnail URLs to local cached copies"""
+        return self._thumbnail_paths(urls, CAMERA_THUMBNAIL_TTL)
+    
+    def get_recording_thumbnails(self, urls):
+        """Map recording thumbnail URLs to local cached copies"""
+        return self._thumbnail_paths(urls, RECORDING_THUMBNAIL_TTL)
+    
+    def _thumbnail_paths(self, urls, ttl):
+        if self.thumbnails is None:
+            return {url: url for url in urls}
+        try:
+            return self.thumbnails.local_paths(urls, ttl)
+        except Exception as e:
+            self._log(f"Thumbnail prefetch failed: {str(e)}", xbmc.LOGWARNING)
+            return {url: url for url in urls}
+    
+    def get_camera_stream_url(self, camera_id, quality='medium', streams=1):
+        """Get streaming URL for camera"""
+        return self.get_stream_url_template(quality, streams).format(camera_id=camera_id)
+    
+    def get_stream_url_template(self, quality='medium', streams=1):
+        """Stream URL with a {camera_id} placeholder, for building many URLs at once"""
+        resolution = self.resolve_resolution(quality, streams)
+        base_url = self.base_url
+        if self.use_relay:
+            from resources.lib.relay import relay_address
+            base_url = relay_address(self.profile, self.base_url) or base_url
+        return f"{base_url}/cameras/{{camera_id}}/stream?quality={resolution}"
+    
+    def resolve_resolution(self, quality, streams=1, max_resolution='4k'):
+        """Resolution for a quality setting; "auto" picks one from the bandwidth estimates"""
+        if quality == 'auto':
+            resolution = self.bandwidth.choose_resolution(max_resolution, streams)
+            self._log(f"Auto quality: {resolution} (throughput={(self.bandwidth.throughput or 0) / 1e6:.1f} Mbps "
+                      f"rtt={(self.bandwidth.rtt or 0) * 1000:.0f} ms)", xbmc.LOGDEBUG)
+            return resolution
+        return QUALITY_RESOLUTIONS.get(quality, '720p')
+    
+    def get_grid_stream_url(self, camera_ids, quality='low'):
+        """URL of one tiled stream of several cameras, or None without a mosaic server"""
+        resolution = self.resolve_resolution(quality, len(camera_ids), max_resolution='1080p')
+        cameras = ','.join(str(camera_id) for camera_id in camera_ids)
+        url = f"{self.mosaic_url}/grid/stream?cameras={cameras}&quality={resolution}"
+        probe = self.session.head
+        if urlsplit(self.mosaic_url)[:2] != urlsplit(self.base_url)[:2]:
+            # A separate mosaic server gets its own token, never the NVR
+            # credentials, and one plain probe instead of retried requests
+            if self.mosaic_token:
+                url += f"&token={quote(self.mosaic_token, safe='')}"
+            probe = requests.head
+        try:
+            response = probe(url, timeout=MOSAIC_PROBE_TIMEOUT)
+            response.close()
+            if response.status_code == 200:
+                return url
+        except requests.RequestException as e:
+            self._log(f"Mosaic server not reachable: {str(e)}", xbmc.LOGDEBUG)
+        return None
+    
+    def get_recordings(self, camera_id=None, start_date=None, end_date=None, fields=None):
+        """Get list of recordings; with `fields`, as compact records holding only those"""
+        try:
+            params = {}
+            if camera_id:
+                params['camera_id'] = camera_id
+            if start_date:
+                params['start_date'] = start_date
+            if end_date:
+                params['end_date'] = end_date
+            
+            if fields:
+                params['fields'] = ','.join(fields)
+                return as_records(self._cached_get('recordings', params, self._records_decoder(fields)), fields)
+            return self._cached_get('recordings', params)
+        except Exception as e:
+            self._log(f"Failed to get recordings: {str(e)}", xbmc.LOGERROR)
+            if self.strict:
+                raise
+            return []
+    
+    def get_recordings_page(self, camera_id=None, start_date=None, end_date=None, cursor=None,
+                            limit=RECORDINGS_PAGE_SIZE, timeout=None, fields=None):
+        """Get one page of recordings; returns (recordings, next_cursor)
+        
+        With `fields`, recordings are compact records holding only those fields.
+        """
+        try:
+            # One item more than the page shows whether a bare array goes on
+            params = {'limit': limit + 1}
+            if fields:
+                params['fields'] = ','.join(fields)
+            if camera_id:
+                params['camera_id'] = camera_id
+            if start_date:
+                params['start_date'] = start_date
+            if end_date:
+                params['end_date'] = end_date
+            
+            # Server cursors are passed through; offset and skip cursors are
+            # ours, for servers that return a bare array
+            offset = 0
+            skip = 0
+            if cursor and cursor.startswith(OFFSET_CURSOR_PREFIX):
+                offset = int(cursor[len(OFFSET_CURSOR_PREFIX):])
+                params['offset'] = offset
+            elif cursor and cursor.startswith(SKIP_CURSOR_PREFIX):
+                skip = int(cursor[len(SKIP_CURSOR_PREFIX):])
+            elif cursor:
+                params['cursor'] = cursor
+            
+            # Skipped items are dropped here, so each skip is a different page of one request
+            page = self._cached_get('recordings', params, self._page_decoder(offset, skip, limit, fields), timeout,
+                                    key_params={'skip': skip} if skip else None)
+            if isinstance(page, dict):
+                items = page.get('items', [])
+                if isinstance(items, dict):
+                    items = from_table(items)
+                return items, page.get('next_cursor')
+            return [], None
+        except Exception as e:
+            self._log(f"Failed to get recordings page: {str(e)}", xbmc.LOGERROR)
+            if self.strict:
+                raise
+            return [], None
+    
+    def get_recording_index(self, recording_id):
+        """Keyframe/segment index of a recording, or None if the NVR has none"""
+        try:
+            response = self.session.get(f"{self.base_url}/recordings/{recording_id}/index",
+                                        timeout=RECORDING_INDEX_TIMEOUT)
+            try:
+                if response.status_code == 200:
+                    return response.json()
+                return None
+            finally:
+                response.close()
+        except Exception as e:
+            self._log(f"Failed to get index of recording {recording_id}: {str(e)}", xbmc.LOGWARNING)
+            return None
+    
+    def iter_recordings_since(self, since, until=None, batch=RECORDINGS_SYNC_BATCH, timeout=RECORDINGS_SYNC_TIMEOUT):
+        """Stream every recording that started after `since` (and by `until`), bypassing the cache
+        
+        Pages are followed with the server's cursor, or with offsets when the
+        server answers with a bare array of `batch` items; items are parsed as
+        they arrive, so memory use is independent of the backlog. Raises on
+        failure.
+        """
+        query = {'since': since, 'limit': batch}
+        if until:
+            query['end_date'] = until
+        params = dict(query)
+        previous_first = None
+        while True:
+            response = self.session.get(f"{self.base_url}/recordings", params=params,
+                                        stream=True, timeout=timeout)
+            try:
+                response.raise_for_status()
+                stream = JSONStream(self._body_chunks(response))
+                count = 0
+                first = None
+                for item in stream:
+                    if count == 0:
+                        first = item.get('id')
+                        if previous_first is not None and first == previous_first:
+                            # The server ignores offsets and sent the same page again
+                            return
+                    count += 1
+                    yield item
+            finally:
+                response.close()
+            
+            if stream.wrapped:
+                next_cursor = stream.meta.get('next_cursor')
+                if not next_cursor:
+                    return
+                params = {**query, 'cursor': next_cursor}
+            elif count == batch:
+                params = {**query, 'offset': params.get('offset', 0) + count}
+                previous_first = first
+            else:
+                return
+    
+    def get_recordings_per_camera(self, camera_ids, start_date=None, end_date=None,
+                                  limit=RECORDINGS_PAGE_SIZE, timeout=CAMERA_FANOUT_TIMEOUT, fields=None):
+        """Query recordings of several cameras concurrently; returns a FanOutResult"""
+        def fetch(camera_id):
+            recordings, _ = self.get_recordings_page(camera_id=camera_id, start_date=start_date,
+                                                     end_date=end_date, limit=limit, timeout=timeout,
+                                                     fields=fields)
+            return recordings
+        
+        return fan_out(fetch, camera_ids, timeout=timeout, max_workers=FANOUT_WORKERS)
+    
+    def _page_decoder(self, offset, skip, limit, fields=None):
+        """Build a decoder that stream-parses at most one page of a listing
+        
+        A wrapped page is the server's page. Of a bare array, `skip` items
+        are dropped first (the server ignores paging) and `limit` are kept;
+        one more item after them means another page, and a second one that
+        the server ignores limit, so the page after is cut out here as well.
+        """
+        record = record_type(fields) if fields else None
+        def decode(response):
+            stream = JSONStream(self._body_chunks(response))
+            items = []
+            next_cursor = None
+            beyond = 0
+            for index, item in enumerate(stream):
+                if not stream.wrapped and index < skip:
+                    continue
+                if not stream.wrapped and len(items) == limit:
+                    beyond += 1
+                    if skip or beyond > 1:
+                        # Stop reading; the rest of the body is never downloaded
+                        next_cursor = f"{SKIP_CURSOR_PREFIX}{offset + skip + limit}"
+                        break
+                    next_cursor = f"{OFFSET_CURSOR_PREFIX}{offset + limit}"
+                    continue
+                items.append(record.from_dict(item) if record else item)
+            if stream.wrapped:
+                next_cursor = stream.meta.get('next_cursor')
+            page = {'items': items, 'next_cursor': next_cursor}
+            cached = {'items': to_table(fields, items) if record else items, 'next_cursor': next_cursor}
+            return page, json.dumps(cached).encode('utf-8')
+        return decode
+    
+    def _records_decoder(self, fields):
+        """Build a decoder that turns each listed item into a record as it is parsed"""
+        record = record_type(fields)
+        def decode(response):
+            items = [record.from_dict(item) for item in JSONStream(self._body_chunks(response))
+                     if isinstance(item, dict)]
+            # Only the response cache needs a body; building one doubles the peak
+            body = json.dumps(to_table(fields, items)).encode('utf-8') if self.cache is not None else b''
+            return items, body
+        return decode
+    
+    def get_motion_events(self, camera_id=None, limit=50, fields=None):
+        """Get motion detection events; with `fields`, as compact records holding only those"""
+        try:
+            params = {'limit': limit}
+            if camera_id:
+                params['camera_id'] = camera_id
+            
+            if fields:
+                params['fields'] = ','.join(fields)
+                return as_records(self._cached_get('motion-events', params, self._records_decoder(fields)), fields)
+            return self._cached_get('motion-events', params)
+        except Exception as e:
+            self._log(f"Failed to get motion events: {str(e)}", xbmc.LOGERROR)
+            if self.strict:
+                raise
+            return []
+    
+    def get_motion_events_since(self, since=None, limit=MOTION_SYNC_BATCH, wait=None, timeout=None):
+        """Motion events newer than `since`, bypassing the cache; raises on failure
+        
+        With `wait`, a long-polling NVR holds the request until an event arrives;
+        other servers simply answer at once.
+        """
+        params = {'limit': limit, 'order': 'asc'}
+        if since:
+            params['since'] = since
+        if wait:
+            params['wait'] = wait
+        response = self.session.get(f"{self.base_url}/motion-events", params=params, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+    
+    def stream_motion_events(self, since=None):
+        """Follow the NVR's server-sent motion event stream
+        
+        Yields event dicts, and None for keep-alive comments. Raises
+        StreamNotSupported when the NVR has no stream endpoint.
+        """
+        params = {'since': since} if since else None
+        response = self.session.get(f"{self.base_url}/motion-events/stream", params=params, stream=True,
+                                    headers={'Accept': 'text/event-stream'},
+                                    timeout=(MOTION_STREAM_CONNECT_TIMEOUT, MOTION_STREAM_READ_TIMEOUT))
+        self._event_stream = response
+        try:
+            if response.status_code in (404, 405, 501):
+                raise StreamNotSupported(f"HTTP {response.status_code}")
+            response.raise_for_status()
+            
+            data = []
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    # A blank line dispatches the event
+                    if data:
+                        yield json.loads('\n'.join(data))
+                        data = []
+                    continue
+                if line.startswith(':'):
+                    yield None
+                    continue
+                field, _, value = line.partition(':')
+                if field == 'data':
+                    data.append(value[1:] if value.startswith(' ') else value)
+        finally:
+            self._event_stream = None
+            response.close()
+    
+    def close_streams(self):
+        """Abort a running event stream from another thread"""
+        response = self._event_stream
+        if response is not None:
+            response.close()
+    
+    def ptz_control(self, camera_id, command, value=None):
+        """Control PTZ camera"""
+        try:
+            data = {'command': command}
+            if value:
+                data['value'] = value
+                
+            response = self.session.post(f"{self.base_url}/cameras/{camera_id}/ptz", json=data)
+            return response.status_code == 200
+        except Exception as e:
+            self._log(f"PTZ control failed: {str(e)}", xbmc.LOGERROR)
+            return False
+    
+    def take_snapshot(self, camera_id):
+        """Take snapshot from camera"""
+        try:
+            response = self.session.post(f"{self.base_url}/cameras/{camera_id}/snapshot")
+            return response.status_code == 200
+        except Exception as e:
+            self._log(f"Snapshot failed: {str(e)}", xbmc.LOGERROR)
+            return False
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR Kodi Addon - Speculative Prefetch
+Warm the caches for the view the user is likely to open next
+
+Once a listing has been handed to Kodi the invocation has nothing left to do
+while the user reads it. The views usually opened next are fetched in that
+idle time, one request after another and within a time budget, so that their
+answers are already in the response cache when the click comes. The next
+invocation cancels a prefetch that is still running, so it never competes
+with the view the user actually asked for.
+
+Copyright (C) 2025 AI-IT Inc
+Licensed under GPL-3.0
+"""
+
+import os
+import time
+import threading
+
+# main.py looks for it by name (PREFETCH_MARKER) before importing this module
+MARKER_FILE = 'prefetch.active'
+
+# Longest time an invocation keeps running for its prefetches (seconds)
+PREFETCH_BUDGET = 3.0
+
+
+def cancel_running(profile_dir):
+    """Stop the prefetch of an earlier invocation at its next task"""
+    try:
+        os.remove(os.path.join(profile_dir, MARKER_FILE))
+    except OSError:
+        pass
+
+
+class Prefetcher:
+    """Tasks run in order on a worker thread until done, cancelled or out of time
+
+    A task already running when the budget runs out or the prefetch is
+    cancelled is left to finish; the ones after it are dropped.
+    """
+
+    def __init__(self, profile_dir, budget=PREFETCH_BUDGET, should_stop=None):
+        self.marker = os.path.join(profile_dir, MARKER_FILE)
+        self.budget = budget
+        self.should_stop = should_stop
+        self.tasks = []
+        self.done = []
+        self._owner = f"{os.getpid()}:{id(self)}"
+        self._deadline = 0
+
+    def add(self, name, func, *args):
+        self.tasks.append((name, func, args))
+
+    def cancelled(self):
+        """Whether another invocation started or the time is up"""
+        if time.monotonic() >= self._deadline or (self.should_stop and self.should_stop()):
+            return True
+        return not self._owns_marker()
+
+    def run(self, log=None):
+        """Run the queued tasks; returns the names of those that completed"""
+        if not self.tasks:
+            return []
+        try:
+            os.makedirs(os.path.dirname(self.marker), exist_ok=True)
+            with open(self.marker, 'w', encoding='utf-8') as f:
+                f.write(self._owner)
+        except OSError:
+            return []
+
+        self._deadline = time.monotonic() + self.budget
+        worker = threading.Thread(target=self._work, args=(log,), daemon=True)
+        worker.start()
+        worker.join(self.budget)
+        if self._owns_marker():
+            cancel_running(os.path.dirname(self.marker))
+        return list(self.done)
+
+    def _owns_marker(self):
+        try:
+            with open(self.marker, 'r', encoding='utf-8') as f:
+                return f.read() == self._owner
+        except OSError:
+            return False
+
+    def _work(self, log):
+        for name, func, args in self.tasks:
+            if self.cancelled():
+                return
+            try:
+                func(*args)
+            except Exception as e:
+                if log:
+                    log(f"Prefetch of {name} failed: {str(e)}")
+                continue
+            self.done.append(name)
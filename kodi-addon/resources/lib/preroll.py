@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR Kodi Addon - Live Stream Pre-roll
+The latest keyframe-aligned GOP of an MPEG-TS camera stream
+
+A player joining a live stream cannot show anything before the next
+keyframe, and it needs the stream's program tables before that. The relay
+keeps, per camera stream, the current program tables plus every packet since
+the latest keyframe, and hands them to a new player ahead of the live
+packets, so the picture appears at once and playback runs on into the live
+stream.
+
+Copyright (C) 2025 AI-IT Inc
+Licensed under GPL-3.0
+"""
+
+TS_PACKET_SIZE = 188
+TS_SYNC_BYTE = 0x47
+
+PAT_PID = 0
+
+STREAM_TYPE_H264 = 0x1B
+STREAM_TYPE_H265 = 0x24
+
+# NAL unit types starting a decodable picture: H.264 SPS and IDR, H.265
+# parameter sets and IRAP pictures
+KEY_NAL_TYPES = {
+    STREAM_TYPE_H264: (5, 7),
+    STREAM_TYPE_H265: (16, 17, 18, 19, 20, 21, 32, 33, 34),
+}
+
+
+def packet_pid(packet):
+    return ((packet[1] & 0x1F) << 8) | packet[2]
+
+
+def _payload(packet):
+    """Payload of a packet, or b'' when it has none"""
+    control = (packet[3] >> 4) & 0x3
+    if not control & 0x1:
+        return b''
+    if control == 0x3:
+        return packet[5 + packet[4]:]
+    return packet[4:]
+
+
+def _nal_type(header, stream_type):
+    if stream_type == STREAM_TYPE_H265:
+        return (header >> 1) & 0x3F
+    return header & 0x1F
+
+
+def is_keyframe(packet, stream_type):
+    """Whether a packet of the video stream starts a keyframe
+
+    Encoders mark keyframes with the random access indicator; streams without
+    it are recognised by the NAL units of their codec at the start of a PES
+    packet. Only call this for the video PID: muxers set the indicator on
+    audio frames too.
+    """
+    control = (packet[3] >> 4) & 0x3
+    if control & 0x2 and packet[4] and packet[5] & 0x40:
+        return True
+    if not packet[1] & 0x40:
+        return False
+    payload = bytes(_payload(packet))
+    # Video PES start code and header, then the elementary stream
+    if payload[:3] != b'\x00\x00\x01' or len(payload) < 9 or payload[3] & 0xF0 != 0xE0:
+        return False
+    key_types = KEY_NAL_TYPES.get(stream_type)
+    if key_types is None:
+        return False
+    data = payload[9 + payload[8]:]
+    start = data.find(b'\x00\x00\x01')
+    while 0 <= start < len(data) - 3:
+        if _nal_type(data[start + 3], stream_type) in key_types:
+            return True
+        start = data.find(b'\x00\x00\x01', start + 3)
+    return False
+
+
+def pmt_pids(pat_packet):
+    """Program map table PIDs listed in a PAT packet"""
+    payload = _payload(pat_packet)
+    if not payload or not pat_packet[1] & 0x40:
+        return set()
+    section = payload[1 + payload[0]:]
+    if len(section) < 8 or section[0] != 0x00:
+        return set()
+    length = ((section[1] & 0x0F) << 8) | section[2]
+    # Program entries sit between the 8 byte header and the 4 byte CRC
+    entries = section[8:min(3 + length - 4, len(section))]
+    pids = set()
+    for i in range(0, len(entries) - 3, 4):
+        program = (entries[i] << 8) | entries[i + 1]
+        if program:
+            pids.add(((entries[i + 2] & 0x1F) << 8) | entries[i + 3])
+    return pids
+
+
+def pmt_streams(pmt_packet):
+    """{PID: stream type} of the elementary streams listed in a PMT packet"""
+    payload = _payload(pmt_packet)
+    if not payload or not pmt_packet[1] & 0x40:
+        return {}
+    section = payload[1 + payload[0]:]
+    if len(section) < 12 or section[0] != 0x02:
+        return {}
+    length = ((section[1] & 0x0F) << 8) | section[2]
+    end = min(3 + length - 4, len(section))
+    # Elementary stream entries follow the 12 byte header and program info
+    i = 12 + (((section[10] & 0x0F) << 8) | section[11])
+    streams = {}
+    while i + 5 <= end:
+        pid = ((section[i + 1] & 0x1F) << 8) | section[i + 2]
+        streams[pid] = section[i]
+        i += 5 + (((section[i + 3] & 0x0F) << 8) | section[i + 4])
+    return streams
+
+
+def video_stream(pmt_packet):
+    """(PID, stream type) of the H.264 or H.265 stream of a PMT packet, or None"""
+    for pid, stream_type in sorted(pmt_streams(pmt_packet).items()):
+        if stream_type in KEY_NAL_TYPES:
+            return pid, stream_type
+    return None
+
+
+class PrerollBuffer:
+    """Program tables and packets since the latest keyframe of one stream
+
+    A GOP larger than max_bytes is not kept; the buffer stays empty until
+    the next keyframe. Keyframes are only looked for on the video stream the
+    PMT lists, so nothing is kept before the first PMT.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._chunks = []
+        self._tables = {}
+        self._pmt_pids = set()
+        self._video = None
+        self._partial = b''
+        self._overflow = True
+
+    def add(self, data):
+        """Follow a chunk of the live stream"""
+        if self._partial:
+            data = self._partial + data
+            self._partial = b''
+        start = self._sync(data)
+        if start < 0:
+            self._partial = data[-(TS_PACKET_SIZE - 1):]
+            return
+        end = start + (len(data) - start) // TS_PACKET_SIZE * TS_PACKET_SIZE
+        self._partial = data[end:]
+
+        keyframe = None
+        view = memoryview(data)
+        for offset in range(start, end, TS_PACKET_SIZE):
+            packet = view[offset:offset + TS_PACKET_SIZE]
+            if packet[0] != TS_SYNC_BYTE:
+                # Lost sync: pick the stream up again from the next chunk
+                self._partial = data[offset + 1:]
+                end = offset
+                break
+            pid = packet_pid(packet)
+            if pid == PAT_PID and packet[1] & 0x40:
+                self._tables = {PAT_PID: bytes(packet)}
+                self._pmt_pids = pmt_pids(packet)
+            elif pid in self._pmt_pids and packet[1] & 0x40:
+                self._tables[pid] = bytes(packet)
+                self._video = video_stream(packet) or self._video
+            elif self._video and pid == self._video[0] and is_keyframe(packet, self._video[1]):
+                keyframe = offset
+
+        if keyframe is not None:
+            self._chunks = []
+            self.size = 0
+            self._overflow = False
+            start = keyframe
+        if self._overflow or end <= start:
+            return
+        chunk = data[start:end]
+        self._chunks.append(chunk)
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            self._chunks = []
+            self.size = 0
+            self._overflow = True
+
+    def preroll(self):
+        """Chunks a joining player starts with: tables, then the current GOP
+
+        The last chunk completes the packet cut off at the end of the latest
+        chunk added, so the live chunks that follow continue seamlessly.
+        """
+        if not self._chunks:
+            return []
+        tables = b''.join(self._tables[pid] for pid in sorted(self._tables))
+        return ([tables] if tables else []) + self._chunks + ([self._partial] if self._partial else [])
+
+    def resize(self, max_bytes):
+        """Change the limit; a GOP already over it is dropped until the next keyframe"""
+        self.max_bytes = max_bytes
+        if self.size > max_bytes:
+            self.clear()
+
+    def clear(self):
+        self._chunks = []
+        self.size = 0
+        self._overflow = True
+
+    @staticmethod
+    def _sync(data):
+        """Offset of the first packet boundary in data, or -1"""
+        for offset in range(min(TS_PACKET_SIZE, len(data))):
+            if data[offset] == TS_SYNC_BYTE and (offset + TS_PACKET_SIZE >= len(data)
+                                                 or data[offset + TS_PACKET_SIZE] == TS_SYNC_BYTE):
+                return offset
+        return -1
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR Kodi Addon - Call Profiling
+cProfile captures of router dispatches, for the diagnostics view
+
+Only used while debug logging and profiling are both enabled; profiling
+slows every call down noticeably.
+
+Copyright (C) 2025 AI-IT Inc
+Licensed under GPL-3.0
+"""
+
+import io
+import os
+import time
+import cProfile
+import pstats
+
+PROFILES_DIR = 'profiles'
+
+# Captures kept on disk, newest first
+PROFILE_KEEP = 20
+
+# Functions listed per capture in the diagnostics view
+SUMMARY_LINES = 15
+
+
+def profile_call(profile_dir, name, func, *args, **kwargs):
+    """Run func under cProfile and save the capture as <time>-<name>.prof"""
+    directory = os.path.join(profile_dir, PROFILES_DIR)
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        try:
+            os.makedirs(directory, exist_ok=True)
+            profiler.dump_stats(os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{elapsed_ms:.0f}ms.prof"))
+            _prune(directory)
+        except OSError:
+            pass
+
+
+def list_profiles(profile_dir):
+    """Saved captures, newest first, as (path, label)"""
+    directory = os.path.join(profile_dir, PROFILES_DIR)
+    try:
+        names = sorted((name for name in os.listdir(directory) if name.endswith('.prof')), reverse=True)
+    except OSError:
+        return []
+    profiles = []
+    for name in names:
+        stamp, _, rest = name[:-len('.prof')].partition('-')
+        clock, _, rest = rest.partition('-')
+        mode, _, elapsed = rest.rpartition('-')
+        label = f"{mode} {stamp[:4]}-{stamp[4:6]}-{stamp[6:]} {clock[:2]}:{clock[2:4]}:{clock[4:]} ({elapsed})"
+        profiles.append((os.path.join(directory, name), label))
+    return profiles
+
+
+def summarize(path, lines=SUMMARY_LINES):
+    """Top functions of a capture by cumulative time, as text"""
+    output = io.StringIO()
+    try:
+        stats = pstats.Stats(path, stream=output)
+    except (OSError, TypeError, ValueError, EOFError) as e:
+        return f"Unreadable profile: {str(e)}"
+    stats.strip_dirs().sort_stats('cumulative').print_stats(lines)
+    # Skip pstats' header down to the table
+    text = output.getvalue()
+    table = text.find('ncalls')
+    return text[table:] if table >= 0 else text
+
+
+def _prune(directory):
+    names = sorted((name for name in os.listdir(directory) if name.endswith('.prof')), reverse=True)
+    for name in names[PROFILE_KEEP:]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
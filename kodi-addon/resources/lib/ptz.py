@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR Kodi Addon - PTZ Control Window
+Steer a PTZ camera over one kept-alive NVR connection
+
+The window stays open while the camera is steered, so each step costs one
+POST on an established connection instead of a plugin start and a new
+handshake. Held direction keys become one continuous move followed by a stop
+once the key repeats end; presses arriving while a command is in flight are
+coalesced so that only the latest one is sent.
+
+Copyright (C) 2025 AI-IT Inc
+Licensed under GPL-3.0
+"""
+
+import time
+import threading
+
+import xbmc
+import xbmcgui
+
+# A move stops when no key repeat arrived for this long (seconds); Kodi
+# repeats held keys roughly every 50-100 ms
+RELEASE_TIMEOUT = 0.25
+
+ACTION_PAGE_UP = getattr(xbmcgui, 'ACTION_PAGE_UP', 5)
+ACTION_PAGE_DOWN = getattr(xbmcgui, 'ACTION_PAGE_DOWN', 6)
+
+# Remote buttons and the continuous moves they start
+ACTION_COMMANDS = {
+    xbmcgui.ACTION_MOVE_LEFT: 'pan_left',
+    xbmcgui.ACTION_MOVE_RIGHT: 'pan_right',
+    xbmcgui.ACTION_MOVE_UP: 'tilt_up',
+    xbmcgui.ACTION_MOVE_DOWN: 'tilt_down',
+    ACTION_PAGE_UP: 'zoom_in',
+    ACTION_PAGE_DOWN: 'zoom_out',
+}
+
+CLOSE_ACTIONS = (xbmcgui.ACTION_PREVIOUS_MENU, xbmcgui.ACTION_NAV_BACK)
+
+
+class PTZController(threading.Thread):
+    """Sends PTZ commands for one camera from a single worker thread"""
+
+    def __init__(self, nvr_api, camera_id, on_sent=None):
+        super().__init__(name='PTZController', daemon=True)
+        self.nvr_api = nvr_api
+        self.camera_id = camera_id
+        self.on_sent = on_sent
+        self.latencies = []
+        self.presses = 0
+        self.coalesced = 0
+        self.failures = 0
+        self._cond = threading.Condition()
+        self._pending = None
+        self._moving = None
+        self._release_at = 0
+        self._closed = False
+
+    def press(self, command):
+        """Direction input; repeats of a held key keep the current move going"""
+        with self._cond:
+            self.presses += 1
+            now = time.monotonic()
+            self._release_at = now + RELEASE_TIMEOUT
+            if command == self._moving:
+                self.coalesced += 1
+            else:
+                self._replace_pending((command, 'continuous', now))
+                self._moving = command
+            self._cond.notify()
+
+    def home(self):
+        with self._cond:
+            self.presses += 1
+            self._moving = None
+            self._replace_pending(('home', None, time.monotonic()))
+            self._cond.notify()
+
+    def close(self):
+        """Stop any move in progress and wait for the worker to finish"""
+        with self._cond:
+            if self._moving:
+                self._replace_pending(('stop', None, time.monotonic()))
+                self._moving = None
+            self._closed = True
+            self._cond.notify()
+        self.join()
+        self._log_summary()
+
+    def _log(self, message, level):
+        xbmc.log(f"[{self.nvr_api.addon_id}] {message}", level)
+
+    def _replace_pending(self, command):
+        # An unsent command is superseded by the newer one
+        if self._pending is not None:
+            self.coalesced += 1
+        self._pending = command
+
+    def _next_command(self):
+        """Block until a command is due; returns None once closed"""
+        with self._cond:
+            while self._pending is None:
+                if self._moving:
+                    remaining = self._release_at - time.monotonic()
+                    if remaining <= 0:
+                        # Key repeats have ended: the key was released
+                        self._pending = ('stop', None, self._release_at)
+                        self._moving = None
+                        break
+                    self._cond.wait(remaining)
+                elif self._closed:
+                    return None
+                else:
+                    self._cond.wait()
+            command, self._pending = self._pending, None
+            return command
+
+    def run(self):
+        # Open the connection before the first command needs it
+        self.nvr_api.test_connection()
+
+        while True:
+            command = self._next_command()
+            if command is None:
+                return
+            name, value, pressed_at = command
+            success = self.nvr_api.ptz_control(self.camera_id, name, value)
+            latency_ms = (time.monotonic() - pressed_at) * 1000
+            if success:
+                self.latencies.append(latency_ms)
+            else:
+                self.failures += 1
+            self._log(f"PTZ camera={self.camera_id} {name} latency={latency_ms:.0f}ms"
+                      f"{'' if success else ' failed'}", xbmc.LOGDEBUG)
+            if self.on_sent:
+                self.on_sent(name, latency_ms, success)
+
+    def _log_summary(self):
+        if not self.latencies and not self.failures:
+            return
+        latencies = sorted(self.latencies) or [0]
+        median = latencies[len(latencies) // 2]
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self._log(f"PTZ camera={self.camera_id} presses={self.presses} sent={len(self.latencies)} "
+                  f"coalesced={self.coalesced} failed={self.failures} "
+                  f"latency median={median:.0f}ms p95={p95:.0f}ms", xbmc.LOGINFO)
+
+
+class PTZWindow(xbmcgui.WindowDialog):
+    """Overlay that turns remote buttons into PTZ commands until closed"""
+
+    def __init__(self, controller, camera_name):
+        super().__init__()
+        self.controller = controller
+        controller.on_sent = self._show_sent
+
+        width = self.getWidth()
+        height = self.getHeight()
+        self.title = xbmcgui.ControlLabel(40, height - 170, width - 80, 40, f"PTZ Control - {camera_name}")
+        self.help = xbmcgui.ControlLabel(
+            40, height - 125, width - 80, 40,
+            "Arrows: pan/tilt (hold to keep moving)   Page Up/Down: zoom   OK: home   Back: close")
+        self.status = xbmcgui.ControlLabel(40, height - 80, width - 80, 40, "Ready")
+        self.addControls([self.title, self.help, self.status])
+
+    def onAction(self, action):
+        action_id = action.getId()
+        if action_id in CLOSE_ACTIONS:
+            self.close()
+        elif action_id in ACTION_COMMANDS:
+            self.controller.press(ACTION_COMMANDS[action_id])
+        elif action_id == xbmcgui.ACTION_SELECT_ITEM:
+            self.controller.home()
+
+    def _show_sent(self, command, latency_ms, success):
+        label = command.replace('_', ' ').capitalize()
+        if success:
+            self.status.setLabel(f"{label} ({latency_ms:.0f} ms)")
+        else:
+            self.status.setLabel(f"{label} failed")
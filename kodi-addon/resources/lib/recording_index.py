@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR Kodi Addon - Recording Index
+Local SQLite index of recording metadata, synced incrementally
+
+Recordings never change once closed, so only recordings that started after
+the sync watermark, and those that were still being written, are fetched.
+Date views are answered from the index, and server traffic grows with the
+number of new recordings rather than with the size of the range being browsed.
+
+The first sync only fetches the newest day; the rest of the history is
+downloaded by the background service one day at a time, newest first, and
+each day is committed on its own, so an interrupted backfill carries on where
+it stopped.
+
+Copyright (C) 2025 AI-IT Inc
+Licensed under GPL-3.0
+"""
+
+import os
+import time
+import threading
+from datetime import datetime, timedelta
+
+from resources.lib.database import connect
+
+DB_FILE = 'recordings.db'
+
+# History kept locally; covers the month view
+HISTORY_DAYS = 31
+
+# An index synced this recently is not synced again (seconds)
+SYNC_INTERVAL = 30
+
+# Recordings may show up on the NVR a little late, so the newest ones are
+# fetched again; so is every recording whose end was this close to the time
+# it was fetched, since it may still be growing
+SYNC_OVERLAP = timedelta(minutes=15)
+
+# History downloaded per backfill step
+BACKFILL_WINDOW = timedelta(days=1)
+
+INSERT_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    id TEXT PRIMARY KEY,
+    camera_id TEXT,
+    camera_name TEXT,
+    start_time TEXT NOT NULL,
+    duration INTEGER,
+    file_size INTEGER,
+    thumbnail_url TEXT,
+    playback_url TEXT
+);
+CREATE INDEX IF NOT EXISTS recordings_by_time ON recordings (start_time);
+CREATE INDEX IF NOT EXISTS recordings_by_camera ON recordings (camera_id, start_time);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+COLUMNS = ('id', 'camera_id', 'camera_name', 'start_time', 'duration', 'file_size', 'thumbnail_url', 'playback_url')
+
+
+def _parse_time(value):
+    try:
+        return datetime.fromisoformat(value.replace('Z', ''))
+    except (AttributeError, ValueError):
+        return None
+
+
+def _seconds(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+class RecordingIndex:
+    """Recording metadata indexed by start time and camera"""
+
+    def __init__(self, profile_dir):
+        self.path = os.path.join(profile_dir, DB_FILE)
+        self._lock = threading.Lock()
+        self.db = connect(self.path)
+        with self._lock:
+            self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def covers(self, start_date):
+        """True if every recording since the ISO timestamp `start_date` is indexed"""
+        covered_from = self._meta('covered_from')
+        if not start_date or covered_from is None:
+            return False
+        # Recordings older than the history window are pruned on sync
+        return start_date >= max(covered_from, self._history_start())
+
+    def is_synced(self):
+        """True once a full sync has completed"""
+        return self._meta('watermark') is not None
+
+    def sync(self, nvr_api, force=False):
+        """Fetch recordings newer than the watermark, or the newest day at first; returns the number stored"""
+        last_sync = float(self._meta('last_sync') or 0)
+        if not force and time.time() - last_sync < SYNC_INTERVAL:
+            return 0
+
+        watermark = self._meta('watermark')
+        if watermark:
+            since = self._resync_from(watermark)
+        else:
+            since = (datetime.now() - BACKFILL_WINDOW).replace(microsecond=0).isoformat()
+
+        stored, newest, open_from = self._store(nvr_api.iter_recordings_since(since))
+
+        # The watermark only moves once everything fetched has been stored
+        with self._lock, self.db:
+            if not watermark:
+                self._set_meta('covered_from', since)
+            self._set_meta('watermark', max(newest or since, watermark or ''))
+            self._set_meta('open_from', open_from or '')
+            self._set_meta('last_sync', str(time.time()))
+            self.db.execute('DELETE FROM recordings WHERE start_time < ?', (self._history_start(),))
+        return stored
+
+    def backfill(self, nvr_api, should_stop=None):
+        """Download the history older than the indexed range, a window at a time; returns the number stored"""
+        stored = 0
+        while not (should_stop and should_stop()):
+            covered_from = self._meta('covered_from')
+            history_start = self._history_start()
+            parsed = _parse_time(covered_from)
+            if parsed is None or covered_from <= history_start:
+                break
+            window_start = max((parsed - BACKFILL_WINDOW).isoformat(), history_start)
+            count, _, open_from = self._store(nvr_api.iter_recordings_since(window_start, until=covered_from))
+            open_from = min(filter(None, (open_from, self._meta('open_from'))), default='')
+            with self._lock, self.db:
+                self._set_meta('covered_from', window_start)
+                self._set_meta('open_from', open_from)
+            stored += count
+        return stored
+
+    def page(self, start_date=None, end_date=None, camera_id=None, offset=0, limit=100):
+        """Recordings newest first, as dicts shaped like the NVR's listing"""
+        clauses = []
+        params = []
+        if camera_id is not None:
+            clauses.append('camera_id = ?')
+            params.append(str(camera_id))
+        if start_date:
+            clauses.append('start_time >= ?')
+            params.append(start_date)
+        if end_date:
+            clauses.append('start_time <= ?')
+            params.append(end_date)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        params.extend([limit, offset])
+        with self._lock:
+            rows = self.db.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM recordings {where} "
+                f"ORDER BY start_time DESC LIMIT ? OFFSET ?", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def _store(self, recordings):
+        """Store recordings in batches; returns (stored, newest start, oldest possibly open start)"""
+        # Recordings ending after this may still have been growing when fetched
+        open_after = datetime.now() - SYNC_OVERLAP
+        stored = 0
+        newest = None
+        open_from = None
+        batch = []
+        for recording in recordings:
+            row = self._row(recording)
+            if row is None:
+                continue
+            batch.append(row)
+            if newest is None or row[3] > newest:
+                newest = row[3]
+            started = _parse_time(row[3])
+            if started is not None and started + timedelta(seconds=_seconds(row[4])) >= open_after:
+                if open_from is None or row[3] < open_from:
+                    open_from = row[3]
+            if len(batch) >= INSERT_BATCH:
+                stored += self._insert(batch)
+                batch = []
+        stored += self._insert(batch)
+        return stored, newest, open_from
+
+    def _resync_from(self, watermark):
+        """Where an incremental sync starts: the overlap before the watermark, or the oldest open recording"""
+        parsed = _parse_time(watermark)
+        since = (parsed - SYNC_OVERLAP).isoformat() if parsed is not None else watermark
+        open_from = _parse_time(self._meta('open_from'))
+        if open_from is not None:
+            # `since` is exclusive
+            since = min(since, (open_from - timedelta(seconds=1)).isoformat())
+        return since
+
+    def _insert(self, rows):
+        if not rows:
+            return 0
+        with self._lock, self.db:
+            self.db.executemany(
+                f"INSERT OR REPLACE INTO recordings ({', '.join(COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    @staticmethod
+    def _row(recording):
+        start_time = recording.get('start_time')
+        if recording.get('id') is None or not start_time:
+            return None
+        camera_id = recording.get('camera_id')
+        return (str(recording['id']), str(camera_id) if camera_id is not None else None,
+                recording.get('camera_name'), start_time, recording.get('duration', 0),
+                recording.get('file_size', 0), recording.get('thumbnail_url', ''),
+                recording.get('playback_url', ''))
+
+    @staticmethod
+    def _history_start():
+        return (datetime.now() - timedelta(days=HISTORY_DAYS)).replace(microsecond=0).isoformat()
+
+    def _meta(self, key):
+        with self._lock:
+            row = self.db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR Kodi Addon - Compact Listing Records
+Slotted records holding only the fields a view needs
+
+A decoded JSON object costs a dict plus a key string per field. Listings
+decoded into records keep one small slotted object per item instead, and
+drop every field the view does not use while the response is parsed, which
+keeps large listings out of swap on low-memory devices.
+
+Copyright (C) 2025 AI-IT Inc
+Licensed under GPL-3.0
+"""
+
+# Fields each view reads, requested from the NVR with ?fields=
+RECORDING_FIELDS = ('id', 'camera_id', 'camera_name', 'start_time', 'duration', 'file_size',
+                    'thumbnail_url', 'playback_url')
+MOTION_EVENT_FIELDS = ('id', 'camera_id', 'camera_name', 'timestamp', 'confidence', 'duration',
+                       'recording_url')
+
+
+class Record:
+    """Read like the dict it replaces: get(), [], `in` and setdefault()
+
+    A field the NVR did not send (or sent as null) reads as missing. Only the
+    kept fields can be set; any other raises KeyError rather than being lost.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+        for name in self.__slots__[len(values):]:
+            setattr(self, name, None)
+
+    @classmethod
+    def from_dict(cls, item):
+        record = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(record, name, item.get(name))
+        return record
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(f"{key} is not a field of this record")
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def setdefault(self, key, default=None):
+        value = self.get(key)
+        if value is None:
+            self[key] = default
+            value = default
+        return value
+
+    def values(self):
+        return [getattr(self, name) for name in self.__slots__]
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__ if getattr(self, name) is not None}
+
+    def __repr__(self):
+        return f"Record({self.to_dict()!r})"
+
+
+_record_types = {}
+
+
+def record_type(fields):
+    """Record class with one slot per field (fields that clash with methods are dropped)"""
+    fields = tuple(field for field in fields
+                   if field.isidentifier() and not field.startswith('_') and not hasattr(Record, field))
+    cls = _record_types.get(fields)
+    if cls is None:
+        cls = _record_types[fields] = type('Record', (Record,), {'__slots__': fields})
+    return cls
+
+
+def to_table(fields, records):
+    """Records as {"fields": [...], "rows": [[...], ...]}, for caching as JSON"""
+    return {'fields': list(record_type(fields).__slots__), 'rows': [record.values() for record in records]}
+
+
+def from_table(table):
+    """Records from a to_table() structure"""
+    record = record_type(table.get('fields', ()))
+    return [record(*row) for row in table.get('rows', ())]
+
+
+def as_records(data, fields):
+    """Records from a decoded listing: a table, a list of dicts or records already"""
+    if isinstance(data, dict) and 'rows' in data:
+        return from_table(data)
+    record = record_type(fields)
+    return [item if isinstance(item, Record) else record.from_dict(item)
+            for item in data or () if isinstance(item, (dict, Record))]
@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR Kodi Addon - Local Stream Relay
+One NVR connection per camera stream, shared by every local player
+
+Players opening the same camera (fullscreen and in the grid, or several
+clients on this box) used to pull their own copy of the stream from the NVR.
+The relay, run by the background service on the loopback interface, opens one
+upstream connection per camera and quality and copies it to every player
+reading it. The upstream is closed shortly after its last player leaves.
+
+With a pre-roll buffer, each upstream also keeps its latest GOP and a player
+joining it starts from that keyframe instead of waiting for the next one.
+Recently watched cameras, and pinned ones, stay connected so that switching
+to them is instant; the configured size is shared out between the open
+streams, so the buffers together stay within it.
+
+Copyright (C) 2025 AI-IT Inc
+Licensed under GPL-3.0
+"""
+
+import os
+import re
+import json
+import time
+import queue
+import socket
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+from resources.lib.preroll import PrerollBuffer
+
+# Written by the running relay so that plugin invocations can find it
+RELAY_FILE = 'relay.json'
+
+RELAY_HOST = '127.0.0.1'
+
+# A relay that does not accept a connection within this long is gone (seconds)
+RELAY_CHECK_TIMEOUT = 0.5
+
+# Whole MPEG-TS packets, small enough to keep the added latency low
+CHUNK_SIZE = 188 * 64
+
+# Chunks held for a player that reads slower than the camera sends; the
+# oldest are dropped beyond this, so a stalled player stays live
+SUBSCRIBER_QUEUE_CHUNKS = 256
+
+# The upstream stays open this long after its last player left (seconds),
+# so switching between fullscreen and the grid does not reconnect
+UPSTREAM_LINGER = 5
+
+# With pre-roll buffers, recently watched cameras stay connected this long
+# (seconds) so that switching back to them starts at once
+RECENT_LINGER = 60
+
+# Idle and pinned upstreams are checked this often (seconds)
+MAINTAIN_INTERVAL = 1
+
+# A pinned stream that failed is reopened after this long (seconds)
+PINNED_RETRY = 10
+
+UPSTREAM_CONNECT_TIMEOUT = 10
+UPSTREAM_READ_TIMEOUT = 30
+
+STATUS_TIMEOUT = 1
+
+_STREAM_PATH = re.compile(r'^/cameras/([^/]+)/stream$')
+
+
+def stream_key(camera_id, query):
+    """Relay key of a camera stream and its (sorted) query parameters"""
+    return f"{camera_id}?{urlencode(query)}"
+
+
+def relay_address(profile_dir, base_url=None):
+    """Base URL of the running relay (for this NVR, when given), or None
+
+    The relay file of a service that crashed is left behind, so the relay
+    must still accept connections; a stale file is removed.
+    """
+    try:
+        with open(os.path.join(profile_dir, RELAY_FILE), 'r', encoding='utf-8') as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(info, dict) or not info.get('port'):
+        return None
+    if base_url is not None and info.get('base_url') != base_url:
+        return None
+    try:
+        socket.create_connection((RELAY_HOST, info['port']), timeout=RELAY_CHECK_TIMEOUT).close()
+    except (OSError, TypeError, ValueError):
+        remove_relay_file(profile_dir)
+        return None
+    return f"http://{RELAY_HOST}:{info['port']}"
+
+
+def remove_relay_file(profile_dir):
+    try:
+        os.remove(os.path.join(profile_dir, RELAY_FILE))
+    except OSError:
+        pass
+
+
+def relay_status(profile_dir):
+    """Subscriber counts and traffic per stream, or None without a relay"""
+    address = relay_address(profile_dir)
+    if address is None:
+        return None
+    try:
+        with urllib.request.urlopen(f"{address}/status", timeout=STATUS_TIMEOUT) as response:
+            return json.loads(response.read().decode('utf-8'))
+    except (OSError, ValueError):
+        return None
+
+
+class Subscriber:
+    """One player's queue of chunks; None marks the end of the stream"""
+
+    def __init__(self, preroll=()):
+        self.chunks = queue.Queue(SUBSCRIBER_QUEUE_CHUNKS + len(preroll))
+        self.dropped_bytes = 0
+        for chunk in preroll:
+            self.chunks.put_nowait(chunk)
+
+    def put(self, chunk):
+        while True:
+            try:
+                self.chunks.put_nowait(chunk)
+                return
+            except queue.Full:
+                try:
+                    dropped = self.chunks.get_nowait()
+                    self.dropped_bytes += len(dropped or b'')
+                except queue.Empty:
+                    pass
+
+
+class UpstreamStream(threading.Thread):
+    """One NVR stream connection copied to every subscribed player"""
+
+    def __init__(self, relay, key, camera_id, query):
+        super().__init__(name=f"Relay-{camera_id}", daemon=True)
+        self.relay = relay
+        self.key = key
+        self.camera_id = camera_id
+        self.query = query
+        self.subscribers = []
+        self.content_type = 'video/mp2t'
+        self.ready = threading.Event()
+        self.failed = False
+        self.upstream_bytes = 0
+        self.delivered_bytes = 0
+        # Sized by the relay as streams open and close
+        self.preroll = PrerollBuffer(relay.buffer_bytes) if relay.buffer_bytes else None
+        self.idle_since = time.monotonic()
+        self._response = None
+        self._closed = False
+
+    def subscribe(self):
+        """Add a player, starting at the buffered keyframe; call with the relay lock held"""
+        subscriber = Subscriber(self.preroll.preroll() if self.preroll is not None else ())
+        self.subscribers.append(subscriber)
+        self.idle_since = None
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.relay.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+            if not self.subscribers:
+                self.idle_since = time.monotonic()
+
+    def close(self):
+        """Abort the upstream from another thread"""
+        self._closed = True
+        response = self._response
+        if response is not None:
+            response.close()
+
+    def run(self):
+        api = self.relay.api
+        url = f"{api.base_url}/cameras/{self.camera_id}/stream"
+        try:
+            response = api.session.get(url, params=self.query, stream=True,
+                                       timeout=(UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_READ_TIMEOUT))
+            self._response = response
+            response.raise_for_status()
+            self.content_type = response.headers.get('Content-Type', self.content_type)
+            self.ready.set()
+            for chunk in response.iter_content(CHUNK_SIZE):
+                if self._closed:
+                    break
+                # A player joining now gets the pre-roll up to this chunk and
+                # the live stream from the next one
+                with self.relay.lock:
+                    if self.preroll is not None:
+                        self.preroll.add(chunk)
+                    subscribers = list(self.subscribers)
+                for subscriber in subscribers:
+                    subscriber.put(chunk)
+                self.upstream_bytes += len(chunk)
+                self.delivered_bytes += len(chunk) * len(subscribers)
+        except Exception as e:
+            if not self._closed:
+                self.relay.log(f"Relay upstream for camera {self.camera_id} failed: {str(e)}")
+        finally:
+            self.failed = not self.ready.is_set()
+            self.ready.set()
+            if self._response is not None:
+                self._response.close()
+            self.relay.finished(self)
+
+
+class RelayHandler(BaseHTTPRequestHandler):
+    """Serves /cameras/<id>/stream from the shared upstream, and /status"""
+
+    server_version = 'AIITRelay/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _stream_request(self):
+        """(camera id, upstream query) of a stream request, or None"""
+        url = urlsplit(self.path)
+        match = _STREAM_PATH.match(url.path)
+        if match is None:
+            return None
+        return match.group(1), sorted(parse_qsl(url.query))
+
+    def do_HEAD(self):
+        # Players probe the content type before opening the stream
+        if self._stream_request() is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp2t')
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path == '/status':
+            body = json.dumps(self.server.status()).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        request = self._stream_request()
+        if request is None:
+            self.send_error(404)
+            return
+        upstream, subscriber = self.server.subscribe(*request)
+        try:
+            upstream.ready.wait(UPSTREAM_CONNECT_TIMEOUT + 1)
+            if upstream.failed or not upstream.ready.is_set():
+                self.send_error(502)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', upstream.content_type)
+            self.send_header('Cache-Control', 'no-store')
+            self.end_headers()
+            while True:
+                try:
+                    chunk = subscriber.chunks.get(timeout=UPSTREAM_READ_TIMEOUT)
+                except queue.Empty:
+                    break
+                if chunk is None:
+                    break
+                self.wfile.write(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            # The player stopped
+            pass
+        finally:
+            upstream.unsubscribe(subscriber)
+
+
+class StreamRelay(ThreadingHTTPServer):
+    """Loopback HTTP server sharing camera streams between local players"""
+
+    daemon_threads = True
+
+    def __init__(self, api, log=None, buffer_bytes=0, pinned=()):
+        super().__init__((RELAY_HOST, 0), RelayHandler)
+        self.api = api
+        self.port = self.server_address[1]
+        self.lock = threading.Lock()
+        self.upstreams = {}
+        # Traffic of finished upstreams, per camera and quality
+        self.totals = {}
+        # Pre-roll memory shared by all streams; 0 disables the buffers
+        self.buffer_bytes = buffer_bytes
+        self.linger = RECENT_LINGER if buffer_bytes else UPSTREAM_LINGER
+        # Streams kept open and buffered while nobody watches: (camera id, query)
+        self.pinned = {stream_key(camera_id, sorted(query)): (camera_id, sorted(query))
+                       for camera_id, query in pinned}
+        self._pinned_opened = {}
+        self._stopping = threading.Event()
+        self._log = log
+
+    def log(self, message):
+        if self._log:
+            self._log(message)
+
+    def subscribe(self, camera_id, query):
+        """Join the upstream for a camera and query, opening it if needed"""
+        with self.lock:
+            upstream = self._open(camera_id, query)
+            return upstream, upstream.subscribe()
+
+    def _open(self, camera_id, query):
+        """The upstream for a camera and query, started if needed; call with the lock held"""
+        key = stream_key(camera_id, query)
+        upstream = self.upstreams.get(key)
+        if upstream is None:
+            upstream = self.upstreams[key] = UpstreamStream(self, key, camera_id, query)
+            self._share_buffers()
+            upstream.start()
+        return upstream
+
+    def _share_buffers(self):
+        """Split the pre-roll budget evenly between open upstreams; call with the lock held"""
+        if not self.buffer_bytes:
+            return
+        share = self.buffer_bytes // max(1, len(self.upstreams))
+        for upstream in self.upstreams.values():
+            upstream.preroll.resize(share)
+
+    def _maintain(self):
+        """Keep pinned streams open and close idle ones past their linger"""
+        while not self._stopping.wait(MAINTAIN_INTERVAL):
+            now = time.monotonic()
+            with self.lock:
+                for key, (camera_id, query) in self.pinned.items():
+                    if key not in self.upstreams and now - self._pinned_opened.get(key, -PINNED_RETRY) >= PINNED_RETRY:
+                        self._pinned_opened[key] = now
+                        self._open(camera_id, query)
+                expired = [upstream for key, upstream in self.upstreams.items()
+                           if upstream.idle_since is not None and key not in self.pinned
+                           and now - upstream.idle_since >= self.linger]
+            for upstream in expired:
+                upstream.close()
+
+    def finished(self, upstream):
+        """Called by an upstream as it stops; ends its players' streams"""
+        with self.lock:
+            if self.upstreams.get(upstream.key) is upstream:
+                del self.upstreams[upstream.key]
+                self._share_buffers()
+            totals = self.totals.setdefault(upstream.key, {'upstream_bytes': 0, 'delivered_bytes': 0})
+            totals['upstream_bytes'] += upstream.upstream_bytes
+            totals['delivered_bytes'] += upstream.delivered_bytes
+            subscribers = list(upstream.subscribers)
+        for subscriber in subscribers:
+            subscriber.put(None)
+
+    def status(self):
+        """Subscribers, traffic and pre-roll per stream; saved bytes are those the NVR did not have to send"""
+        with self.lock:
+            streams = {key: {'camera_id': key.partition('?')[0], 'query': key.partition('?')[2],
+                             'subscribers': 0, 'buffered_bytes': 0, 'pinned': key in self.pinned, **totals}
+                       for key, totals in self.totals.items()}
+            for key, upstream in self.upstreams.items():
+                stream = streams.setdefault(key, {'camera_id': upstream.camera_id, 'query': key.partition('?')[2],
+                                                  'upstream_bytes': 0, 'delivered_bytes': 0,
+                                                  'pinned': key in self.pinned})
+                stream['subscribers'] = len(upstream.subscribers)
+                stream['buffered_bytes'] = upstream.preroll.size if upstream.preroll is not None else 0
+                stream['upstream_bytes'] += upstream.upstream_bytes
+                stream['delivered_bytes'] += upstream.delivered_bytes
+        for stream in streams.values():
+            stream['saved_bytes'] = max(0, stream['delivered_bytes'] - stream['upstream_bytes'])
+        return {'streams': list(streams.values()),
+                'saved_bytes': sum(stream['saved_bytes'] for stream in streams.values())}
+
+    def start(self):
+        """Serve on a thread and advertise the port to plugin invocations"""
+        threading.Thread(target=self.serve_forever, name='StreamRelay', daemon=True).start()
+        threading.Thread(target=self._maintain, name='StreamRelayMaintain', daemon=True).start()
+        self._write_info({'port': self.port, 'base_url': self.api.base_url})
+
+    def stop(self):
+        """Stop serving and close every upstream"""
+        remove_relay_file(self.api.profile)
+        self._stopping.set()
+        self.shutdown()
+        with self.lock:
+            upstreams = list(self.upstreams.values())
+        for upstream in upstreams:
+            upstream.close()
+        self.server_close()
+
+    def _write_info(self, info):
+        path = os.path.join(self.api.profile, RELAY_FILE)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.api.profile, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(info, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR Kodi Addon - Recording Segment Index
+Keyframe-aligned segment indexes and byte-range HLS manifests for recordings
+
+Kodi seeks inside a bare recording URL however the server lets it, which over
+a WAN often means re-reading the file from the start. With a segment index
+each keyframe interval is addressed by byte range, so a seek downloads only
+the segment it lands in. Indexes come from the NVR, or are derived for
+MPEG-TS recordings, and are kept in the profile because recordings never
+change once closed.
+
+Copyright (C) 2025 AI-IT Inc
+Licensed under GPL-3.0
+"""
+
+import os
+import math
+import time
+import hashlib
+
+SEGMENTS_DIR = 'segments'
+
+# Indexes are dropped with the recording history they belong to (seconds)
+INDEX_MAX_AGE = 31 * 24 * 3600
+
+# Keyframe intervals are merged into segments of about this length (seconds);
+# shorter segments make seeks cheaper, longer ones make linear playback cheaper
+TARGET_SEGMENT_SECONDS = 6
+
+# Derived segments start on packet boundaries; a TS demuxer resyncs there and
+# decoding starts at the next keyframe
+TS_PACKET_SIZE = 188
+
+MANIFEST_MIME_TYPE = 'application/vnd.apple.mpegurl'
+
+
+def merge_segments(segments, target=TARGET_SEGMENT_SECONDS):
+    """Join consecutive keyframe intervals into segments of about `target` seconds"""
+    merged = []
+    for segment in segments:
+        last = merged[-1] if merged else None
+        if last and last['duration'] < target and last['offset'] + last['length'] == segment['offset']:
+            last['duration'] += segment['duration']
+            last['length'] += segment['length']
+        else:
+            merged.append(dict(segment))
+    return merged
+
+
+def keyframes_to_segments(keyframes, file_size):
+    """Segments between consecutive keyframes ({time, offset} in file order)"""
+    segments = []
+    for current, following in zip(keyframes, keyframes[1:] + [None]):
+        end_offset = following['offset'] if following else file_size
+        end_time = following['time'] if following else None
+        length = end_offset - current['offset']
+        if length <= 0:
+            continue
+        duration = end_time - current['time'] if end_time is not None else None
+        segments.append({'start': current['time'], 'duration': duration,
+                         'offset': current['offset'], 'length': length})
+    # The last keyframe interval runs to the end of the recording
+    if segments and segments[-1]['duration'] is None:
+        previous = segments[-2]['duration'] if len(segments) > 1 else TARGET_SEGMENT_SECONDS
+        segments[-1]['duration'] = previous
+    return segments
+
+
+def derive_ts_segments(duration, file_size, target=TARGET_SEGMENT_SECONDS):
+    """Evenly sized segments of a constant-bitrate MPEG-TS recording"""
+    if not duration or not file_size or duration <= 0:
+        return []
+    count = max(1, int(math.ceil(duration / target)))
+    packets = file_size // TS_PACKET_SIZE
+    segments = []
+    for index in range(count):
+        start_packet = packets * index // count
+        end_packet = packets * (index + 1) // count if index < count - 1 else None
+        offset = start_packet * TS_PACKET_SIZE
+        end_offset = end_packet * TS_PACKET_SIZE if end_packet is not None else file_size
+        segments.append({'start': duration * index / count, 'duration': duration / count,
+                         'offset': offset, 'length': end_offset - offset})
+    return segments
+
+
+def build_manifest(playback_url, index):
+    """HLS VOD playlist addressing every segment of one file by byte range"""
+    segments = index['segments']
+    init = index.get('init')
+    target_duration = max(int(math.ceil(segment['duration'])) for segment in segments)
+    lines = [
+        '#EXTM3U',
+        # EXT-X-MAP with a byte range needs version 6, EXT-X-BYTERANGE version 4
+        f"#EXT-X-VERSION:{6 if init else 4}",
+        f"#EXT-X-TARGETDURATION:{target_duration}",
+        '#EXT-X-PLAYLIST-TYPE:VOD',
+        '#EXT-X-MEDIA-SEQUENCE:0',
+    ]
+    if index.get('independent', True):
+        # Only keyframe-aligned segments decode without the ones before them
+        lines.append('#EXT-X-INDEPENDENT-SEGMENTS')
+    if init:
+        lines.append(f"#EXT-X-MAP:URI=\"{playback_url}\",BYTERANGE=\"{init['length']}@{init['offset']}\"")
+    for segment in segments:
+        lines.append(f"#EXTINF:{segment['duration']:.3f},")
+        lines.append(f"#EXT-X-BYTERANGE:{segment['length']}@{segment['offset']}")
+        lines.append(playback_url)
+    lines.append('#EXT-X-ENDLIST')
+    return '\n'.join(lines) + '\n'
+
+
+class SegmentIndex:
+    """Segment indexes and manifests of recordings, stored in the addon profile"""
+
+    def __init__(self, profile_dir):
+        self.directory = os.path.join(profile_dir, SEGMENTS_DIR)
+
+    def manifest(self, nvr_api, recording_id, playback_url, duration=0, file_size=0):
+        """Path of a byte-range manifest for the recording, or None if it cannot be indexed"""
+        if not playback_url:
+            return None
+        # Federated ids such as 'site-b:12' differ only in characters a file name cannot hold
+        name = hashlib.sha1(str(recording_id).encode('utf-8')).hexdigest()
+        manifest_path = os.path.join(self.directory, f"{name}.m3u8")
+        if os.path.exists(manifest_path):
+            return manifest_path
+
+        index = self._normalise(nvr_api.get_recording_index(recording_id), file_size)
+        if index is None and playback_url.split('?', 1)[0].lower().endswith('.ts'):
+            segments = derive_ts_segments(duration, file_size)
+            # Byte cuts land between keyframes and carry no PAT/PMT of their own
+            index = {'segments': segments, 'complete': True, 'independent': False} if segments else None
+        if index is None:
+            return None
+
+        if not index['complete']:
+            # A recording still being written grows; index it again next time
+            manifest_path = os.path.join(self.directory, f"{name}.partial.m3u8")
+        if not self._write(manifest_path, build_manifest(playback_url, index)):
+            return None
+        self.prune()
+        return manifest_path
+
+    def prune(self, max_age=INDEX_MAX_AGE):
+        """Remove manifests of recordings older than the history kept locally"""
+        cutoff = time.time() - max_age
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return 0
+        removed = 0
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+    @staticmethod
+    def _normalise(index, file_size):
+        """Segment index in one shape, from either segments or keyframes; None if unusable"""
+        if not isinstance(index, dict):
+            return None
+        segments = index.get('segments')
+        file_size = index.get('file_size') or file_size
+        try:
+            if not segments and index.get('keyframes') and file_size:
+                segments = keyframes_to_segments(index['keyframes'], int(file_size))
+            segments = [{'start': float(segment.get('start', 0)), 'duration': float(segment['duration']),
+                         'offset': int(segment['offset']), 'length': int(segment['length'])}
+                        for segment in segments or []]
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return None
+        if not segments:
+            return None
+        init = index.get('init')
+        try:
+            # fMP4 recordings carry their codec setup in an init section
+            init = {'offset': int(init['offset']), 'length': int(init['length'])} if init else None
+        except (KeyError, TypeError, ValueError):
+            return None
+        return {'segments': merge_segments(segments), 'init': init, 'complete': bool(index.get('complete', True))}
+
+    def _write(self, path, body):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+            return True
+        except OSError:
+            return False
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR Kodi Addon - Background Service
+Keeps the local motion event and recording indexes in step with the NVR, and
+runs the stream relay
+
+The service holds one long-lived connection to the NVR: a server-sent event
+stream where the NVR offers one, otherwise a long-poll (or a plain poll on the
+auto refresh interval for NVRs that answer at once). After any disconnect it
+catches up from the newest indexed event, so nothing is missed.
+
+The recording history is downloaded here too, so that no plugin invocation
+has to wait for it.
+
+Copyright (C) 2025 AI-IT Inc
+Licensed under GPL-3.0
+"""
+
+import time
+import threading
+from datetime import datetime, timedelta
+
+import xbmc
+import xbmcaddon
+
+from resources.lib.motion_index import MotionIndex
+from resources.lib.recording_index import RecordingIndex, SYNC_INTERVAL
+from resources.lib.nvrapi import NVRApi, StreamNotSupported, MOTION_SYNC_BATCH
+from resources.lib.relay import StreamRelay, remove_relay_file
+
+# Reconnect backoff after errors (seconds)
+RETRY_MIN = 2
+RETRY_MAX = 120
+
+# Expired events are pruned this often (seconds)
+PRUNE_INTERVAL = 3600
+
+# Timeout for catch-up requests; long-polls add their own wait
+REQUEST_TIMEOUT = 30
+
+# Settings each part of the service starts with; changing one of them restarts
+# only the parts that use it, so live relayed streams survive unrelated changes
+CONNECTION_SETTINGS = ('nvr_host', 'nvr_port', 'nvr_username', 'nvr_password', 'use_https',
+                       'connection_timeout', 'max_retries')
+WORKER_SETTINGS = {
+    'motion_events': CONNECTION_SETTINGS + ('enable_event_index', 'event_history_days', 'auto_refresh'),
+    'recording_index': CONNECTION_SETTINGS + ('enable_recording_index', 'nvr_sites', 'auto_refresh'),
+}
+RELAY_SETTINGS = CONNECTION_SETTINGS + ('stream_relay', 'buffer_size', 'pinned_cameras', 'stream_quality')
+
+
+class MotionEventSync(threading.Thread):
+    """Worker thread that follows the NVR's motion events into the index"""
+
+    def __init__(self, addon, monitor):
+        super().__init__(name='MotionEventSync', daemon=True)
+        self.addon = addon
+        self.addon_id = addon.getAddonInfo('id')
+        self.monitor = monitor
+        self.history_days = int(addon.getSetting('event_history_days') or 30)
+        self.poll_interval = int(addon.getSetting('auto_refresh') or 30)
+        self.streaming = True
+        self.api = None
+        self._stop_event = threading.Event()
+        self._last_prune = 0
+
+    def _log(self, message, level=xbmc.LOGINFO):
+        xbmc.log(f"[{self.addon_id}] {message}", level)
+
+    def stop(self):
+        """Ask the worker to finish, interrupting a running event stream"""
+        self._stop_event.set()
+        if self.api is not None:
+            self.api.close_streams()
+
+    def stopped(self):
+        return self._stop_event.is_set() or self.monitor.abortRequested()
+
+    def _wait(self, seconds):
+        """Sleep unless stopped; returns True when the worker should finish"""
+        return self._stop_event.wait(seconds) or self.monitor.abortRequested()
+
+    def run(self):
+        self.api = NVRApi(self.addon)
+        index = MotionIndex(self.api.profile)
+        backoff = RETRY_MIN
+        try:
+            while not self.stopped():
+                try:
+                    self._catch_up(index)
+                    if self.streaming:
+                        try:
+                            self._follow(index)
+                        except StreamNotSupported:
+                            self._log("NVR has no motion event stream, falling back to polling")
+                            self.streaming = False
+                            continue
+                    else:
+                        self._poll(index)
+                    backoff = RETRY_MIN
+                except Exception as e:
+                    if self.stopped():
+                        break
+                    self._log(f"Motion event sync failed, retrying in {backoff}s: {str(e)}", xbmc.LOGWARNING)
+                    if self._wait(backoff):
+                        break
+                    backoff = min(backoff * 2, RETRY_MAX)
+                    continue
+                # The stream ended cleanly; reconnect after a short pause
+                if self._wait(RETRY_MIN):
+                    break
+        finally:
+            index.close()
+
+    def _history_start(self):
+        return (datetime.now() - timedelta(days=self.history_days)).isoformat(timespec='seconds')
+
+    def _catch_up(self, index):
+        """Fetch everything newer than the watermark in batches"""
+        since = index.latest_timestamp() or self._history_start()
+        while not self.stopped():
+            events = self.api.get_motion_events_since(since, MOTION_SYNC_BATCH, timeout=REQUEST_TIMEOUT)
+            index.add_events(events)
+            self._synced(index)
+            latest = index.latest_timestamp()
+            if len(events) < MOTION_SYNC_BATCH or latest == since:
+                break
+            since = latest
+
+    def _follow(self, index):
+        """Append events from the server-sent stream until it ends"""
+        for event in self.api.stream_motion_events(index.latest_timestamp()):
+            if self.stopped():
+                break
+            if event is not None:
+                index.add_events([event])
+            self._synced(index)
+
+    def _poll(self, index):
+        """Long-poll for new events; falls back to waiting out the refresh interval"""
+        while not self.stopped():
+            started = time.time()
+            events = self.api.get_motion_events_since(index.latest_timestamp(), wait=self.poll_interval,
+                                                      timeout=self.poll_interval + REQUEST_TIMEOUT)
+            index.add_events(events)
+            self._synced(index)
+            remaining = self.poll_interval - (time.time() - started)
+            if not events and remaining > 0 and self._wait(remaining):
+                break
+
+    def _synced(self, index):
+        """Mark the index current and prune expired events when due"""
+        index.mark_synced()
+        if time.time() - self._last_prune >= PRUNE_INTERVAL:
+            removed = index.prune(self._history_start())
+            self._last_prune = time.time()
+            # The service runs for days; hand its request metrics over regularly
+            self.api.metrics.save()
+            if removed:
+                self._log(f"Pruned {removed} motion events older than {self.history_days} days", xbmc.LOGDEBUG)
+
+
+class RecordingIndexSync(threading.Thread):
+    """Worker thread that backfills the recording index and keeps it current"""
+
+    def __init__(self, addon, monitor):
+        super().__init__(name='RecordingIndexSync', daemon=True)
+        self.addon = addon
+        self.addon_id = addon.getAddonInfo('id')
+        self.monitor = monitor
+        self.interval = max(SYNC_INTERVAL, int(addon.getSetting('auto_refresh') or 30))
+        self._stop_event = threading.Event()
+
+    def _log(self, message, level=xbmc.LOGINFO):
+        xbmc.log(f"[{self.addon_id}] {message}", level)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def stopped(self):
+        return self._stop_event.is_set() or self.monitor.abortRequested()
+
+    def _wait(self, seconds):
+        return self._stop_event.wait(seconds) or self.monitor.abortRequested()
+
+    def run(self):
+        api = NVRApi(self.addon)
+        index = RecordingIndex(api.profile)
+        backoff = RETRY_MIN
+        try:
+            while not self.stopped():
+                try:
+                    index.sync(api, force=True)
+                    stored = index.backfill(api, should_stop=self.stopped)
+                    if stored:
+                        self._log(f"Indexed {stored} older recordings", xbmc.LOGDEBUG)
+                    backoff = RETRY_MIN
+                except Exception as e:
+                    if self.stopped():
+                        break
+                    self._log(f"Recording index sync failed, retrying in {backoff}s: {str(e)}", xbmc.LOGWARNING)
+                    if self._wait(backoff):
+                        break
+                    backoff = min(backoff * 2, RETRY_MAX)
+                    continue
+                if self._wait(self.interval):
+                    break
+        finally:
+            index.close()
+
+
+class NVRService(xbmc.Monitor):
+    """Kodi service entry point; restarts the sync workers and relay whose settings changed"""
+
+    def __init__(self):
+        super().__init__()
+        self.workers = {}
+        self.relay = None
+        # Settings each part was last started with
+        self._applied = {}
+
+    def run(self):
+        addon = xbmcaddon.Addon()
+        for name in WORKER_SETTINGS:
+            self._start_worker(addon, name)
+        self._start_relay(addon)
+        self.waitForAbort()
+        self._stop_relay()
+        self._stop_workers(list(self.workers))
+
+    def onSettingsChanged(self):
+        addon = xbmcaddon.Addon()
+        changed = [name for name, ids in WORKER_SETTINGS.items() if self._changed(addon, name, ids)]
+        self._stop_workers(changed)
+        for name in changed:
+            self._start_worker(addon, name)
+        if self._changed(addon, 'relay', RELAY_SETTINGS):
+            self._stop_relay()
+            self._start_relay(addon)
+
+    def _changed(self, addon, part, ids):
+        return tuple(addon.getSetting(setting_id) for setting_id in ids) != self._applied.get(part)
+
+    def _applying(self, addon, part, ids):
+        self._applied[part] = tuple(addon.getSetting(setting_id) for setting_id in ids)
+
+    def _start_worker(self, addon, name):
+        self._applying(addon, name, WORKER_SETTINGS[name])
+        worker = None
+        if name == 'motion_events' and addon.getSettingBool('enable_event_index'):
+            worker = MotionEventSync(addon, self)
+        # The recording index only holds the main site; federated views query the sites
+        elif (name == 'recording_index' and addon.getSettingBool('enable_recording_index')
+              and not addon.getSetting('nvr_sites').strip()):
+            worker = RecordingIndexSync(addon, self)
+        if worker is not None:
+            self.workers[name] = worker
+            worker.start()
+
+    def _stop_workers(self, names):
+        workers = [self.workers.pop(name) for name in names if name in self.workers]
+        for worker in workers:
+            worker.stop()
+        for worker in workers:
+            worker.join(RETRY_MIN)
+
+    def _start_relay(self, addon):
+        self._applying(addon, 'relay', RELAY_SETTINGS)
+        api = NVRApi(addon)
+        # Left behind if Kodi crashed; players must not be sent to a dead port
+        remove_relay_file(api.profile)
+        if not addon.getSettingBool('stream_relay'):
+            return
+        addon_id = addon.getAddonInfo('id')
+        # Pinned cameras are buffered at the quality live views ask for
+        quality = [('quality', api.resolve_resolution(addon.getSetting('stream_quality') or 'medium'))]
+        pinned = [(camera_id.strip(), quality) for camera_id in addon.getSetting('pinned_cameras').split(',')
+                  if camera_id.strip()]
+        try:
+            self.relay = StreamRelay(api, log=lambda message: xbmc.log(f"[{addon_id}] {message}", xbmc.LOGWARNING),
+                                     buffer_bytes=(addon.getSettingInt('buffer_size') or 20) * 1024 * 1024,
+                                     pinned=pinned)
+        except OSError as e:
+            xbmc.log(f"[{addon_id}] Stream relay could not start: {str(e)}", xbmc.LOGWARNING)
+            return
+        self.relay.start()
+
+    def _stop_relay(self):
+        if self.relay is not None:
+            self.relay.stop()
+            self.relay = None
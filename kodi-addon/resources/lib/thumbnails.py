@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR Kodi Addon - Thumbnail Cache
+Local copies of camera and recording thumbnails
+
+Thumbnails are fetched concurrently with the API session (so authenticated
+thumbnails work) into a size-capped store under the addon profile, and Kodi
+is handed local paths. Cached images are used immediately and revalidated
+with conditional GETs in the background once they expire.
+
+Copyright (C) 2025 AI-IT Inc
+Licensed under GPL-3.0
+"""
+
+import time
+import threading
+from urllib.parse import urlparse
+
+from resources.lib.cache import ResponseCache
+from resources.lib.fanout import fan_out
+
+# Live camera stills change constantly; recording thumbnails never do
+CAMERA_THUMBNAIL_TTL = 60
+RECORDING_THUMBNAIL_TTL = 7 * 24 * 3600
+
+# An expired thumbnail is still shown (and refreshed) for up to this long
+THUMBNAIL_STALE_WINDOW = 30 * 24 * 3600
+
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+PREFETCH_TIMEOUT = 1.5
+PREFETCH_WORKERS = 8
+
+
+class ThumbnailCache:
+    """Prefetches thumbnails from the NVR and maps their URLs to local files"""
+
+    def __init__(self, directory, session, base_url, max_bytes=DEFAULT_MAX_BYTES, request_timeout=None,
+                 bandwidth=None):
+        self.cache = ResponseCache(directory, max_bytes=max_bytes,
+                                   stale_window=THUMBNAIL_STALE_WINDOW, suffix='.jpg')
+        self.session = session
+        self.request_timeout = request_timeout
+        self.bandwidth = bandwidth
+        origin = urlparse(base_url)
+        self.origin = (origin.scheme, origin.netloc)
+
+    def local_paths(self, urls, ttl, timeout=PREFETCH_TIMEOUT):
+        """Map thumbnail URLs to local files, fetching missing ones concurrently
+
+        URLs that cannot be fetched before the deadline, and URLs that are not
+        served by the NVR (credentials are never sent elsewhere), map to
+        themselves so Kodi can still try to load them. Downloads still running
+        at the deadline complete in the background for the next visit.
+        """
+        paths = {}
+        missing = []
+        stale = []
+        for url in set(urls):
+            if not url or not self._is_nvr_url(url):
+                paths[url] = url
+                continue
+            entry = self.cache.get(url)
+            if entry is None or not entry.is_usable_stale(self.cache.stale_window):
+                missing.append(url)
+                continue
+            paths[url] = self.cache.body_path(entry)
+            if not entry.is_fresh():
+                stale.append(url)
+
+        if missing:
+            transfers = []
+            started = time.perf_counter()
+            outcome = fan_out(lambda url: self._fetch(url, ttl, transfers), missing,
+                              timeout=timeout, max_workers=PREFETCH_WORKERS)
+            for url in missing:
+                paths[url] = outcome.results.get(url) or url
+            self._record_transfers(list(transfers), time.perf_counter() - started)
+
+        if stale:
+            threading.Thread(target=self._revalidate, args=(stale, ttl)).start()
+        return paths
+
+    def _revalidate(self, urls, ttl):
+        fan_out(lambda url: self._fetch(url, ttl), urls, max_workers=PREFETCH_WORKERS)
+
+    def _record_transfers(self, transfers, seconds):
+        """Feed a concurrent batch of downloads into the bandwidth estimates
+
+        The batch as a whole is one sample: parallel downloads share the link,
+        so each on its own would underestimate it.
+        """
+        if self.bandwidth is None or not transfers:
+            return
+        rtt = min(elapsed for _, elapsed in transfers)
+        self.bandwidth.record(sum(size for size, _ in transfers), seconds - rtt, rtt)
+
+    def _fetch(self, url, ttl, transfers=None):
+        """Download or revalidate one thumbnail; returns its local path or None"""
+        entry = self.cache.get(url)
+        headers = entry.validators() if entry is not None else {}
+        response = self.session.get(url, headers=headers, timeout=self.request_timeout)
+        try:
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if response.status_code == 304 and entry is not None:
+                self.cache.refresh(url, ttl, etag, last_modified)
+                return self.cache.body_path(entry)
+            if response.status_code == 200 and response.content:
+                if transfers is not None:
+                    transfers.append((len(response.content), response.elapsed.total_seconds()))
+                entry = self.cache.put(url, response.content, ttl, etag, last_modified)
+                return self.cache.body_path(entry)
+            return None
+        finally:
+            response.close()
+
+    def _is_nvr_url(self, url):
+        parsed = urlparse(url)
+        return (parsed.scheme, parsed.netloc) == self.origin
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR Kodi Addon - HTTP Transport Policy
+Deadlines, retries, hedged requests and TLS session reuse for the NVR session
+
+Copyright (C) 2025 AI-IT Inc
+Licensed under GPL-3.0
+"""
+
+import ssl
+import random
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Retry backoff: full jitter over an exponential base, capped (seconds)
+BACKOFF_FACTOR = 0.3
+BACKOFF_CAP = 4
+
+# Gateway errors an NVR behind a proxy returns while it restarts
+RETRY_STATUSES = (502, 503, 504)
+
+# A duplicate of a slow listing request is sent after this long (seconds)
+HEDGE_DELAY = 0.5
+
+
+class JitteredRetry(Retry):
+    """urllib3 retry policy with full-jitter backoff
+
+    Clients retrying after a shared hiccup (Wi-Fi roaming, an NVR restart)
+    would otherwise retry in lockstep.
+    """
+
+    def get_backoff_time(self):
+        backoff = min(super().get_backoff_time(), BACKOFF_CAP)
+        return random.uniform(0, backoff) if backoff > 0 else 0
+
+
+def retry_policy(max_retries):
+    """Retries for idempotent requests; POSTs (PTZ, snapshots) are never repeated"""
+    return JitteredRetry(
+        total=max_retries,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        raise_on_status=False,
+    )
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """TLS client context that offers each host's last session to its next connection
+
+    A resumed handshake skips the certificate exchange and key agreement.
+    Sessions live in memory only (Python cannot save them), so this helps the
+    extra connections of a fan-out and the long-running service rather than
+    the first request of a plugin invocation. Certificate checks are left to
+    urllib3 as with its own contexts.
+    """
+
+    def __new__(cls):
+        return super().__new__(cls, ssl.PROTOCOL_TLS_CLIENT)
+
+    def __init__(self):
+        super().__init__()
+        # urllib3 matches the hostname itself, and verify=False needs this off
+        self.check_hostname = False
+        self.minimum_version = ssl.TLSVersion.TLSv1_2
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._sockets = {}
+
+    def wrap_socket(self, sock, *args, server_hostname=None, session=None, **kwargs):
+        session = session or self._session_for(server_hostname)
+        ssl_sock = super().wrap_socket(sock, *args, server_hostname=server_hostname, session=session, **kwargs)
+        with self._lock:
+            # TLS 1.3 tickets arrive after the handshake, so the session is
+            # read from the socket again when the next connection opens
+            self._sockets[server_hostname] = weakref.ref(ssl_sock)
+            if ssl_sock.session is not None:
+                self._sessions[server_hostname] = ssl_sock.session
+        return ssl_sock
+
+    def _session_for(self, host):
+        with self._lock:
+            ref = self._sockets.get(host)
+            ssl_sock = ref() if ref else None
+            try:
+                session = ssl_sock.session if ssl_sock is not None else None
+            except (OSError, ValueError):
+                session = None
+            if session is not None and session.has_ticket:
+                self._sessions[host] = session
+            return self._sessions.get(host)
+
+
+class NVRAdapter(HTTPAdapter):
+    """Connection pool that applies default deadlines and the retry policy
+
+    requests has no session-wide timeout, so a request without one could block
+    the Kodi UI forever. Requests that pass their own timeout keep it.
+    """
+
+    def __init__(self, timeout, max_retries=0, **kwargs):
+        self.timeout = timeout
+        self.ssl_context = ResumingSSLContext()
+        super().__init__(max_retries=retry_policy(max_retries), **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs.setdefault('ssl_context', self.ssl_context)
+        super().init_poolmanager(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def hedged(func, delay=HEDGE_DELAY):
+    """Call func(); if it has not returned after `delay`, race a duplicate call
+
+    The first successful result wins. A response returned by the losing call
+    is closed when it arrives. If both calls fail the first error is raised.
+    """
+    executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        futures = [executor.submit(func)]
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            futures.append(executor.submit(func))
+
+        error = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winners = [future for future in done if future.exception() is None]
+            for future in done:
+                error = error or future.exception()
+            if winners:
+                for loser in winners[1:]:
+                    _close_result(loser)
+                for loser in pending:
+                    loser.add_done_callback(_close_result)
+                return winners[0].result()
+        raise error
+    finally:
+        executor.shutdown(wait=False)
+
+
+def _close_result(future):
+    if future.exception() is None and hasattr(future.result(), 'close'):
+        future.result().close()
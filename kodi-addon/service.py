@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR Kodi Addon - Service
+Background tasks that run while Kodi is up
+
+Copyright (C) 2025 AI-IT Inc
+Licensed under GPL-3.0
+"""
+
+from resources.lib.service import NVRService
+
+if __name__ == '__main__':
+    NVRService().run()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+AI-IT Inc NVR System - Camera Grid Mosaic Server
+Composites several camera substreams into one tiled stream with FFmpeg
+
+The Kodi addon's grid view asks for /api/grid/stream?cameras=1,2,3&quality=480p
+and plays the result as a single low-bitrate MPEG-TS stream, so the client
+decodes one stream instead of one per camera. Run this next to the NVR (it
+uses the FFmpeg installed by setup_ffmpeg.py) and point the addon's mosaic
+server setting at it, or proxy /api/grid/ to it from the NVR's web server.
+
+The server passes the NVR credentials on to the camera streams, so it only
+listens on localhost unless it is given an access token, which viewers send
+as a bearer token or a `token` query parameter (the addon's mosaic token
+setting). Secrets are read from the environment or a file, never from the
+command line, where any user can see them.
+
+Usage:
+    NVR_PASSWORD=... python3 scripts/mosaic_server.py --nvr-url http://localhost:8080/api --username admin
+    MOSAIC_TOKEN=... NVR_PASSWORD=... python3 scripts/mosaic_server.py --listen 0.0.0.0 --username admin
+"""
+
+import argparse
+import base64
+import hmac
+import ipaddress
+import math
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+# Grid limits: the addon shows at most a 3x3 grid
+MAX_TILES = 9
+
+# Tile size and video bitrate per tile, by substream resolution
+TILE_SIZES = {
+    '480p': (640, 360, 300),
+    '720p': (960, 540, 600),
+    '1080p': (1280, 720, 1000),
+}
+DEFAULT_QUALITY = '480p'
+
+OUTPUT_FPS = 15
+CHUNK_SIZE = 64 * 1024
+
+# Each viewer runs its own libx264 encoder
+MAX_VIEWERS = 4
+
+TOKEN_ENV = 'MOSAIC_TOKEN'
+PASSWORD_ENV = 'NVR_PASSWORD'
+
+
+def find_ffmpeg():
+    """FFmpeg installed by setup_ffmpeg.py, otherwise the one on PATH"""
+    project_root = Path(__file__).resolve().parent.parent
+    for name in ('ffmpeg', 'ffmpeg.exe'):
+        local = project_root / 'ffmpeg' / name
+        if local.exists():
+            return str(local)
+    return shutil.which('ffmpeg')
+
+
+def read_secret(env_name, path=None):
+    """A secret from a file if given, else from an environment variable, or None"""
+    if path:
+        return Path(path).read_text(encoding='utf-8').strip() or None
+    return os.environ.get(env_name) or None
+
+
+def is_loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def grid_shape(count):
+    """Columns and rows of the smallest near-square grid holding count tiles"""
+    columns = math.ceil(math.sqrt(count))
+    rows = math.ceil(count / columns)
+    return columns, rows
+
+
+def xstack_layout(count, tile_width, tile_height):
+    """xstack layout placing count tiles left to right, top to bottom"""
+    columns, _ = grid_shape(count)
+    positions = []
+    for index in range(count):
+        row, column = divmod(index, columns)
+        positions.append(f"{column * tile_width}_{row * tile_height}")
+    return '|'.join(positions)
+
+
+def build_ffmpeg_command(ffmpeg, input_urls, quality=DEFAULT_QUALITY, headers=None):
+    """FFmpeg arguments that tile the inputs and write MPEG-TS to stdout"""
+    tile_width, tile_height, tile_kbps = TILE_SIZES.get(quality, TILE_SIZES[DEFAULT_QUALITY])
+    count = len(input_urls)
+
+    command = [ffmpeg, '-hide_banner', '-loglevel', 'error', '-nostdin']
+    for url in input_urls:
+        # Keep latency low and do not wait for slow inputs to fill a buffer
+        command += ['-fflags', 'nobuffer', '-flags', 'low_delay',
+                    '-analyzeduration', '1000000', '-probesize', '500000']
+        if headers:
+            command += ['-headers', ''.join(f"{key}: {value}\r\n" for key, value in headers.items())]
+        command += ['-i', url]
+
+    # Scale each input into its tile (letterboxed), then stack the tiles
+    filters = []
+    for index in range(count):
+        filters.append(
+            f"[{index}:v]fps={OUTPUT_FPS},"
+            f"scale={tile_width}:{tile_height}:force_original_aspect_ratio=decrease,"
+            f"pad={tile_width}:{tile_height}:(ow-iw)/2:(oh-ih)/2,setsar=1[v{index}]")
+    if count == 1:
+        filters.append('[v0]null[out]')
+    else:
+        tiles = ''.join(f"[v{index}]" for index in range(count))
+        filters.append(f"{tiles}xstack=inputs={count}:layout={xstack_layout(count, tile_width, tile_height)}"
+                       f":fill=black[out]")
+
+    bitrate = tile_kbps * count
+    command += [
+        '-filter_complex', ';'.join(filters),
+        '-map', '[out]', '-an',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-tune', 'zerolatency',
+        '-b:v', f"{bitrate}k", '-maxrate', f"{bitrate}k", '-bufsize', f"{bitrate * 2}k",
+        '-g', str(OUTPUT_FPS * 2), '-pix_fmt', 'yuv420p',
+        '-f', 'mpegts', 'pipe:1',
+    ]
+    return command
+
+
+class MosaicHandler(BaseHTTPRequestHandler):
+    """Serves /api/grid/stream by piping one FFmpeg process per viewer"""
+
+    server_version = 'AIITMosaic/1.0'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _authorized(self):
+        """Whether the request carries the access token (always, without one)"""
+        token = self.server.token
+        if not token:
+            return True
+        header = self.headers.get('Authorization', '')
+        offered = header[len('Bearer '):] if header.startswith('Bearer ') else None
+        if offered is None:
+            offered = parse_qs(urlparse(self.path).query).get('token', [''])[0]
+        return hmac.compare_digest(offered.encode('utf-8'), token.encode('utf-8'))
+
+    def _refuse(self):
+        self.send_response(401)
+        self.send_header('WWW-Authenticate', 'Bearer realm="mosaic"')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _grid_request(self):
+        """(camera ids, quality) of a grid request, or None"""
+        url = urlparse(self.path)
+        if url.path.rstrip('/') != '/api/grid/stream':
+            return None
+        query = parse_qs(url.query)
+        camera_ids = [camera_id for camera_id in query.get('cameras', [''])[0].split(',') if camera_id.isdigit()]
+        quality = query.get('quality', [DEFAULT_QUALITY])[0]
+        if not camera_ids or len(camera_ids) > MAX_TILES or quality not in TILE_SIZES:
+            return None
+        return camera_ids, quality
+
+    def do_HEAD(self):
+        # The addon probes for mosaic support before falling back to a playlist
+        if not self._authorized():
+            self._refuse()
+            return
+        if self._grid_request() is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp2t')
+        self.end_headers()
+
+    def do_GET(self):
+        if not self._authorized():
+            self._refuse()
+            return
+        grid = self._grid_request()
+        if grid is None:
+            self.send_error(404)
+            return
+        camera_ids, quality = grid
+        if not self.server.viewers.acquire(blocking=False):
+            self.send_error(503, 'Too many grid viewers')
+            return
+        try:
+            self._send_grid(camera_ids, quality)
+        finally:
+            self.server.viewers.release()
+
+    def _send_grid(self, camera_ids, quality):
+        input_urls = [f"{self.server.nvr_url}/cameras/{camera_id}/stream?quality={quality}"
+                      for camera_id in camera_ids]
+        command = build_ffmpeg_command(self.server.ffmpeg, input_urls, quality, self.server.auth_headers)
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=sys.stderr)
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'video/mp2t')
+            self.send_header('Cache-Control', 'no-store')
+            self.end_headers()
+            while True:
+                chunk = process.stdout.read1(CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            # The viewer left the grid
+            pass
+        finally:
+            process.kill()
+            process.wait()
+
+
+class MosaicServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, nvr_url, ffmpeg, username=None, password=None, token=None,
+                 max_viewers=MAX_VIEWERS, verbose=False):
+        super().__init__(address, MosaicHandler)
+        self.nvr_url = nvr_url.rstrip('/')
+        self.ffmpeg = ffmpeg
+        self.token = token
+        self.viewers = threading.BoundedSemaphore(max_viewers)
+        self.verbose = verbose
+        self.auth_headers = None
+        if username:
+            token = base64.b64encode(f"{username}:{password or ''}".encode('utf-8')).decode('ascii')
+            self.auth_headers = {'Authorization': f"Basic {token}"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve tiled camera grid streams for the Kodi addon')
+    parser.add_argument('--nvr-url', default='http://localhost:8080/api', help='NVR API base URL')
+    parser.add_argument('--listen', default='127.0.0.1',
+                        help='Address to listen on; other than localhost needs an access token')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--username', help='NVR user for fetching camera streams')
+    parser.add_argument('--password-file', help=f"File holding the NVR password (default: ${PASSWORD_ENV})")
+    parser.add_argument('--token-file', help=f"File holding the viewers' access token (default: ${TOKEN_ENV})")
+    parser.add_argument('--max-viewers', type=int, default=MAX_VIEWERS, help='Grid streams encoded at once')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    password = read_secret(PASSWORD_ENV, args.password_file)
+    token = read_secret(TOKEN_ENV, args.token_file)
+    if not token and not is_loopback(args.listen):
+        print(f"❌ Listening on {args.listen} needs an access token: set {TOKEN_ENV} or use --token-file")
+        sys.exit(1)
+
+    ffmpeg = find_ffmpeg()
+    if not ffmpeg:
+        print("❌ FFmpeg not found. Run scripts/setup_ffmpeg.py first.")
+        sys.exit(1)
+
+    server = MosaicServer((args.listen, args.port), args.nvr_url, ffmpeg, args.username, password,
+                          token, args.max_viewers, args.verbose)
+    print(f"🎬 Mosaic server on http://{args.listen}:{args.port}/api/grid/stream (FFmpeg: {ffmpeg})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,17 +6,79 @@ Supports Windows, Linux, and Raspberry Pi platforms
 """
 
 import os
+import re
+import argparse
 import sys
+import json
+import time
+import hashlib
 import platform
+import threading
+import urllib.error
 import urllib.request
 import zipfile
 import tarfile
 import subprocess
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+# Parallel HTTP Range requests per download, and the smallest segment worth one
+DOWNLOAD_SEGMENTS = 4
+MIN_SEGMENT_SIZE = 4 * 1024 * 1024
+
+# A dropped segment is resumed from where it stopped this many times
+DOWNLOAD_RETRIES = 5
+DOWNLOAD_TIMEOUT = 30
+DOWNLOAD_BLOCK_SIZE = 256 * 1024
+
+# Segment progress is saved for resuming at most this often (seconds)
+STATE_SAVE_INTERVAL = 1
+
+# Digests published next to a download URL, strongest first: (suffix, algorithm).
+# gyan.dev publishes SHA-256, johnvansickle.com (Linux and Pi builds) only MD5
+PUBLISHED_DIGESTS = (('.sha256', 'sha256'), ('.md5', 'md5'))
+
+# download_file probes the server for ranges itself unless given the result
+UNPROBED = object()
+
+# Binaries taken from the archive; extraction stops once all are found
+FFMPEG_BINARIES = ('ffmpeg', 'ffprobe', 'ffplay')
+# Static Linux builds ship without ffplay; the addon needs the other two
+REQUIRED_BINARIES = ('ffmpeg', 'ffprobe')
+EXTRACT_BLOCK_SIZE = 1024 * 1024
+
+# Codec libraries installed with apt in a single transaction
+SYSTEM_DEPENDENCIES = [
+    'libx264-dev', 'libx265-dev', 'libvpx-dev', 'libfdk-aac-dev',
+    'libmp3lame-dev', 'libopus-dev', 'libvorbis-dev', 'libtheora-dev',
+    'libva-dev', 'libvdpau-dev'  # Hardware acceleration
+]
+
+# apt errors naming a package it cannot install at all
+APT_UNAVAILABLE_PATTERNS = [
+    re.compile(r"Unable to locate package (\S+)"),
+    re.compile(r"Package '?([^'\s]+)'? has no installation candidate"),
+]
+
+class HashingReader:
+    """File-like wrapper that feeds everything read through a digest"""
+    
+    def __init__(self, raw, digest):
+        self.raw = raw
+        self.digest = digest
+    
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        self.digest.update(data)
+        return data
+
 class FFmpegSetup:
-    def __init__(self):
+    def __init__(self, runner=subprocess.run, allow_unverified=False):
+        # Runs system commands; takes and returns what subprocess.run does
+        self.run = runner
+        # Install downloads that have no published digest to check them against
+        self.allow_unverified = allow_unverified
         self.system = platform.system().lower()
         self.architecture = platform.machine().lower()
         self.script_dir = Path(__file__).parent
@@ -115,16 +177,18 @@ class FFmpegSetup:
         download_path = download_dir / filename
         
         print(f"   📡 Downloading from: {url}")
-        print(f"   💾 Saving to: {download_path}")
         
         try:
-            # Download with progress
-            def progress_hook(block_num, block_size, total_size):
-                if total_size > 0:
-                    percent = min(100, (block_num * block_size * 100) // total_size)
-                    print(f"\r   📊 Progress: {percent}%", end='', flush=True)
+            size = self._probe_range_support(url)
+            if filename.endswith('.tar.xz') and size is None:
+                # Without ranges there is nothing to resume, so the archive
+                # is decompressed straight from the download instead
+                self.stream_extract_ffmpeg(url)
+                print(f"\n   ✅ Download and extraction completed")
+                return None
             
-            urllib.request.urlretrieve(url, download_path, progress_hook)
+            print(f"   💾 Saving to: {download_path}")
+            self.download_file(url, download_path, range_size=size)
             print(f"\n   ✅ Download completed: {download_path}")
             return download_path
             
@@ -132,6 +196,187 @@ class FFmpegSetup:
             print(f"\n   ❌ Download failed: {e}")
             raise
 
+    def download_file(self, url, download_path, expected_digest=None, segments=DOWNLOAD_SEGMENTS,
+                      range_size=UNPROBED):
+        """Download url to download_path and verify its digest
+        
+        Servers that accept Range requests are downloaded in parallel
+        segments into <file>.part, with the progress of each segment kept in
+        <file>.part.json, so an interrupted download resumes where it
+        stopped. Other servers get a single stream from the start.
+        range_size is what _probe_range_support found, when already probed.
+        expected_digest is (algorithm, hex digest); without it the digest
+        published next to url is used.
+        """
+        download_path = Path(download_path)
+        part_path = download_path.with_name(download_path.name + '.part')
+        state_path = download_path.with_name(download_path.name + '.part.json')
+        
+        expected_digest = self._expected_digest(url, expected_digest)
+        
+        size = self._probe_range_support(url) if range_size is UNPROBED else range_size
+        if size is None:
+            print("   ℹ️  Server does not support ranges, downloading in a single stream")
+            self._download_single(url, part_path)
+        else:
+            self._download_segmented(url, part_path, state_path, size, segments)
+        
+        if expected_digest:
+            algorithm, expected = expected_digest
+            print(f"\n   🔐 Verifying {algorithm.upper()}...")
+            digest = self._file_digest(part_path, algorithm)
+            if digest != expected.lower():
+                part_path.unlink()
+                if state_path.exists():
+                    state_path.unlink()
+                raise Exception(f"{algorithm.upper()} mismatch: expected {expected}, got {digest}")
+            print(f"   ✅ {algorithm.upper()} verified")
+        
+        os.replace(part_path, download_path)
+        if state_path.exists():
+            state_path.unlink()
+        return download_path
+
+    def fetch_published_digest(self, url):
+        """(algorithm, hex digest) published next to url (sha256sum/md5sum format), or None"""
+        for suffix, algorithm in PUBLISHED_DIGESTS:
+            try:
+                with urllib.request.urlopen(url + suffix, timeout=DOWNLOAD_TIMEOUT) as response:
+                    text = response.read(4096).decode('utf-8', 'replace')
+            except (urllib.error.URLError, OSError):
+                continue
+            length = hashlib.new(algorithm).digest_size * 2
+            match = re.search(rf'\b([0-9a-fA-F]{{{length}}})\b', text)
+            if match:
+                return algorithm, match.group(1).lower()
+        return None
+
+    def _expected_digest(self, url, expected_digest):
+        """The digest to check a download against; fails without one unless allowed"""
+        if expected_digest is None:
+            expected_digest = self.fetch_published_digest(url)
+        if expected_digest is None:
+            if not self.allow_unverified:
+                raise Exception(f"No published checksum for {url} (use --allow-unverified to install it anyway)")
+            print("   ⚠️  No published checksum, the download cannot be verified")
+        return expected_digest
+
+    def _probe_range_support(self, url):
+        """Total size when the server answers Range requests, otherwise None"""
+        request = urllib.request.Request(url, headers={'Range': 'bytes=0-0'})
+        try:
+            with urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT) as response:
+                content_range = response.headers.get('Content-Range', '')
+                if response.status != 206 or '/' not in content_range:
+                    return None
+                total = content_range.rsplit('/', 1)[1]
+                return int(total) if total.isdigit() else None
+        except urllib.error.HTTPError as e:
+            # 416 and friends: the server does not do ranges for this file
+            if e.code >= 500:
+                raise
+            return None
+
+    def _download_single(self, url, part_path):
+        """Plain download from the start, for servers without ranges"""
+        with urllib.request.urlopen(url, timeout=DOWNLOAD_TIMEOUT) as response, open(part_path, 'wb') as f:
+            total = int(response.headers.get('Content-Length') or 0)
+            done = 0
+            while True:
+                block = response.read(DOWNLOAD_BLOCK_SIZE)
+                if not block:
+                    break
+                f.write(block)
+                done += len(block)
+                self._show_progress(done, total)
+
+    def _download_segmented(self, url, part_path, state_path, size, segments):
+        """Parallel Range requests into a preallocated part file, resumable"""
+        state = self._load_download_state(state_path, url, size) if part_path.exists() else None
+        if state is None:
+            count = max(1, min(segments, size // MIN_SEGMENT_SIZE))
+            bounds = [size * i // count for i in range(count + 1)]
+            # Each segment is [start, end) with `done` bytes already written
+            state = {'url': url, 'size': size,
+                     'segments': [{'start': bounds[i], 'end': bounds[i + 1], 'done': 0} for i in range(count)]}
+            with open(part_path, 'wb') as f:
+                f.truncate(size)
+        else:
+            resumed = sum(segment['done'] for segment in state['segments'])
+            print(f"   ♻️  Resuming at {resumed * 100 // max(size, 1)}%")
+        
+        lock = threading.Lock()
+        progress = {'done': sum(segment['done'] for segment in state['segments']), 'saved': 0}
+        
+        def save_state(force=False):
+            if not force and time.monotonic() - progress['saved'] < STATE_SAVE_INTERVAL:
+                return
+            tmp_path = state_path.with_name(state_path.name + '.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, state_path)
+            progress['saved'] = time.monotonic()
+        
+        def fetch(segment):
+            attempt = 0
+            while segment['start'] + segment['done'] < segment['end']:
+                offset = segment['start'] + segment['done']
+                request = urllib.request.Request(url, headers={'Range': f"bytes={offset}-{segment['end'] - 1}"})
+                try:
+                    with urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT) as response, \
+                            open(part_path, 'r+b') as f:
+                        if response.status != 206:
+                            raise Exception(f"Server ignored the range request (HTTP {response.status})")
+                        f.seek(offset)
+                        while segment['start'] + segment['done'] < segment['end']:
+                            remaining = segment['end'] - segment['start'] - segment['done']
+                            block = response.read(min(DOWNLOAD_BLOCK_SIZE, remaining))
+                            if not block:
+                                raise Exception("Connection closed early")
+                            f.write(block)
+                            f.flush()
+                            with lock:
+                                segment['done'] += len(block)
+                                progress['done'] += len(block)
+                                save_state()
+                                self._show_progress(progress['done'], size)
+                except Exception as e:
+                    with lock:
+                        save_state(force=True)
+                    attempt += 1
+                    if attempt > DOWNLOAD_RETRIES:
+                        raise
+                    print(f"\n   ⚠️  Segment at {offset} interrupted ({e}), resuming...")
+                    time.sleep(min(2 ** attempt, 30))
+        
+        with lock:
+            save_state(force=True)
+        with ThreadPoolExecutor(max_workers=len(state['segments'])) as executor:
+            # list() re-raises the first segment that gave up
+            list(executor.map(fetch, state['segments']))
+
+    def _load_download_state(self, state_path, url, size):
+        """Saved segment progress of an earlier attempt at the same file, or None"""
+        try:
+            with open(state_path, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get('url') != url or state.get('size') != size or not state.get('segments'):
+            return None
+        return state
+
+    def _file_digest(self, path, algorithm):
+        digest = hashlib.new(algorithm)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _show_progress(self, done, total):
+        if total > 0:
+            print(f"\r   📊 Progress: {min(100, done * 100 // total)}%", end='', flush=True)
+
     def extract_ffmpeg(self, archive_path):
         """Extract FFmpeg from downloaded archive"""
         print("📦 Extracting FFmpeg...")
@@ -152,19 +397,9 @@ class FFmpegSetup:
                             print(f"   ✅ Extracted: {file_info.filename}")
             
             elif archive_path.suffix in ['.tar', '.xz'] or '.tar.' in archive_path.name:
-                # Linux TAR file
-                with tarfile.open(archive_path, 'r:*') as tar_ref:
-                    # Find FFmpeg binaries in the archive
-                    for member in tar_ref.getmembers():
-                        if member.name.endswith(('ffmpeg', 'ffprobe', 'ffplay')) and member.isfile():
-                            # Extract to ffmpeg directory
-                            member.name = os.path.basename(member.name)
-                            tar_ref.extract(member, self.ffmpeg_dir)
-                            
-                            # Make executable on Linux
-                            extracted_path = self.ffmpeg_dir / member.name
-                            extracted_path.chmod(0o755)
-                            print(f"   ✅ Extracted: {member.name}")
+                # Linux TAR file, read front to back once
+                with open(archive_path, 'rb') as f:
+                    self._install_binaries(self._extract_tar_stream(f))
             
             print("   🎉 Extraction completed!")
             
@@ -172,6 +407,72 @@ class FFmpegSetup:
             print(f"   ❌ Extraction failed: {e}")
             raise
 
+    def stream_extract_ffmpeg(self, url, expected_digest=None):
+        """Decompress the FFmpeg binaries straight from the download stream
+        
+        The archive never touches the disk. The digest covers the whole
+        archive, so the rest of it is still read (without decompressing)
+        once the binaries are out, and they are only installed if it matches.
+        """
+        print("📦 Extracting FFmpeg while downloading...")
+        self.ffmpeg_dir.mkdir(exist_ok=True)
+        expected_digest = self._expected_digest(url, expected_digest)
+        algorithm, expected = expected_digest or ('sha256', None)
+        
+        digest = hashlib.new(algorithm)
+        staged = {}
+        try:
+            with urllib.request.urlopen(url, timeout=DOWNLOAD_TIMEOUT) as response:
+                reader = HashingReader(response, digest)
+                staged = self._extract_tar_stream(reader)
+                while reader.read(EXTRACT_BLOCK_SIZE):
+                    pass
+            
+            if expected and digest.hexdigest() != expected.lower():
+                raise Exception(f"{algorithm.upper()} mismatch: expected {expected}, got {digest.hexdigest()}")
+            if expected:
+                print(f"   ✅ {algorithm.upper()} verified")
+            self._install_binaries(staged)
+            staged = {}
+        finally:
+            for staged_path in staged.values():
+                if staged_path.exists():
+                    staged_path.unlink()
+
+    def _extract_tar_stream(self, fileobj):
+        """Write the FFmpeg binaries of a tar stream as <name>.new in one forward pass
+        
+        Stream mode ('r|*') decompresses each member once, in order, instead
+        of building the member list first and seeking back for each binary.
+        Returns {name: staged path}; fails if a required binary is missing.
+        """
+        staged = {}
+        with tarfile.open(fileobj=fileobj, mode='r|*') as tar_ref:
+            for member in tar_ref:
+                name = os.path.basename(member.name)
+                if name not in FFMPEG_BINARIES or name in staged or not member.isfile():
+                    continue
+                staged_path = self.ffmpeg_dir / f"{name}.new"
+                with tar_ref.extractfile(member) as source, open(staged_path, 'wb') as target:
+                    shutil.copyfileobj(source, target, EXTRACT_BLOCK_SIZE)
+                staged[name] = staged_path
+                print(f"   ✅ Extracted: {name}")
+                if len(staged) == len(FFMPEG_BINARIES):
+                    break
+        
+        missing = [name for name in REQUIRED_BINARIES if name not in staged]
+        if missing:
+            for staged_path in staged.values():
+                staged_path.unlink()
+            raise Exception(f"Archive does not contain {', '.join(missing)}")
+        return staged
+
+    def _install_binaries(self, staged):
+        """Move staged binaries into place and make them executable"""
+        for name, staged_path in staged.items():
+            staged_path.chmod(0o755)
+            os.replace(staged_path, self.ffmpeg_dir / name)
+
     def install_system_dependencies(self):
         """Install system dependencies for video processing"""
         print("📦 Installing system dependencies...")
@@ -179,32 +480,75 @@ class FFmpegSetup:
         if self.system == 'linux':
             # Check if we're on a Debian/Ubuntu system
             try:
-                subprocess.run(['apt', '--version'], check=True, capture_output=True)
-                
-                print("   🔧 Installing codec libraries...")
-                dependencies = [
-                    'libx264-dev', 'libx265-dev', 'libvpx-dev', 'libfdk-aac-dev',
-                    'libmp3lame-dev', 'libopus-dev', 'libvorbis-dev', 'libtheora-dev',
-                    'libva-dev', 'libvdpau-dev'  # Hardware acceleration
-                ]
-                
-                for dep in dependencies:
-                    try:
-                        result = subprocess.run(['sudo', 'apt', 'install', '-y', dep], 
-                                              capture_output=True, text=True)
-                        if result.returncode == 0:
-                            print(f"   ✅ Installed: {dep}")
-                        else:
-                            print(f"   ⚠️  Failed to install: {dep}")
-                    except:
-                        print(f"   ⚠️  Could not install: {dep}")
-                        
-            except subprocess.CalledProcessError:
+                self.run(['apt', '--version'], check=True, capture_output=True)
+            except (OSError, subprocess.CalledProcessError):
                 print("   ℹ️  Not a Debian/Ubuntu system, skipping apt packages")
+                return
+            
+            print("   🔧 Installing codec libraries...")
+            missing = self.missing_packages(SYSTEM_DEPENDENCIES)
+            installed = [dep for dep in SYSTEM_DEPENDENCIES if dep not in missing]
+            if installed:
+                print(f"   ✅ Already installed: {', '.join(installed)}")
+            if not missing:
+                return
+            
+            unavailable = self.apt_install(missing)
+            still_missing = self.missing_packages(missing)
+            for dep in missing:
+                if dep in unavailable:
+                    print(f"   ⚠️  Not available: {dep}")
+                elif dep in still_missing:
+                    print(f"   ⚠️  Failed to install: {dep}")
+                else:
+                    print(f"   ✅ Installed: {dep}")
                 
         elif self.system == 'windows':
             print("   ℹ️  Windows: Using static FFmpeg build (no additional dependencies needed)")
 
+    def missing_packages(self, packages):
+        """Packages of the list that dpkg does not report as installed"""
+        try:
+            result = self.run(['dpkg-query', '-W', '-f=${Package} ${Status}\n', *packages],
+                              capture_output=True, text=True)
+        except OSError:
+            return list(packages)
+        
+        # dpkg-query fails for unknown packages but still lists the others
+        installed = set()
+        for line in result.stdout.splitlines():
+            name, _, status = line.partition(' ')
+            if status.endswith('install ok installed'):
+                installed.add(name.split(':')[0])
+        return [package for package in packages if package not in installed]
+
+    def apt_install(self, packages):
+        """Install packages in one apt transaction; returns those apt cannot install
+        
+        A single unknown package makes apt refuse the whole transaction, so
+        when that happens it is run once more without the packages it named.
+        """
+        unavailable = []
+        while packages:
+            try:
+                result = self.run(['sudo', 'apt-get', 'install', '-y', *packages],
+                                  capture_output=True, text=True)
+            except OSError as e:
+                print(f"   ⚠️  Could not run apt: {e}")
+                break
+            if result.returncode == 0:
+                break
+            
+            named = set()
+            for pattern in APT_UNAVAILABLE_PATTERNS:
+                named.update(pattern.findall(result.stderr or ''))
+            rejected = [package for package in packages if package in named]
+            if not rejected:
+                break
+            unavailable.extend(rejected)
+            packages = [package for package in packages if package not in named]
+        return unavailable
+
     def configure_gpu_acceleration(self):
         """Configure GPU acceleration if available"""
         print("🚀 Configuring GPU acceleration...")
@@ -343,8 +687,9 @@ class FFmpegSetup:
             # Download FFmpeg
             archive_path = self.download_ffmpeg()
             
-            # Extract FFmpeg
-            self.extract_ffmpeg(archive_path)
+            # Extract FFmpeg (already done while downloading when there is no archive)
+            if archive_path is not None:
+                self.extract_ffmpeg(archive_path)
             
             # Configure GPU acceleration
             self.configure_gpu_acceleration()
@@ -359,7 +704,7 @@ class FFmpegSetup:
                 print("   🚀 Ready for AI-IT Inc NVR video processing!")
                 
                 # Cleanup
-                if archive_path.exists():
+                if archive_path is not None and archive_path.exists():
                     archive_path.unlink()
                     print(f"   🧹 Cleaned up download: {archive_path}")
                 
@@ -374,7 +719,12 @@ class FFmpegSetup:
 
 def main():
     """Main entry point"""
-    setup = FFmpegSetup()
+    parser = argparse.ArgumentParser(description='Download and set up FFmpeg for the AI-IT Inc NVR')
+    parser.add_argument('--allow-unverified', action='store_true',
+                        help='Install FFmpeg even if no published checksum is found for the download')
+    args = parser.parse_args()
+    
+    setup = FFmpegSetup(allow_unverified=args.allow_unverified)
     success = setup.setup()
     
     if success:
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR - Kodi addon tests
+
+The addon's library modules are imported as Kodi imports them, with the
+benchmark stubs standing in for the xbmc* modules.
+"""
+
+import os
+import sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.join(TESTS_DIR, '..', '..')
+
+sys.path.insert(0, os.path.abspath(os.path.join(ROOT_DIR, 'benchmarks', 'kodi_addon', 'stubs')))
+sys.path.insert(0, os.path.abspath(os.path.join(ROOT_DIR, 'benchmarks', 'kodi_addon')))
+sys.path.insert(0, os.path.abspath(os.path.join(ROOT_DIR, 'kodi-addon')))
+
+
+@pytest.fixture
+def make_api(tmp_path, monkeypatch):
+    """Build an NVRApi for a server on localhost, with its profile in tmp_path"""
+    import xbmcaddon
+    import xbmcvfs
+    from resources.lib.nvrapi import NVRApi
+
+    monkeypatch.setattr(xbmcvfs, '_PROFILE_DIR', str(tmp_path))
+    defaults = dict(xbmcaddon.Addon()._settings)
+    apis = []
+
+    def make(port, **settings):
+        values = {key: str(value).lower() if isinstance(value, bool) else str(value)
+                  for key, value in settings.items()}
+        monkeypatch.setattr(xbmcaddon.Addon, '_settings',
+                            {**defaults, 'nvr_host': '127.0.0.1', 'nvr_port': str(port), **values})
+        api = NVRApi(xbmcaddon.Addon())
+        apis.append(api)
+        return api
+
+    yield make
+    for api in apis:
+        api.session.close()
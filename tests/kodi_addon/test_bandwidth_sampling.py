@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+"""Bandwidth samples taken from listing downloads"""
+
+import gzip
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+
+import pytest
+
+RECORDINGS = [{'id': n, 'camera_id': n % 8 + 1, 'start_time': f"2025-01-01T{n // 3600:02d}:{n // 60 % 60:02d}:{n % 60:02d}",
+               'thumbnail_url': f"http://nvr/api/recordings/{n}/thumbnail"} for n in range(5000)]
+
+
+class ListingHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/api/recordings':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if self.server.gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(self.server.body)))
+        self.end_headers()
+        self.wfile.write(self.server.body)
+
+    def do_POST(self):
+        # No token endpoint: Basic auth
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.send_response(404)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ListingHandler)
+    server.gzip = True
+    server.body = gzip.compress(json.dumps(RECORDINGS).encode('utf-8'))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def samples(monkeypatch):
+    from resources.lib.bandwidth import BandwidthEstimator
+    recorded = []
+    monkeypatch.setattr(BandwidthEstimator, 'record',
+                        lambda self, size, seconds, rtt=None: recorded.append((size, seconds, rtt)))
+    return recorded
+
+
+@pytest.mark.parametrize('cache', [True, False], ids=['cached', 'uncached'])
+def test_whole_listing_counts_the_bytes_on_the_wire(server, make_api, samples, cache):
+    api = make_api(server.server_address[1], enable_response_cache=cache)
+    assert len(api.get_recordings()) == len(RECORDINGS)
+    assert [size for size, _, _ in samples] == [len(server.body)]
+
+
+def test_abandoned_page_counts_what_was_read(server, make_api, samples):
+    server.gzip = False
+    server.body = json.dumps(RECORDINGS).encode('utf-8')
+    api = make_api(server.server_address[1], enable_response_cache=False)
+    recordings, cursor = api.get_recordings_page()
+    assert len(recordings) == 100 and cursor
+    size, seconds, rtt = samples[0]
+    assert 0 < size < len(server.body)
+    assert seconds >= 0 and rtt is not None
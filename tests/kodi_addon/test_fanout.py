@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+"""Concurrent per-camera calls with deadlines, and merging their sorted results"""
+
+import time
+
+from resources.lib.fanout import fan_out, merge_sorted
+
+
+def camera_call(delays, failures=()):
+    """A call per camera taking its delay in seconds; cameras in `failures` raise"""
+    def call(camera_id):
+        time.sleep(delays[camera_id])
+        if camera_id in failures:
+            raise ConnectionError(f"camera {camera_id} unreachable")
+        return [f"recording of {camera_id}"]
+    return call
+
+
+def test_calls_run_concurrently():
+    started = time.monotonic()
+    outcome = fan_out(camera_call({1: 0.3, 2: 0.3, 3: 0.3, 4: 0.3}), [1, 2, 3, 4], timeout=5)
+    assert time.monotonic() - started < 0.9
+    assert outcome.complete
+    assert outcome.results == {key: [f"recording of {key}"] for key in (1, 2, 3, 4)}
+
+
+def test_slow_cameras_are_reported_at_the_deadline():
+    started = time.monotonic()
+    outcome = fan_out(camera_call({1: 0, 2: 3, 3: 0, 4: 3}), [1, 2, 3, 4], timeout=0.3)
+    assert time.monotonic() - started < 1
+    assert sorted(outcome.results) == [1, 3]
+    assert sorted(outcome.timed_out) == [2, 4]
+    assert not outcome.complete
+
+
+def test_failures_are_kept_apart_from_results():
+    outcome = fan_out(camera_call({1: 0, 2: 0}, failures={2}), [1, 2], timeout=5)
+    assert list(outcome.results) == [1]
+    assert isinstance(outcome.failed[2], ConnectionError)
+    assert outcome.timed_out == []
+
+
+def test_each_camera_can_have_its_own_deadline():
+    deadlines = {'gate': 0.2, 'lobby': 1.5}
+    started = time.monotonic()
+    outcome = fan_out(camera_call({'gate': 0.5, 'lobby': 0.5}), list(deadlines),
+                      timeout=lambda key: deadlines[key])
+    assert time.monotonic() - started < 1.2
+    assert list(outcome.results) == ['lobby']
+    assert outcome.timed_out == ['gate']
+
+
+def test_calls_queued_behind_the_worker_limit_count_against_the_deadline():
+    outcome = fan_out(camera_call({key: 0.4 for key in range(4)}), range(4), timeout=0.6, max_workers=2)
+    assert sorted(outcome.results) == [0, 1]
+    assert sorted(outcome.timed_out) == [2, 3]
+
+
+def test_no_cameras():
+    outcome = fan_out(camera_call({}), [], timeout=1)
+    assert outcome.results == {} and outcome.complete
+
+
+def test_merge_is_newest_first_across_cameras():
+    door = [{'id': 'd1', 'start_time': '2025-01-01T08:00'}, {'id': 'd2', 'start_time': '2025-01-01T10:00'}]
+    yard = [{'id': 'y1', 'start_time': '2025-01-01T09:00'}, {'id': 'y2', 'start_time': '2025-01-01T11:00'},
+            {'id': 'y3', 'start_time': '2025-01-01T07:00'}]
+    merged = merge_sorted([door, yard, []], key=lambda item: item['start_time'], reverse=True)
+    assert [item['id'] for item in merged] == ['y2', 'd2', 'y1', 'd1', 'y3']
+
+
+def test_merge_is_lazy():
+    merged = merge_sorted([[3, 1], [2]], key=lambda item: item)
+    assert next(merged) == 1
+    assert list(merged) == [2, 3]
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+"""Per-camera recording queries across NVR sites"""
+
+import time
+
+from resources.lib.fanout import FanOutResult
+from resources.lib.federation import FederatedNVR, parse_sites
+from resources.lib.nvrapi import NVRSite
+
+
+class SlowCameraSite:
+    """A site where one camera answers and the other never does before the deadline"""
+
+    def __init__(self, key, timeout):
+        self.site = NVRSite(key, key or 'Main', 'localhost', 8080, 'admin', '', False, timeout)
+        self.base_url = f"http://{key or 'main'}.example:8080/api"
+        self.timeout = timeout
+
+    def get_recordings_per_camera(self, camera_ids, start_date, end_date, limit, timeout, fields):
+        # The site's own fan-out waits out its deadline, then returns what it has
+        time.sleep(timeout)
+        outcome = FanOutResult()
+        outcome.results[camera_ids[0]] = [{'id': 1, 'camera_id': camera_ids[0], 'camera_name': 'Door'}]
+        outcome.timed_out.extend(camera_ids[1:])
+        return outcome
+
+
+def test_partial_results_of_a_site_with_a_short_timeout_are_kept():
+    federation = FederatedNVR([SlowCameraSite('', 10), SlowCameraSite('lake', 0.3)])
+    outcome = federation.get_recordings_per_camera(['lake:1', 'lake:2'], timeout=5)
+
+    assert list(outcome.results) == ['lake:1']
+    assert outcome.results['lake:1'][0]['id'] == 'lake:1'
+    assert outcome.timed_out == ['lake:2']
+    assert federation.unavailable == []
+
+
+def test_repeated_site_names_get_distinct_keys():
+    main = NVRSite('', 'Main', 'localhost', 8080, 'admin', '', False, 10)
+    sites = parse_sites('x-3=h1, x=h2, x=h3, x=h4', main)
+    assert [site.key for site in sites] == ['x-3', 'x', 'x-2', 'x-4']
+    assert [site.host for site in sites] == ['h1', 'h2', 'h3', 'h4']
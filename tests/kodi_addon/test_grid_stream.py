@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+"""The grid view's mosaic server probe"""
+
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class ProbeHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.server.probes.append((self.path, self.headers.get('Authorization')))
+        self.send_response(self.server.status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+def start_server(status):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ProbeHandler)
+    server.status = status
+    server.probes = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_separate_mosaic_server_gets_its_token_not_the_nvr_credentials(make_api):
+    mosaic = start_server(200)
+    try:
+        api = make_api(9, mosaic_server=f"http://127.0.0.1:{mosaic.server_address[1]}",
+                       mosaic_token='s3cret', nvr_password='nvr-password')
+        url = api.get_grid_stream_url([1, 2])
+        assert url.endswith('&token=s3cret')
+        assert mosaic.probes == [(mosaic.probes[0][0], None)]
+        assert 'token=s3cret' in mosaic.probes[0][0]
+    finally:
+        mosaic.shutdown()
+        mosaic.server_close()
+
+
+def test_failed_probe_is_not_retried(make_api):
+    mosaic = start_server(503)
+    try:
+        api = make_api(9, mosaic_server=f"http://127.0.0.1:{mosaic.server_address[1]}", max_retries=3)
+        assert api.get_grid_stream_url([1, 2]) is None
+        assert len(mosaic.probes) == 1
+    finally:
+        mosaic.shutdown()
+        mosaic.server_close()
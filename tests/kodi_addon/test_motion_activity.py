@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+"""Hourly motion activity rollups kept by the event index triggers"""
+
+import pytest
+
+from resources.lib.motion_index import MotionIndex, ACTIVITY_ROLLUP, DWELL_COLUMNS
+
+
+def event(camera_id, timestamp, confidence, duration, name='Door'):
+    return {'id': f"{camera_id}-{timestamp}", 'camera_id': camera_id, 'camera_name': name,
+            'timestamp': timestamp, 'confidence': confidence, 'duration': duration}
+
+
+EVENTS = [
+    event(1, '2025-03-01T10:05:00', 0.6, 4),
+    event(1, '2025-03-01T10:20:00', 0.9, 45),
+    event(1, '2025-03-01T10:59:59', 0.3, None),
+    event(1, '2025-03-01T11:00:00', 0.5, 400),
+    event(2, '2025-03-01T10:30:00', 0.8, 12, name='Yard'),
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = MotionIndex(str(tmp_path))
+    yield index
+    index.close()
+
+
+def activity(index):
+    rows = index.db.execute("SELECT * FROM activity ORDER BY camera_id, hour").fetchall()
+    return [tuple(row) for row in rows]
+
+
+def recomputed(index):
+    """The rollup the triggers should have kept, computed from the events"""
+    return sorted(tuple(row) for row in index.db.execute(ACTIVITY_ROLLUP).fetchall())
+
+
+def test_inserted_events_are_rolled_up_per_camera_and_hour(index):
+    index.add_events(EVENTS)
+    hours = {(row['camera_id'], row['hour']): dict(row) for row in index.db.execute('SELECT * FROM activity')}
+    door_10 = hours[('1', '2025-03-01T10')]
+    assert door_10['events'] == 3
+    assert door_10['max_confidence'] == 0.9
+    assert door_10['dwell'] == 49
+    # Bins: <10 s, 10-30 s, 30-60 s, 60-300 s, 300 s and over; no duration counts as 0 s
+    assert [door_10[column] for column in DWELL_COLUMNS] == [2, 0, 1, 0, 0]
+    assert [hours[('1', '2025-03-01T11')][column] for column in DWELL_COLUMNS] == [0, 0, 0, 0, 1]
+    assert [hours[('2', '2025-03-01T10')][column] for column in DWELL_COLUMNS] == [0, 1, 0, 0, 0]
+    assert activity(index) == recomputed(index)
+
+
+def test_events_sent_again_are_not_counted_twice(index):
+    index.add_events(EVENTS)
+    before = activity(index)
+    index.add_events(EVENTS)
+    index.add_events(EVENTS[:2])
+    assert activity(index) == before
+
+
+def test_updated_events_move_between_dwell_bins(index):
+    index.add_events(EVENTS)
+    # The NVR closed the events with their final durations and confidences
+    index.add_events([event(1, '2025-03-01T10:05:00', 0.6, 35),
+                      event(1, '2025-03-01T10:20:00', 0.4, 45),
+                      event(1, '2025-03-01T10:59:59', 0.3, 90, name='Front door')])
+    door_10 = dict(index.db.execute(
+        "SELECT * FROM activity WHERE camera_id = '1' AND hour = '2025-03-01T10'").fetchone())
+    assert door_10['events'] == 3
+    assert door_10['dwell'] == 170
+    assert [door_10[column] for column in DWELL_COLUMNS] == [0, 0, 2, 1, 0]
+    # The peak was lowered, so the hour's maximum is the next highest
+    assert door_10['max_confidence'] == 0.6
+    assert door_10['camera_name'] == 'Front door'
+    assert activity(index) == recomputed(index)
+
+
+def test_unknown_confidence_does_not_become_zero(index):
+    index.add_events([event(3, '2025-03-01T09:00:00', None, 5), event(3, '2025-03-01T09:10:00', None, 5)])
+    assert index.activity_by_camera('2025-03-01T00')[0]['max_confidence'] is None
+    index.add_events([event(3, '2025-03-01T09:20:00', 0.7, 5)])
+    assert activity(index) == recomputed(index)
+
+
+def test_events_stored_before_the_triggers_are_counted(tmp_path, index):
+    index.add_events(EVENTS[:3])
+    for trigger in ('activity_on_insert', 'activity_on_update'):
+        index.db.execute(f"DROP TRIGGER {trigger}")
+    index.add_events(EVENTS[3:])
+    index.db.commit()
+
+    reopened = MotionIndex(str(tmp_path))
+    try:
+        assert activity(reopened) == recomputed(reopened)
+        assert sum(row['events'] for row in reopened.activity_by_camera('2025-03-01T00')) == len(EVENTS)
+    finally:
+        reopened.close()
+
+
+def test_activity_by_hour_sums_cameras(index):
+    index.add_events(EVENTS)
+    rows = index.activity_by_hour('2025-03-01T00')
+    assert [(row['hour'], row['events'], row['max_confidence']) for row in rows] == \
+        [('2025-03-01T10', 4, 0.9), ('2025-03-01T11', 1, 0.5)]
+    assert rows[0]['dwell_histogram'] == [2, 1, 1, 0, 0]
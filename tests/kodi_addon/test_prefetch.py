@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+"""Prefetch budget and cancellation by the next invocation"""
+
+import os
+import threading
+import time
+
+from resources.lib.prefetch import Prefetcher, cancel_running, MARKER_FILE
+
+
+def test_tasks_run_in_order_and_the_marker_is_removed(tmp_path):
+    ran = []
+    prefetcher = Prefetcher(str(tmp_path))
+    prefetcher.add('cameras', ran.append, 'cameras')
+    prefetcher.add('recordings', ran.append, 'recordings')
+    assert prefetcher.run() == ['cameras', 'recordings']
+    assert ran == ['cameras', 'recordings']
+    assert not os.path.exists(tmp_path / MARKER_FILE)
+
+
+def test_budget_limits_how_long_the_invocation_runs(tmp_path):
+    ran = []
+
+    def fetch(name):
+        time.sleep(0.4)
+        ran.append(name)
+
+    prefetcher = Prefetcher(str(tmp_path), budget=1.0)
+    for name in ('a', 'b', 'c', 'd', 'e'):
+        prefetcher.add(name, fetch, name)
+    started = time.monotonic()
+    prefetcher.run()
+    assert time.monotonic() - started < 1.3
+    # The task running when the time ran out finishes; none start after it
+    time.sleep(0.5)
+    assert ran == ['a', 'b', 'c']
+
+
+def test_failed_task_does_not_stop_the_rest(tmp_path):
+    logged = []
+    prefetcher = Prefetcher(str(tmp_path))
+    prefetcher.add('broken', lambda: 1 / 0)
+    prefetcher.add('cameras', lambda: None)
+    assert prefetcher.run(log=logged.append) == ['cameras']
+    assert logged and 'broken' in logged[0]
+
+
+def test_next_invocation_stops_a_queued_prefetch_before_its_next_task(tmp_path):
+    started, release = threading.Event(), threading.Event()
+    ran = []
+
+    def first():
+        started.set()
+        release.wait(5)
+        ran.append('first')
+
+    prefetcher = Prefetcher(str(tmp_path))
+    prefetcher.add('first', first)
+    prefetcher.add('second', ran.append, 'second')
+    result = []
+    runner = threading.Thread(target=lambda: result.extend(prefetcher.run()))
+    runner.start()
+    assert started.wait(2)
+
+    # The next click cancels whatever is still running
+    cancel_running(str(tmp_path))
+    release.set()
+    runner.join(5)
+    assert ran == ['first'] and result == ['first']
+
+
+def test_a_newer_prefetch_takes_over_the_marker(tmp_path):
+    started, release = threading.Event(), threading.Event()
+    ran = []
+
+    def first():
+        started.set()
+        release.wait(5)
+
+    older = Prefetcher(str(tmp_path))
+    older.add('first', first)
+    older.add('second', ran.append, 'older')
+    runner = threading.Thread(target=older.run)
+    runner.start()
+    assert started.wait(2)
+
+    newer = Prefetcher(str(tmp_path))
+    newer.add('cameras', ran.append, 'newer')
+    assert newer.run() == ['cameras']
+    release.set()
+    runner.join(5)
+    assert ran == ['newer']
+
+
+def test_nothing_queued_leaves_no_marker(tmp_path):
+    assert Prefetcher(str(tmp_path)).run() == []
+    assert not os.path.exists(tmp_path / MARKER_FILE)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+"""Keyframe detection and GOP buffering of the live stream pre-roll"""
+
+from resources.lib.preroll import (
+    PrerollBuffer, is_keyframe, pmt_streams, STREAM_TYPE_H264, STREAM_TYPE_H265)
+
+VIDEO_PID = 0x100
+AUDIO_PID = 0x101
+PMT_PID = 0x1000
+
+
+def ts_packet(pid, payload, start=False, random_access=False):
+    header = bytes([0x47, (0x40 if start else 0) | pid >> 8, pid & 0xFF])
+    header += b'\x30\x01\x40' if random_access else b'\x10'
+    return (header + payload).ljust(188, b'\xff')
+
+
+def pes(stream_id, data):
+    return b'\x00\x00\x01' + bytes([stream_id]) + b'\x00\x00\x80\x80\x05\x21\x00\x01\x00\x01' + data
+
+
+PAT = ts_packet(0, b'\x00\x00\xb0\x0d\x00\x01\xc1\x00\x00\x00\x01'
+                + bytes([0xe0 | PMT_PID >> 8, PMT_PID & 0xFF]) + b'\x00\x00\x00\x00', start=True)
+
+
+def pmt(video_type):
+    return ts_packet(PMT_PID, b'\x00\x02\xb0\x17\x00\x01\xc1\x00\x00\xe1\x00\xf0\x00'
+                     + bytes([video_type]) + b'\xe1\x00\xf0\x00'
+                     + b'\x0f\xe1\x01\xf0\x00' + b'\x00\x00\x00\x00', start=True)
+
+
+# Access unit delimiter followed by a slice
+H264_IDR = ts_packet(VIDEO_PID, pes(0xE0, b'\x00\x00\x00\x01\x09\xf0\x00\x00\x00\x01\x65'), start=True)
+H264_P_SLICE = ts_packet(VIDEO_PID, pes(0xE0, b'\x00\x00\x00\x01\x09\xf0\x00\x00\x00\x01\x41'), start=True)
+H264_P_SLICE_LOW = ts_packet(VIDEO_PID, pes(0xE0, b'\x00\x00\x00\x01\x21'), start=True)
+H265_IDR = ts_packet(VIDEO_PID, pes(0xE0, b'\x00\x00\x00\x01\x46\x01\x10\x00\x00\x00\x01\x26\x01'), start=True)
+H265_TRAIL = ts_packet(VIDEO_PID, pes(0xE0, b'\x00\x00\x00\x01\x46\x01\x10\x00\x00\x00\x01\x02\x01'), start=True)
+VIDEO = ts_packet(VIDEO_PID, b'\x00' * 184)
+AUDIO = ts_packet(AUDIO_PID, pes(0xC0, b'\xff\xf1'), start=True, random_access=True)
+
+
+def test_h264_p_slices_are_not_keyframes():
+    assert is_keyframe(H264_IDR, STREAM_TYPE_H264)
+    assert not is_keyframe(H264_P_SLICE, STREAM_TYPE_H264)
+    assert not is_keyframe(H264_P_SLICE_LOW, STREAM_TYPE_H264)
+
+
+def test_h265_uses_its_own_nal_types():
+    assert is_keyframe(H265_IDR, STREAM_TYPE_H265)
+    assert not is_keyframe(H265_TRAIL, STREAM_TYPE_H265)
+    assert not is_keyframe(H264_IDR, STREAM_TYPE_H265)
+
+
+def test_pmt_streams_lists_video_and_audio():
+    assert pmt_streams(pmt(STREAM_TYPE_H264)) == {VIDEO_PID: STREAM_TYPE_H264, AUDIO_PID: 0x0F}
+
+
+def test_preroll_starts_at_video_keyframe_despite_audio_and_p_slices():
+    buffer = PrerollBuffer(1024 * 1024)
+    gop = H264_IDR + (VIDEO * 3 + AUDIO + H264_P_SLICE) * 4
+    buffer.add(PAT + pmt(STREAM_TYPE_H264) + VIDEO * 2 + gop)
+
+    chunks = buffer.preroll()
+    assert chunks[0] == PAT + pmt(STREAM_TYPE_H264)
+    assert b''.join(chunks[1:]) == gop
+
+    # Audio frames and P-slices in later chunks keep extending the same GOP
+    buffer.add(AUDIO + H264_P_SLICE + VIDEO)
+    assert b''.join(buffer.preroll()[1:]) == gop + AUDIO + H264_P_SLICE + VIDEO
+
+
+def test_nothing_is_kept_before_the_pmt():
+    buffer = PrerollBuffer(1024 * 1024)
+    buffer.add(AUDIO + H264_IDR + VIDEO)
+    assert buffer.preroll() == []
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+"""Incremental sync and resumable backfill of the recording index"""
+
+from datetime import datetime, timedelta
+
+from resources.lib.recording_index import RecordingIndex, HISTORY_DAYS
+
+
+class FakeNVR:
+    """Recordings newest first, as the NVR lists them"""
+
+    def __init__(self, recordings):
+        self.recordings = recordings
+        self.calls = []
+
+    def iter_recordings_since(self, since, until=None):
+        self.calls.append((since, until))
+        for recording in sorted(self.recordings, key=lambda r: r['start_time'], reverse=True):
+            if recording['start_time'] > since and (until is None or recording['start_time'] <= until):
+                yield dict(recording)
+
+
+def recording(id, age, duration=300):
+    start = (datetime.now() - age).replace(microsecond=0)
+    return {'id': id, 'camera_id': 1, 'camera_name': 'Camera 1', 'start_time': start.isoformat(),
+            'duration': duration, 'file_size': duration * 1000}
+
+
+def history(days=HISTORY_DAYS - 1, per_day=4):
+    return [recording(n, timedelta(hours=6 * n + 1)) for n in range(days * per_day)]
+
+
+def days_ago(days):
+    return (datetime.now() - timedelta(days=days)).replace(microsecond=0).isoformat()
+
+
+def test_first_sync_only_fetches_the_newest_day(tmp_path):
+    nvr = FakeNVR(history())
+    index = RecordingIndex(str(tmp_path))
+    assert not index.is_synced()
+
+    stored = index.sync(nvr)
+    assert stored == 4
+    assert nvr.calls == [(nvr.calls[0][0], None)]
+    assert index.is_synced()
+    assert index.covers(days_ago(0.5))
+    assert not index.covers(days_ago(7))
+    index.close()
+
+
+def test_interrupted_backfill_resumes_where_it_stopped(tmp_path):
+    nvr = FakeNVR(history())
+    index = RecordingIndex(str(tmp_path))
+    index.sync(nvr)
+
+    checks = []
+
+    def stop_after_three_windows():
+        checks.append(None)
+        return len(checks) > 3
+
+    index.backfill(nvr, should_stop=stop_after_three_windows)
+    assert len(nvr.calls) == 1 + 3
+    assert index.covers(days_ago(3.5)) and not index.covers(days_ago(5))
+    last_window_start = nvr.calls[-1][0]
+    index.close()
+
+    # A new invocation carries on from the last committed window
+    index = RecordingIndex(str(tmp_path))
+    del nvr.calls[:]
+    index.backfill(nvr)
+    assert nvr.calls[0][1] == last_window_start
+    assert all(since >= days_ago(HISTORY_DAYS + 1) for since, _ in nvr.calls)
+    assert len(nvr.calls) == HISTORY_DAYS - 4
+    assert len(index.page(limit=1000)) == len(nvr.recordings)
+    assert index.covers(days_ago(HISTORY_DAYS - 1))
+    index.close()
+
+
+def test_recordings_still_growing_are_fetched_again(tmp_path):
+    # Started two hours ago and still recording: its end is now
+    growing = recording('long', timedelta(hours=2), duration=2 * 3600)
+    nvr = FakeNVR([growing, recording('short', timedelta(hours=3))])
+    index = RecordingIndex(str(tmp_path))
+    index.sync(nvr)
+
+    # Newer recordings move the watermark far past the growing one
+    nvr.recordings.append(recording('new', timedelta(minutes=1)))
+    growing['duration'] += 600
+    growing['file_size'] += 600000
+    index.sync(nvr, force=True)
+
+    rows = {row['id']: row for row in index.page()}
+    assert rows['long']['duration'] == 2 * 3600 + 600
+    assert 'new' in rows
+    # The closed recording before it is not fetched again
+    since = nvr.calls[-1][0]
+    assert growing['start_time'] > since > rows['short']['start_time']
+    index.close()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+"""Paging recordings on servers that answer with a bare array"""
+
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+from resources.lib.nvrapi import OFFSET_CURSOR_PREFIX, SKIP_CURSOR_PREFIX
+
+TOTAL = 250
+
+
+class ArrayHandler(BaseHTTPRequestHandler):
+    """Recordings as a bare array, honouring limit and offset unless told not to"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/api/recordings':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.server.queries.append(query)
+        items = [{'id': n, 'start_time': f"2025-01-01T00:{n // 60:02d}:{n % 60:02d}"} for n in range(TOTAL)]
+        if self.server.honours_paging:
+            offset = int(query.get('offset', 0))
+            items = items[offset:offset + int(query['limit'])]
+        body = json.dumps(items).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_POST = do_GET
+
+
+def start_server(honours_paging):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ArrayHandler)
+    server.honours_paging = honours_paging
+    server.queries = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture(params=[True, False], ids=['honours-paging', 'ignores-paging'])
+def array_server(request):
+    server = start_server(request.param)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize('cache', [True, False], ids=['cached', 'uncached'])
+def test_pages_cover_every_recording_once(array_server, make_api, cache):
+    api = make_api(array_server.server_address[1], enable_response_cache=cache)
+    prefix = OFFSET_CURSOR_PREFIX if array_server.honours_paging else SKIP_CURSOR_PREFIX
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        recordings, cursor = api.get_recordings_page(cursor=cursor)
+        seen.extend(recording['id'] for recording in recordings)
+        pages += 1
+        if not cursor:
+            break
+        assert cursor.startswith(prefix)
+    assert seen == list(range(TOTAL))
+    assert pages == 3
+
+
+def test_server_applying_limit_is_asked_for_one_more(make_api):
+    server = start_server(True)
+    try:
+        api = make_api(server.server_address[1], enable_response_cache=False)
+        recordings, cursor = api.get_recordings_page()
+        assert len(recordings) == 100
+        assert cursor == f"{OFFSET_CURSOR_PREFIX}100"
+        assert server.queries[-1]['limit'] == '101'
+
+        # The server applies the offset, so nothing is skipped again here
+        recordings, cursor = api.get_recordings_page(cursor=cursor)
+        assert server.queries[-1]['offset'] == '100'
+        assert recordings[0]['id'] == 100
+    finally:
+        server.shutdown()
+        server.server_close()
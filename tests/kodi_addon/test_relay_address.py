@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+"""Finding the stream relay from plugin invocations"""
+
+import json
+import os
+import socket
+
+from resources.lib.relay import relay_address, RELAY_FILE
+
+
+def write_relay_file(profile_dir, port, base_url):
+    os.makedirs(profile_dir, exist_ok=True)
+    with open(os.path.join(profile_dir, RELAY_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'port': port, 'base_url': base_url}, f)
+
+
+def closed_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_running_relay_is_used(tmp_path):
+    with socket.socket() as listener:
+        listener.bind(('127.0.0.1', 0))
+        listener.listen()
+        port = listener.getsockname()[1]
+        write_relay_file(str(tmp_path), port, 'http://nvr/api')
+        assert relay_address(str(tmp_path), 'http://nvr/api') == f"http://127.0.0.1:{port}"
+
+
+def test_stale_relay_file_is_removed(tmp_path):
+    write_relay_file(str(tmp_path), closed_port(), 'http://nvr/api')
+    assert relay_address(str(tmp_path), 'http://nvr/api') is None
+    assert not os.path.exists(os.path.join(str(tmp_path), RELAY_FILE))
+
+
+def test_streams_go_to_the_nvr_without_a_live_relay(make_api):
+    api = make_api(8080, stream_relay=True)
+    write_relay_file(api.profile, closed_port(), api.base_url)
+    assert api.get_camera_stream_url(3).startswith(f"{api.base_url}/cameras/3/stream?")
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+"""Pre-roll memory of the stream relay across several open cameras"""
+
+import time
+import threading
+
+import pytest
+
+from mock_nvr import TS_GOP_START, TS_FILLER
+from resources.lib import relay as relay_module
+from resources.lib.relay import StreamRelay
+
+# One GOP of the fake camera streams, about 9 KB, and what the pre-roll keeps
+# of it (the program tables are held apart)
+GOP = TS_GOP_START + TS_FILLER * 6
+GOP_BUFFERED = len(GOP) - 2 * 188
+BUFFER_BYTES = 64 * 1024
+
+
+class LiveResponse:
+    """Endless camera stream of identical GOPs until closed"""
+
+    headers = {'Content-Type': 'video/mp2t'}
+
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        while not self.closed.is_set():
+            for start in range(0, len(GOP), chunk_size):
+                yield GOP[start:start + chunk_size]
+            time.sleep(0.005)
+
+    def close(self):
+        self.closed.set()
+
+
+class LiveSession:
+    def get(self, url, **kwargs):
+        return LiveResponse()
+
+
+class LiveAPI:
+    def __init__(self, profile):
+        self.base_url = 'http://nvr.example/api'
+        self.profile = profile
+        self.session = LiveSession()
+
+
+@pytest.fixture
+def relay(tmp_path, monkeypatch):
+    monkeypatch.setattr(relay_module, 'MAINTAIN_INTERVAL', 0.05)
+    pinned = [(str(camera_id), [('quality', 'high')]) for camera_id in range(1, 6)]
+    relay = StreamRelay(LiveAPI(str(tmp_path)), buffer_bytes=BUFFER_BYTES, pinned=pinned)
+    relay.start()
+    yield relay
+    relay.stop()
+
+
+def buffered(relay):
+    with relay.lock:
+        return [upstream.preroll.size for upstream in relay.upstreams.values()]
+
+
+def test_pinned_streams_share_the_buffer_budget(relay):
+    deadline = time.monotonic() + 5
+    sizes = []
+    while time.monotonic() < deadline and not (len(sizes) == 5 and all(sizes)):
+        sizes = buffered(relay)
+        assert sum(sizes) <= BUFFER_BYTES
+        time.sleep(0.01)
+    assert sizes == [GOP_BUFFERED] * 5
+
+    # Three more pinned cameras shrink the shares below a GOP; the buffers
+    # drop theirs rather than go over the budget
+    with relay.lock:
+        for camera_id in ('6', '7', '8'):
+            relay._open(camera_id, [])
+    deadline = time.monotonic() + 1
+    while time.monotonic() < deadline:
+        sizes = buffered(relay)
+        assert sum(sizes) <= BUFFER_BYTES
+        time.sleep(0.01)
+    assert len(sizes) == 8 and not any(sizes)
+
+
+def test_closing_a_stream_returns_its_share(relay):
+    while len(buffered(relay)) < 5:
+        time.sleep(0.01)
+    with relay.lock:
+        relay.pinned.clear()
+    upstream, subscriber = relay.subscribe('9', [])
+    with relay.lock:
+        others = [other for other in relay.upstreams.values() if other is not upstream]
+        assert upstream.preroll.max_bytes == BUFFER_BYTES // 6
+    for other in others:
+        other.close()
+        other.join(2)
+    with relay.lock:
+        assert list(relay.upstreams.values()) == [upstream]
+        assert upstream.preroll.max_bytes == BUFFER_BYTES
+    deadline = time.monotonic() + 5
+    while buffered(relay) != [GOP_BUFFERED] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert buffered(relay) == [GOP_BUFFERED]
+    upstream.unsubscribe(subscriber)
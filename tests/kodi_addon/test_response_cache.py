@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+"""On-disk response cache: eviction, revalidation and index merging"""
+
+import json
+import os
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from resources.lib.cache import ResponseCache
+
+CAMERAS_V1 = [{'id': 1, 'name': 'Door'}]
+CAMERAS_V2 = [{'id': 1, 'name': 'Door'}, {'id': 2, 'name': 'Yard'}]
+
+
+class CamerasHandler(BaseHTTPRequestHandler):
+    """Serves server.cameras with an ETag, answering 304 to a matching If-None-Match
+
+    While server.hold is cleared, requests wait for it before answering.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(self.headers.get('If-None-Match'))
+        self.server.hold.wait(5)
+        etag = f"\"v{len(self.server.cameras)}\""
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = json.dumps(self.server.cameras).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        # No token endpoint: Basic auth
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.send_response(404)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), CamerasHandler)
+    server.cameras = CAMERAS_V1
+    server.requests = []
+    server.hold = threading.Event()
+    server.hold.set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.hold.set()
+    server.shutdown()
+    server.server_close()
+
+
+def expire(api, age):
+    """Make the cached camera list `age` seconds past its expiry"""
+    entry = api.cache.get('cameras')
+    entry.expires = time.time() - age
+    return entry
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=30)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, b'x' * 10, ttl=60)
+        time.sleep(0.01)
+    cache.get('a')
+    cache.put('d', b'x' * 10, ttl=60)
+    assert cache.get('b') is None
+    assert [key for key in ('a', 'c', 'd') if cache.get(key)] == ['a', 'c', 'd']
+    assert cache.total_size() == 30
+    assert len(os.listdir(str(tmp_path))) == 3
+
+
+def test_not_modified_refreshes_the_entry(server, make_api):
+    api = make_api(server.server_address[1])
+    assert api.get_cameras() == CAMERAS_V1
+    stored = expire(api, api.cache.stale_window + 1).stored
+
+    assert api.get_cameras() == CAMERAS_V1
+    assert server.requests == [None, '"v1"']
+    entry = api.cache.get('cameras')
+    assert entry.is_fresh() and entry.stored == stored
+
+
+def test_stale_entry_is_served_while_it_is_refreshed(server, make_api):
+    api = make_api(server.server_address[1])
+    api.get_cameras()
+    expire(api, 1)
+    server.cameras = CAMERAS_V2
+    server.hold.clear()
+
+    # Answered from the cache while the server still holds the refresh
+    assert api.get_cameras() == CAMERAS_V1
+    server.hold.set()
+    deadline = time.monotonic() + 5
+    while not api.cache.get('cameras').is_fresh() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert api.get_cameras() == CAMERAS_V2
+    assert server.requests == [None, '"v1"']
+
+
+def test_indexes_of_concurrent_invocations_are_merged(tmp_path):
+    first, second = ResponseCache(str(tmp_path)), ResponseCache(str(tmp_path))
+    # Both have read the index before either writes it
+    first.get('cameras')
+    second.get('cameras')
+    first.put('cameras', b'[1]', ttl=60)
+    first.put('recordings', b'[1]', ttl=60)
+    time.sleep(0.01)
+    second.put('recordings', b'[2]', ttl=60)
+    second.put('motion-events', b'[2]', ttl=60)
+    second.ORPHAN_GRACE = -1
+    first.flush()
+    second.flush()
+
+    merged = ResponseCache(str(tmp_path))
+    assert {key: merged.load(merged.get(key)) for key in ('cameras', 'recordings', 'motion-events')} == \
+        {'cameras': [1], 'recordings': [2], 'motion-events': [2]}
+    # The older body of the entry both stored is no longer referenced and removed
+    assert len(os.listdir(str(tmp_path))) == 4
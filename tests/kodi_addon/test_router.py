@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+"""What a plugin invocation loads and writes for modes that never reach the NVR"""
+
+import json
+import os
+import subprocess
+import sys
+
+from conftest import ROOT_DIR
+
+ADDON_ID = 'plugin.video.aiit-nvr'
+PLUGIN_HOST = os.path.abspath(os.path.join(ROOT_DIR, 'benchmarks', 'kodi_addon', 'plugin_host.py'))
+
+# Runs one invocation, then reports which addon modules it imported
+REPORT = f"""
+import json, runpy, sys
+sys.argv = [{PLUGIN_HOST!r}, sys.argv[1]]
+runpy.run_path({PLUGIN_HOST!r}, run_name='__main__')
+print(json.dumps(sorted(name for name in sys.modules if name.startswith('resources.lib.'))))
+"""
+
+
+def run_plugin(query, data_dir):
+    env = dict(os.environ, BENCH_PROFILE_DIR=str(data_dir), BENCH_SETTINGS=json.dumps({'nvr_port': '1'}))
+    result = subprocess.run([sys.executable, '-c', REPORT, query], env=env, capture_output=True, text=True,
+                            timeout=60, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_settings_mode_loads_no_metrics_or_prefetch(tmp_path):
+    assert run_plugin('mode=settings', tmp_path) == []
+    assert not os.path.exists(tmp_path / ADDON_ID / 'metrics.json')
+
+
+def test_running_prefetch_is_still_cancelled(tmp_path):
+    (tmp_path / ADDON_ID).mkdir()
+    marker = tmp_path / ADDON_ID / 'prefetch.active'
+    marker.write_text('1234:1')
+    assert run_plugin('mode=settings', tmp_path) == ['resources.lib.prefetch']
+    assert not marker.exists()
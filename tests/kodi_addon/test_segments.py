@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+"""Byte-range manifests of NVR and derived segment indexes"""
+
+from resources.lib.segments import SegmentIndex, derive_ts_segments, build_manifest
+
+PLAYBACK_URL = 'http://nvr/recordings/1.ts'
+
+
+class IndexAPI:
+    def __init__(self, index=None):
+        self.index = index
+
+    def get_recording_index(self, recording_id):
+        return self.index
+
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def test_nvr_index_claims_independent_segments(tmp_path):
+    index = {'file_size': 3000, 'segments': [
+        {'start': 0, 'duration': 6, 'offset': 0, 'length': 1500},
+        {'start': 6, 'duration': 6, 'offset': 1500, 'length': 1500},
+    ]}
+    path = SegmentIndex(str(tmp_path)).manifest(IndexAPI(index), 1, PLAYBACK_URL)
+    assert '#EXT-X-INDEPENDENT-SEGMENTS' in read(path)
+
+
+def test_derived_index_does_not_claim_independent_segments(tmp_path):
+    path = SegmentIndex(str(tmp_path)).manifest(IndexAPI(), 1, PLAYBACK_URL, duration=60, file_size=188 * 1000)
+    manifest = read(path)
+    assert '#EXT-X-BYTERANGE' in manifest
+    assert '#EXT-X-INDEPENDENT-SEGMENTS' not in manifest
+
+
+def test_derived_segments_cover_the_file_on_packet_boundaries():
+    segments = derive_ts_segments(60, 188 * 1000 + 50)
+    assert all(segment['offset'] % 188 == 0 for segment in segments)
+    assert sum(segment['length'] for segment in segments) == 188 * 1000 + 50
+    assert '#EXT-X-INDEPENDENT-SEGMENTS' not in build_manifest(PLAYBACK_URL, {'segments': segments,
+                                                                              'independent': False})
+
+
+def test_federated_ids_get_their_own_manifests(tmp_path):
+    segments = SegmentIndex(str(tmp_path))
+    first = segments.manifest(IndexAPI(), 'site-b:12', 'http://b/recordings/12.ts', duration=60, file_size=18800)
+    second = segments.manifest(IndexAPI(), 'site-b1:2', 'http://b1/recordings/2.ts', duration=60, file_size=18800)
+    assert first != second
+    assert 'http://b/recordings/12.ts' in read(first)
+    assert 'http://b1/recordings/2.ts' in read(second)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+"""Restarting only the parts of the service whose settings changed"""
+
+import pytest
+
+import xbmcaddon
+from resources.lib import service
+from resources.lib.service import NVRService
+
+SETTINGS = {
+    'nvr_host': 'nvr.local', 'nvr_port': '8080', 'enable_event_index': 'true',
+    'enable_recording_index': 'true', 'nvr_sites': '', 'auto_refresh': '30', 'event_history_days': '30',
+    'stream_relay': 'true', 'buffer_size': '20', 'pinned_cameras': '1,2', 'stream_quality': 'high',
+    'thumbnail_cache_size': '50',
+}
+
+
+class FakeWorker:
+    def __init__(self, addon, monitor):
+        self.running = False
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+    def join(self, timeout=None):
+        pass
+
+
+class FakeRelay:
+    def __init__(self, api, log=None, buffer_bytes=0, pinned=()):
+        self.buffer_bytes = buffer_bytes
+        self.pinned = pinned
+        self.running = False
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+
+class FakeAPI:
+    profile = ''
+
+    def __init__(self, addon):
+        pass
+
+    def resolve_resolution(self, quality):
+        return quality
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    values = dict(SETTINGS)
+    monkeypatch.setattr(xbmcaddon.Addon, '_settings', values)
+    for name in ('MotionEventSync', 'RecordingIndexSync'):
+        monkeypatch.setattr(service, name, type(name, (FakeWorker,), {}))
+    monkeypatch.setattr(service, 'StreamRelay', FakeRelay)
+    monkeypatch.setattr(service, 'NVRApi', FakeAPI)
+    monkeypatch.setattr(service, 'remove_relay_file', lambda profile: None)
+    return values
+
+
+def started():
+    nvr_service = NVRService()
+    addon = xbmcaddon.Addon()
+    for name in service.WORKER_SETTINGS:
+        nvr_service._start_worker(addon, name)
+    nvr_service._start_relay(addon)
+    return nvr_service, dict(nvr_service.workers), nvr_service.relay
+
+
+def test_unrelated_change_keeps_everything_running(settings):
+    nvr_service, workers, relay = started()
+    settings['thumbnail_cache_size'] = '80'
+    nvr_service.onSettingsChanged()
+    assert nvr_service.workers == workers and nvr_service.relay is relay
+    assert relay.running and all(worker.running for worker in workers.values())
+
+
+def test_relay_change_restarts_only_the_relay(settings):
+    nvr_service, workers, relay = started()
+    settings['pinned_cameras'] = '1,2,3'
+    nvr_service.onSettingsChanged()
+    assert not relay.running
+    assert nvr_service.relay.running and len(nvr_service.relay.pinned) == 3
+    assert nvr_service.workers == workers
+
+
+def test_index_setting_restarts_only_its_worker(settings):
+    nvr_service, workers, relay = started()
+    settings['event_history_days'] = '7'
+    nvr_service.onSettingsChanged()
+    assert not workers['motion_events'].running
+    assert nvr_service.workers['motion_events'] is not workers['motion_events']
+    assert nvr_service.workers['recording_index'] is workers['recording_index']
+    assert nvr_service.relay is relay
+
+
+def test_connection_change_restarts_everything(settings):
+    nvr_service, workers, relay = started()
+    settings['nvr_host'] = 'nvr2.local'
+    nvr_service.onSettingsChanged()
+    assert not relay.running and not any(worker.running for worker in workers.values())
+    assert nvr_service.relay.running
+    assert all(worker.running for worker in nvr_service.workers.values())
+
+
+def test_disabled_worker_is_stopped(settings):
+    nvr_service, workers, relay = started()
+    settings['enable_recording_index'] = 'false'
+    nvr_service.onSettingsChanged()
+    assert not workers['recording_index'].running
+    assert list(nvr_service.workers) == ['motion_events']
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+"""Certificate and hostname checks through the resuming TLS context"""
+
+import shutil
+import ssl
+import subprocess
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+import requests
+
+from resources.lib.transport import NVRAdapter
+
+pytestmark = pytest.mark.skipif(shutil.which('openssl') is None, reason='needs the openssl CLI')
+
+
+class OkHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+
+def make_cert(directory, name):
+    """Self-signed certificate valid only for `name` (a DNS name or IP:address)"""
+    cert, key = directory / 'cert.pem', directory / 'key.pem'
+    san = name if name.startswith('IP:') else f"DNS:{name}"
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                    '-keyout', str(key), '-out', str(cert), '-subj', '/CN=nvr-test',
+                    '-addext', f"subjectAltName={san}"], check=True, capture_output=True)
+    return str(cert), str(key)
+
+
+@pytest.fixture
+def https_server(tmp_path):
+    servers = []
+
+    def start(name):
+        cert, key = make_cert(tmp_path, name)
+        server = ThreadingHTTPServer(('127.0.0.1', 0), OkHandler)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"https://127.0.0.1:{server.server_address[1]}/", cert
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def make_session():
+    session = requests.Session()
+    session.mount('https://', NVRAdapter(timeout=5))
+    return session
+
+
+def test_matching_certificate_is_accepted(https_server):
+    url, cert = https_server('IP:127.0.0.1')
+    session = make_session()
+    assert session.get(url, verify=cert).text == 'ok'
+    # The next connection offers the saved session and is still verified
+    session.close()
+    assert session.get(url, verify=cert).text == 'ok'
+
+
+def test_certificate_for_another_host_is_rejected(https_server):
+    url, cert = https_server('nvr.example')
+    with pytest.raises(requests.exceptions.SSLError, match="doesn't match|mismatch"):
+        make_session().get(url, verify=cert)
+
+
+def test_untrusted_certificate_is_rejected(https_server):
+    url, _ = https_server('IP:127.0.0.1')
+    with pytest.raises(requests.exceptions.SSLError):
+        make_session().get(url)
+
+
+@pytest.mark.filterwarnings('ignore::urllib3.exceptions.InsecureRequestWarning')
+def test_verification_can_be_turned_off(https_server):
+    url, _ = https_server('nvr.example')
+    assert make_session().get(url, verify=False).text == 'ok'
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+"""Retry policy, default deadlines and hedged requests of the NVR session"""
+
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+import requests
+from urllib3.util.retry import RequestHistory
+
+from resources.lib import transport
+from resources.lib.transport import NVRAdapter, hedged, retry_policy, BACKOFF_FACTOR, BACKOFF_CAP, RETRY_STATUSES
+
+
+class StatusHandler(BaseHTTPRequestHandler):
+    """Answers /<status> with that status, /slow after a second; counts requests"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _answer(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.server.requests.append((self.command, self.path))
+        if self.path == '/slow':
+            time.sleep(1)
+            status = 200
+        else:
+            status = int(self.path.strip('/'))
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    do_GET = do_POST = _answer
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StatusHandler)
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def backoffs(monkeypatch):
+    """Backoff ceilings the retry policy drew from, without sleeping them"""
+    drawn = []
+
+    def uniform(low, high):
+        drawn.append(high)
+        return 0
+
+    monkeypatch.setattr(transport.random, 'uniform', uniform)
+    return drawn
+
+
+def make_session(server, timeout=5, max_retries=3):
+    session = requests.Session()
+    session.mount('http://', NVRAdapter(timeout, max_retries=max_retries))
+    return session, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+@pytest.mark.parametrize('status', RETRY_STATUSES)
+def test_get_is_retried_on_gateway_errors(server, backoffs, status):
+    session, url = make_session(server)
+    assert session.get(f"{url}/{status}").status_code == status
+    assert server.requests == [('GET', f"/{status}")] * 4
+    # urllib3 retries the first time at once, then backs off exponentially
+    assert backoffs == [BACKOFF_FACTOR * 2, BACKOFF_FACTOR * 4]
+
+
+def test_post_is_not_retried(server, backoffs):
+    session, url = make_session(server)
+    assert session.post(f"{url}/503", data=b'{}').status_code == 503
+    assert server.requests == [('POST', '/503')]
+
+
+def test_other_errors_are_not_retried(server, backoffs):
+    session, url = make_session(server)
+    assert session.get(f"{url}/500").status_code == 500
+    assert server.requests == [('GET', '/500')]
+
+
+def test_backoff_is_jittered_under_the_cap(backoffs):
+    history = tuple(RequestHistory('GET', '/', None, 503, None) for _ in range(12))
+    policy = retry_policy(20).new(history=history)
+    assert policy.get_backoff_time() == 0
+    assert backoffs == [BACKOFF_CAP]
+
+
+def test_requests_without_a_timeout_get_the_default(server):
+    session, url = make_session(server, timeout=0.2, max_retries=0)
+    with pytest.raises(requests.exceptions.RequestException, match=r'read timeout=0\.2'):
+        session.get(f"{url}/slow")
+    assert session.get(f"{url}/slow", timeout=3).status_code == 200
+
+
+class FakeResponse:
+    def __init__(self, name):
+        self.name = name
+        self.closed = threading.Event()
+
+    def close(self):
+        self.closed.set()
+
+
+def delayed_calls(*outcomes):
+    """A function returning (or raising) each outcome after its delay, one per call"""
+    queue = list(outcomes)
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            delay, outcome = queue.pop(0)
+        time.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    return call
+
+
+def test_hedged_call_returns_the_faster_result_and_closes_the_slower():
+    slow, fast = FakeResponse('slow'), FakeResponse('fast')
+    assert hedged(delayed_calls((0.3, slow), (0, fast)), delay=0.05) is fast
+    assert slow.closed.wait(2)
+    assert not fast.closed.is_set()
+
+
+def test_fast_call_is_not_duplicated():
+    first, second = FakeResponse('first'), FakeResponse('second')
+    calls = delayed_calls((0, first), (0, second))
+    assert hedged(calls, delay=0.5) is first
+    assert calls() is second
+
+
+def test_first_error_is_raised_when_both_calls_fail():
+    with pytest.raises(ValueError, match='first'):
+        hedged(delayed_calls((0.1, ValueError('first')), (0.2, ValueError('second'))), delay=0.05)
+
+
+def test_a_failed_call_loses_to_a_later_success():
+    response = FakeResponse('second')
+    assert hedged(delayed_calls((0.1, ValueError('first')), (0.2, response)), delay=0.05) is response
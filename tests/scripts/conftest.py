@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+
+"""
+AI-IT Inc NVR - Script tests
+
+The scripts are imported as modules from scripts/.
+"""
+
+import os
+import sys
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+sys.path.insert(0, os.path.abspath(os.path.join(TESTS_DIR, '..', '..', 'scripts')))
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+"""Resumable, verified FFmpeg downloads against a local HTTP server"""
+
+import hashlib
+import os
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+import setup_ffmpeg
+from setup_ffmpeg import FFmpegSetup
+
+PAYLOAD = os.urandom(1024 * 1024 + 123)
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    """Serves server.files, with Range support when server.ranges is set
+
+    A path in server.drops has its connection cut after that many bytes of
+    the next response for it.
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        body = self.server.files.get(self.path)
+        range_header = self.headers.get('Range')
+        self.server.requests.append((self.path, range_header))
+        if body is None:
+            self.send_error(404)
+            return
+        start, end = 0, len(body) - 1
+        if range_header and self.server.ranges:
+            first, _, last = range_header[len('bytes='):].partition('-')
+            start, end = int(first), min(int(last or end), end)
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{end}/{len(body)}")
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        data = body[start:end + 1]
+        drop = self.server.drops.get(self.path)
+        if drop is not None and len(data) > drop:
+            del self.server.drops[self.path]
+            self.wfile.write(data[:drop])
+            self.wfile.flush()
+            self.connection.shutdown(2)
+            return
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FileHandler)
+    server.files = {'/ffmpeg.tar.xz': PAYLOAD,
+                    '/ffmpeg.tar.xz.sha256': f"{hashlib.sha256(PAYLOAD).hexdigest()}  ffmpeg.tar.xz\n".encode()}
+    server.ranges = True
+    server.drops = {}
+    server.requests = []
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/ffmpeg.tar.xz"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(setup_ffmpeg, 'MIN_SEGMENT_SIZE', 64 * 1024)
+    monkeypatch.setattr(setup_ffmpeg.time, 'sleep', lambda seconds: None)
+
+
+def leftovers(path):
+    return [name for name in os.listdir(path.parent) if name.startswith(path.name + '.part')]
+
+
+def test_segmented_download_with_ranges(server, tmp_path):
+    target = tmp_path / 'ffmpeg.tar.xz'
+    FFmpegSetup().download_file(server.url, target)
+    assert target.read_bytes() == PAYLOAD
+    assert leftovers(target) == []
+    ranges = [header for path, header in server.requests if path == '/ffmpeg.tar.xz' and header != 'bytes=0-0']
+    assert len(ranges) == setup_ffmpeg.DOWNLOAD_SEGMENTS
+
+
+def test_single_stream_without_ranges_and_md5_digest(server, tmp_path):
+    server.ranges = False
+    del server.files['/ffmpeg.tar.xz.sha256']
+    server.files['/ffmpeg.tar.xz.md5'] = f"{hashlib.md5(PAYLOAD).hexdigest()}  ffmpeg.tar.xz\n".encode()
+    target = tmp_path / 'ffmpeg.tar.xz'
+    FFmpegSetup().download_file(server.url, target)
+    assert target.read_bytes() == PAYLOAD
+
+
+def test_dropped_segment_is_resumed_where_it_stopped(server, tmp_path):
+    server.drops['/ffmpeg.tar.xz'] = 100 * 1024
+    target = tmp_path / 'ffmpeg.tar.xz'
+    FFmpegSetup().download_file(server.url, target, segments=1)
+    assert target.read_bytes() == PAYLOAD
+    ranges = [header for path, header in server.requests if path == '/ffmpeg.tar.xz' and header != 'bytes=0-0']
+    assert ranges[0] == f"bytes=0-{len(PAYLOAD) - 1}"
+    resumed_at = int(ranges[1][len('bytes='):].partition('-')[0])
+    assert 0 < resumed_at <= 100 * 1024
+
+
+def test_interrupted_download_resumes_in_a_new_run(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(setup_ffmpeg, 'DOWNLOAD_RETRIES', 0)
+    server.drops['/ffmpeg.tar.xz'] = 300 * 1024
+    target = tmp_path / 'ffmpeg.tar.xz'
+    with pytest.raises(Exception):
+        FFmpegSetup().download_file(server.url, target, segments=1)
+    assert not target.exists() and leftovers(target)
+
+    del server.requests[:]
+    FFmpegSetup().download_file(server.url, target, segments=1)
+    assert target.read_bytes() == PAYLOAD
+    ranges = [header for path, header in server.requests if path == '/ffmpeg.tar.xz' and header != 'bytes=0-0']
+    assert int(ranges[0][len('bytes='):].partition('-')[0]) > 0
+
+
+def test_digest_mismatch_fails_and_discards_the_download(server, tmp_path):
+    server.files['/ffmpeg.tar.xz.sha256'] = b'0' * 64 + b'  ffmpeg.tar.xz\n'
+    target = tmp_path / 'ffmpeg.tar.xz'
+    with pytest.raises(Exception, match='SHA256 mismatch'):
+        FFmpegSetup().download_file(server.url, target)
+    assert not target.exists()
+    assert leftovers(target) == []
+
+
+def test_missing_digest_fails_unless_allowed(server, tmp_path):
+    del server.files['/ffmpeg.tar.xz.sha256']
+    target = tmp_path / 'ffmpeg.tar.xz'
+    with pytest.raises(Exception, match='No published checksum'):
+        FFmpegSetup().download_file(server.url, target)
+    FFmpegSetup(allow_unverified=True).download_file(server.url, target)
+    assert target.read_bytes() == PAYLOAD
+
+
+def test_download_ffmpeg_probes_the_server_once(server, tmp_path):
+    setup = FFmpegSetup()
+    setup.system, setup.architecture, setup.script_dir = 'linux', 'x86_64', tmp_path
+    setup.download_urls = {'linux': {'x86_64': server.url}}
+    path = setup.download_ffmpeg()
+    assert path.read_bytes() == PAYLOAD
+    assert [header for _, header in server.requests].count('bytes=0-0') == 1
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+"""Extracting the FFmpeg binaries from a tar.xz stream"""
+
+import hashlib
+import io
+import os
+import stat
+import tarfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from setup_ffmpeg import FFmpegSetup, FFMPEG_BINARIES
+
+# Incompressible, so that how far the xz stream was read shows in the bytes
+TRAILER = os.urandom(2 * 1024 * 1024)
+
+
+def make_archive(names, trailer=True):
+    """tar.xz of a static build: the named binaries in a folder, then a large file"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:xz') as tar:
+        members = [(f"ffmpeg-7.0-static/{name}", f"#!/bin/sh\necho {name}\n".encode()) for name in names]
+        if trailer:
+            members.append(('ffmpeg-7.0-static/model/vmaf.json', TRAILER))
+        for path, data in members:
+            info = tarfile.TarInfo(path)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+class CountingReader:
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+        self.read_bytes = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.read_bytes += len(data)
+        return data
+
+
+class ArchiveHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        body = self.server.files.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def setup(tmp_path):
+    setup = FFmpegSetup()
+    setup.ffmpeg_dir = tmp_path / 'ffmpeg'
+    setup.ffmpeg_dir.mkdir()
+    return setup
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ArchiveHandler)
+    server.files = {}
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/ffmpeg.tar.xz"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_reading_stops_after_the_last_binary(setup):
+    archive = make_archive(FFMPEG_BINARIES)
+    reader = CountingReader(archive)
+    staged = setup._extract_tar_stream(reader)
+    assert sorted(staged) == sorted(FFMPEG_BINARIES)
+    assert reader.read_bytes < len(archive) // 2
+    assert staged['ffmpeg'].read_bytes() == b"#!/bin/sh\necho ffmpeg\n"
+
+
+def test_missing_required_binary_fails(setup):
+    with pytest.raises(Exception, match='does not contain ffprobe'):
+        setup._extract_tar_stream(io.BytesIO(make_archive(['ffmpeg', 'ffplay'])))
+    assert os.listdir(setup.ffmpeg_dir) == []
+
+
+def test_build_without_ffplay_is_read_to_the_end(setup):
+    archive = make_archive(['ffmpeg', 'ffprobe'])
+    reader = CountingReader(archive)
+    assert sorted(setup._extract_tar_stream(reader)) == ['ffmpeg', 'ffprobe']
+    assert reader.read_bytes == len(archive)
+
+
+def test_streamed_download_installs_verified_binaries(setup, server):
+    archive = make_archive(FFMPEG_BINARIES)
+    server.files['/ffmpeg.tar.xz'] = archive
+    server.files['/ffmpeg.tar.xz.sha256'] = f"{hashlib.sha256(archive).hexdigest()}  ffmpeg.tar.xz\n".encode()
+    setup.stream_extract_ffmpeg(server.url)
+    assert sorted(os.listdir(setup.ffmpeg_dir)) == sorted(FFMPEG_BINARIES)
+    for name in FFMPEG_BINARIES:
+        assert stat.S_IMODE((setup.ffmpeg_dir / name).stat().st_mode) == 0o755
+
+
+def test_streamed_download_with_a_bad_digest_installs_nothing(setup, server):
+    server.files['/ffmpeg.tar.xz'] = make_archive(FFMPEG_BINARIES)
+    server.files['/ffmpeg.tar.xz.sha256'] = b'0' * 64 + b'  ffmpeg.tar.xz\n'
+    with pytest.raises(Exception, match='SHA256 mismatch'):
+        setup.stream_extract_ffmpeg(server.url)
+    assert os.listdir(setup.ffmpeg_dir) == []
+
+
+def test_streamed_download_missing_a_binary_installs_nothing(setup, server):
+    archive = make_archive(['ffmpeg'])
+    server.files['/ffmpeg.tar.xz'] = archive
+    server.files['/ffmpeg.tar.xz.sha256'] = f"{hashlib.sha256(archive).hexdigest()}  ffmpeg.tar.xz\n".encode()
+    with pytest.raises(Exception, match='does not contain ffprobe'):
+        setup.stream_extract_ffmpeg(server.url)
+    assert os.listdir(setup.ffmpeg_dir) == []
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+"""Access control of the mosaic server"""
+
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from mosaic_server import MosaicServer, is_loopback
+
+GRID_PATH = '/api/grid/stream?cameras=1,2&quality=480p'
+
+
+@pytest.fixture
+def server():
+    server = MosaicServer(('127.0.0.1', 0), 'http://127.0.0.1:9/api', 'ffmpeg', 'admin', 'secret', token='s3cret')
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def head(server, path, headers=None):
+    request = urllib.request.Request(f"http://127.0.0.1:{server.server_address[1]}{path}",
+                                     headers=headers or {}, method='HEAD')
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_requests_without_the_token_are_refused(server):
+    assert head(server, GRID_PATH) == 401
+    assert head(server, GRID_PATH + '&token=wrong') == 401
+    assert head(server, GRID_PATH, {'Authorization': 'Basic YWRtaW46c2VjcmV0'}) == 401
+
+
+def test_token_in_query_or_header_is_accepted(server):
+    assert head(server, GRID_PATH + '&token=s3cret') == 200
+    assert head(server, GRID_PATH, {'Authorization': 'Bearer s3cret'}) == 200
+
+
+def test_only_loopback_addresses_count_as_local():
+    assert is_loopback('127.0.0.1') and is_loopback('::1') and is_loopback('localhost')
+    assert not is_loopback('0.0.0.0') and not is_loopback('192.168.1.10')
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+"""Installing the codec libraries with apt, through a stubbed command runner"""
+
+import subprocess
+
+from setup_ffmpeg import FFmpegSetup, SYSTEM_DEPENDENCIES
+
+
+class AptRunner:
+    """Stands in for subprocess.run on a Debian system
+
+    dpkg-query reports the packages in `installed`; apt-get installs those in
+    `available` and, like apt, refuses the whole transaction if any package
+    is unknown.
+    """
+
+    def __init__(self, installed=(), available=SYSTEM_DEPENDENCIES):
+        self.installed = set(installed)
+        self.available = set(available)
+        self.calls = []
+
+    def __call__(self, command, check=False, **kwargs):
+        self.calls.append(command)
+        if command[:2] == ['apt', '--version']:
+            return self._result(command, stdout='apt 2.4.0')
+        if command[0] == 'dpkg-query':
+            packages = command[3:]
+            lines = [f"{package} install ok installed" for package in packages if package in self.installed]
+            unknown = [package for package in packages if package not in self.installed]
+            return self._result(command, 1 if unknown else 0, stdout=''.join(f"{line}\n" for line in lines))
+        if command[:3] == ['sudo', 'apt-get', 'install']:
+            packages = command[4:]
+            unknown = [package for package in packages if package not in self.available]
+            if unknown:
+                stderr = ''.join(f"E: Unable to locate package {package}\n" for package in unknown)
+                return self._result(command, 100, stderr=stderr)
+            self.installed.update(packages)
+            return self._result(command)
+        raise AssertionError(f"unexpected command {command}")
+
+    def apt_installs(self):
+        return [command[4:] for command in self.calls if command[:3] == ['sudo', 'apt-get', 'install']]
+
+    @staticmethod
+    def _result(command, returncode=0, stdout='', stderr=''):
+        return subprocess.CompletedProcess(command, returncode, stdout, stderr)
+
+
+def make_setup(runner):
+    setup = FFmpegSetup(runner=runner)
+    setup.system = 'linux'
+    return setup
+
+
+def test_nothing_is_installed_when_everything_is_present():
+    runner = AptRunner(installed=SYSTEM_DEPENDENCIES)
+    make_setup(runner).install_system_dependencies()
+    assert runner.apt_installs() == []
+
+
+def test_only_missing_packages_are_installed_in_one_transaction():
+    present = SYSTEM_DEPENDENCIES[:4]
+    runner = AptRunner(installed=present)
+    make_setup(runner).install_system_dependencies()
+    assert runner.apt_installs() == [SYSTEM_DEPENDENCIES[4:]]
+    assert runner.installed == set(SYSTEM_DEPENDENCIES)
+
+
+def test_unknown_packages_are_dropped_and_the_rest_retried(capsys):
+    runner = AptRunner(available=[dep for dep in SYSTEM_DEPENDENCIES if dep != 'libfdk-aac-dev'])
+    make_setup(runner).install_system_dependencies()
+    retry = [dep for dep in SYSTEM_DEPENDENCIES if dep != 'libfdk-aac-dev']
+    assert runner.apt_installs() == [SYSTEM_DEPENDENCIES, retry]
+    assert runner.installed == set(retry)
+    output = capsys.readouterr().out
+    assert 'Not available: libfdk-aac-dev' in output
+    assert 'Failed to install' not in output